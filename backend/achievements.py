@@ -0,0 +1,159 @@
+"""
+Rule-based achievement engine for the learner API.
+
+Routes report the counters they just changed (words learned, quizzes
+taken, XP, pet growth, ...) inside their own transaction. The engine keeps
+the last known counters and unlocked achievements per user, so only the
+rules that depend on a changed counter and aren't unlocked yet are
+evaluated. Unlocks are written with ON CONFLICT DO NOTHING on the caller's
+cursor and commit together with the change that caused them; the cached
+state only takes them in once the caller confirms the commit, so a rolled
+back transaction leaves the cache as it was.
+
+User ids are per database, so each learner database (see Shard in
+enhanced_app.py) has an engine of its own.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+USER_CACHE_SIZE = 10000
+
+
+class Rule:
+    """An achievement unlocked when its check passes for the user's counters"""
+
+    __slots__ = ('id', 'inputs', 'check')
+
+    def __init__(self, achievement_id, inputs, check):
+        self.id = achievement_id
+        self.inputs = tuple(inputs)
+        self.check = check
+
+
+def at_least(achievement_id, counter, threshold):
+    """Rule that unlocks once a single counter reaches a threshold"""
+    return Rule(achievement_id, (counter,), lambda counters: counters.get(counter, 0) >= threshold)
+
+
+RULES = [
+    at_least('first_word', 'total_words_learned', 1),
+    at_least('word_explorer', 'total_words_learned', 10),
+    at_least('vocabulary_master', 'total_words_learned', 50),
+    at_least('quiz_champion', 'total_quizzes_taken', 20),
+    at_least('streak_master', 'streak', 7),
+    at_least('rising_star', 'level', 5),
+    Rule('pet_best_friend', ('pet_happiness', 'pet_growth'),
+         lambda counters: counters.get('pet_happiness', 0) >= 100 and counters.get('pet_growth', 0) >= 100),
+]
+
+
+class UserState:
+    __slots__ = ('counters', 'unlocked')
+
+    def __init__(self, counters, unlocked):
+        self.counters = counters
+        self.unlocked = unlocked
+
+
+class Evaluation:
+    """The outcome of process(), applied to the cache by confirm()"""
+
+    __slots__ = ('user_id', 'state', 'unlocked')
+
+    def __init__(self, user_id, state, unlocked):
+        self.user_id = user_id
+        self.state = state
+        self.unlocked = unlocked
+
+
+class AchievementEngine:
+    """Evaluates achievement rules incrementally as counters change"""
+
+    def __init__(self, rules=RULES, cache_size=USER_CACHE_SIZE):
+        self.rules = list(rules)
+        self.rules_by_input = defaultdict(list)
+        for rule in self.rules:
+            for counter in rule.inputs:
+                self.rules_by_input[counter].append(rule)
+        self.cache_size = cache_size
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load_state(self, cursor, user_id):
+        """Read a user's counters and unlocked achievements from the database"""
+        cursor.execute('''
+            SELECT u.xp, u.level, u.streak, u.total_words_learned,
+                   u.total_quizzes_taken, u.perfect_scores,
+                   p.happiness AS pet_happiness, p.growth AS pet_growth
+            FROM users u
+            LEFT JOIN virtual_pets p ON p.user_id = u.id
+            WHERE u.id = ?
+        ''', (user_id,))
+        row = cursor.fetchone()
+        counters = {key: row[key] or 0 for key in row.keys()} if row else {}
+
+        cursor.execute('SELECT achievement_id FROM user_achievements WHERE user_id = ?', (user_id,))
+        unlocked = {r[0] for r in cursor.fetchall()}
+        return UserState(counters, unlocked)
+
+    def get_state(self, cursor, user_id):
+        """Return (state, loaded) where loaded is True on a cache miss
+
+        A loaded state isn't cached here: it was read inside the caller's
+        transaction, which may still roll back.
+        """
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None:
+                self._users.move_to_end(user_id)
+                return state, False
+        return self.load_state(cursor, user_id), True
+
+    def process(self, cursor, user_id, **counters):
+        """Check new counter values and unlock any achievements they earn
+
+        Returns an Evaluation whose unlocked ids were newly written by this
+        call. Pass it to confirm() once the caller's transaction commits.
+        """
+        state, loaded = self.get_state(cursor, user_id)
+
+        with self._lock:
+            if loaded:
+                # The state was read after the caller's update, so every
+                # reported counter has to be checked once
+                changed = list(counters)
+            else:
+                changed = [name for name, value in counters.items() if state.counters.get(name) != value]
+            merged = {**state.counters, **counters}
+            candidates = {
+                rule.id: rule
+                for name in changed
+                for rule in self.rules_by_input.get(name, ())
+                if rule.id not in state.unlocked
+            }
+            earned = [rule.id for rule in candidates.values() if rule.check(merged)]
+
+        unlocked = []
+        for achievement_id in earned:
+            cursor.execute('''
+                INSERT INTO user_achievements (user_id, achievement_id)
+                VALUES (?, ?)
+                ON CONFLICT DO NOTHING
+            ''', (user_id, achievement_id))
+            if cursor.rowcount:
+                unlocked.append(achievement_id)
+        return Evaluation(user_id, UserState(merged, state.unlocked | set(earned)), unlocked)
+
+    def confirm(self, evaluation):
+        """Cache the state from process() after its transaction committed"""
+        with self._lock:
+            self._users[evaluation.user_id] = evaluation.state
+            self._users.move_to_end(evaluation.user_id)
+            if len(self._users) > self.cache_size:
+                self._users.popitem(last=False)
+
+    def forget(self, user_id):
+        """Drop a user's cached state, e.g. after their stats were reset"""
+        with self._lock:
+            self._users.pop(user_id, None)
+
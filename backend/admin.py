@@ -1,6 +1,5 @@
 from src.database import db
 from datetime import datetime
-import bcrypt
 
 class Admin(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,10 +14,12 @@ class Admin(db.Model):
 
     def set_password(self, password):
         """Hash and set the password"""
+        import bcrypt
         self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
     def check_password(self, password):
         """Check if the provided password matches the hash"""
+        import bcrypt
         return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
 
     def update_last_login(self):
@@ -34,3 +35,9 @@ class Admin(db.Model):
             'last_login': self.last_login.isoformat() if self.last_login else None
         }
 
+
+class RevokedToken(db.Model):
+    """A logged-out token's id, denied until the token expires (see revocation.py)"""
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.BigInteger, nullable=False, index=True)
+    revoked_at = db.Column(db.Float, nullable=False, index=True)
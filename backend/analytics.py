@@ -1,16 +1,33 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.admin import Admin
 from src.models.user import User
-from src.models.word import Word, UserProgress
+from src.models.word import Word, UserProgress, UserKnownWords
 from src.database import db
+from src.events import sse_response
+from src.instrumentation import query_budget
+from src.replica import read_session, read_response, read_list_response
+from src.export import ADMIN_TABLES, FORMATS, load_job, start_export
+from src.cohorts import ADMIN_SOURCE, WINDOWS, CohortCache, available as cohorts_available
+from src.tenants import SHARD_DIR, school_analytics
+from src.bitmaps import WordBitmap, known_by_share
 from sqlalchemy import func
 from datetime import datetime, timedelta
 
 analytics_bp = Blueprint('analytics', __name__)
 
+def get_cohort_cache():
+    """The app's cohort results cache, reading from the read replica"""
+    cache = current_app.extensions.get('cohort_cache')
+    if cache is None:
+        engine = current_app.extensions['read_replica'].engine
+        cache = CohortCache(engine.raw_connection, ADMIN_SOURCE, engine.dialect.name)
+        current_app.extensions['cohort_cache'] = cache
+    return cache
+
 @analytics_bp.route('/analytics/overview', methods=['GET'])
 @jwt_required()
+@query_budget(10)
 def get_overview():
     """Get overview analytics for dashboard"""
     try:
@@ -20,32 +37,35 @@ def get_overview():
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
+        session = read_session()
+        
         # Get basic counts
-        total_words = Word.query.count()
-        total_users = User.query.count()
-        total_progress_records = UserProgress.query.count()
+        live_words = session.query(Word).filter(Word.deleted_at.is_(None))
+        total_words = live_words.count()
+        total_users = session.query(User).count()
+        total_progress_records = session.query(UserProgress).count()
         
         # Get words by category
-        words_by_category = db.session.query(
+        words_by_category = session.query(
             Word.category,
             func.count(Word.id).label('count')
-        ).group_by(Word.category).all()
+        ).filter(Word.deleted_at.is_(None)).group_by(Word.category).all()
         
         # Get words by difficulty
-        words_by_difficulty = db.session.query(
+        words_by_difficulty = session.query(
             Word.difficulty,
             func.count(Word.id).label('count')
-        ).group_by(Word.difficulty).all()
+        ).filter(Word.deleted_at.is_(None)).group_by(Word.difficulty).all()
         
         # Get recent activity (words created in last 7 days)
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_words = Word.query.filter(Word.created_at >= seven_days_ago).count()
+        recent_words = live_words.filter(Word.created_at >= seven_days_ago).count()
         
         # Get user progress statistics
-        known_words_count = UserProgress.query.filter_by(known=True).count()
-        unknown_words_count = UserProgress.query.filter_by(known=False).count()
+        known_words_count = session.query(UserProgress).filter_by(known=True).count()
+        unknown_words_count = session.query(UserProgress).filter_by(known=False).count()
         
-        return jsonify({
+        return read_response({
             'overview': {
                 'total_words': total_words,
                 'total_users': total_users,
@@ -62,13 +82,27 @@ def get_overview():
                 {'difficulty': diff, 'count': count} 
                 for diff, count in words_by_difficulty
             ]
-        }), 200
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@analytics_bp.route('/analytics/stream', methods=['GET'])
+@jwt_required()
+@query_budget(1)
+def stream_overview():
+    """Stream live word count changes to admin dashboards"""
+    # Verify admin
+    current_admin_id = get_jwt_identity()
+    admin = Admin.query.get(current_admin_id)
+    if not admin:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return sse_response('admin')
+
 @analytics_bp.route('/analytics/words', methods=['GET'])
 @jwt_required()
+@query_budget(3)
 def get_word_analytics():
     """Get detailed word analytics"""
     try:
@@ -78,23 +112,25 @@ def get_word_analytics():
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
+        session = read_session()
+        
         # Get most attempted words
-        most_attempted = db.session.query(
+        most_attempted = session.query(
             Word.word,
             Word.id,
             func.sum(UserProgress.attempts).label('total_attempts'),
             func.count(UserProgress.id).label('user_count')
-        ).join(UserProgress).group_by(Word.id).order_by(
+        ).join(UserProgress).filter(Word.deleted_at.is_(None)).group_by(Word.id).order_by(
             func.sum(UserProgress.attempts).desc()
         ).limit(10).all()
         
         # Get words with highest success rate
-        success_rate = db.session.query(
+        success_rate = session.query(
             Word.word,
             Word.id,
             func.count(UserProgress.id).label('total_attempts'),
             func.sum(func.cast(UserProgress.known, db.Integer)).label('known_count')
-        ).join(UserProgress).group_by(Word.id).having(
+        ).join(UserProgress).filter(Word.deleted_at.is_(None)).group_by(Word.id).having(
             func.count(UserProgress.id) > 0
         ).all()
         
@@ -113,7 +149,7 @@ def get_word_analytics():
         # Sort by success rate
         success_rate_data.sort(key=lambda x: x['success_rate'], reverse=True)
         
-        return jsonify({
+        return read_response({
             'most_attempted_words': [
                 {
                     'word': word,
@@ -124,13 +160,16 @@ def get_word_analytics():
                 for word, word_id, total_attempts, user_count in most_attempted
             ],
             'highest_success_rate': success_rate_data[:10]
-        }), 200
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+USER_STATISTICS_FIELDS = ('username', 'id', 'words_attempted', 'words_known', 'total_attempts', 'success_rate')
+
 @analytics_bp.route('/analytics/users', methods=['GET'])
 @jwt_required()
+@query_budget(3)
 def get_user_analytics():
     """Get user analytics"""
     try:
@@ -140,8 +179,10 @@ def get_user_analytics():
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
+        session = read_session()
+        
         # Get user progress statistics
-        user_stats = db.session.query(
+        user_stats = session.query(
             User.username,
             User.id,
             func.count(UserProgress.id).label('total_words_attempted'),
@@ -151,35 +192,28 @@ def get_user_analytics():
         
         # Get recent user activity
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_users = User.query.filter(User.created_at >= thirty_days_ago).count()
-        
-        # Process user stats
-        user_analytics = []
-        for username, user_id, attempted, known, attempts in user_stats:
-            success_rate = (known / attempted * 100) if attempted > 0 else 0
-            user_analytics.append({
-                'username': username,
-                'id': user_id,
-                'words_attempted': attempted or 0,
-                'words_known': known or 0,
-                'total_attempts': attempts or 0,
-                'success_rate': round(success_rate, 2)
-            })
+        recent_users = session.query(User).filter(User.created_at >= thirty_days_ago).count()
+        
+        # Process user stats into plain rows (one per user, so no dict each)
+        user_analytics = [
+            (username, user_id, attempted or 0, known or 0, attempts or 0,
+             round((known / attempted * 100) if attempted > 0 else 0, 2))
+            for username, user_id, attempted, known, attempts in user_stats
+        ]
         
         # Sort by success rate
-        user_analytics.sort(key=lambda x: x['success_rate'], reverse=True)
+        user_analytics.sort(key=lambda row: row[5], reverse=True)
         
-        return jsonify({
-            'user_statistics': user_analytics,
-            'recent_users_count': recent_users,
-            'total_users': len(user_analytics)
-        }), 200
+        return read_list_response('user_statistics', USER_STATISTICS_FIELDS, user_analytics,
+                                  recent_users_count=recent_users,
+                                  total_users=len(user_analytics))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/analytics/activity', methods=['GET'])
 @jwt_required()
+@query_budget(3)
 def get_activity_analytics():
     """Get activity analytics over time"""
     try:
@@ -189,10 +223,12 @@ def get_activity_analytics():
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
+        session = read_session()
+        
         # Get words created over last 30 days
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
         
-        daily_words = db.session.query(
+        daily_words = session.query(
             func.date(Word.created_at).label('date'),
             func.count(Word.id).label('count')
         ).filter(Word.created_at >= thirty_days_ago).group_by(
@@ -200,14 +236,14 @@ def get_activity_analytics():
         ).order_by(func.date(Word.created_at)).all()
         
         # Get user registrations over last 30 days
-        daily_users = db.session.query(
+        daily_users = session.query(
             func.date(User.created_at).label('date'),
             func.count(User.id).label('count')
         ).filter(User.created_at >= thirty_days_ago).group_by(
             func.date(User.created_at)
         ).order_by(func.date(User.created_at)).all()
         
-        return jsonify({
+        return read_response({
             'daily_words_created': [
                 {
                     'date': str(date),
@@ -222,8 +258,152 @@ def get_activity_analytics():
                 }
                 for date, count in daily_users
             ]
-        }), 200
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/analytics/cohorts', methods=['GET'])
+@jwt_required()
+@query_budget(2)
+def get_cohort_analytics():
+    """Get retention curves, category mastery and difficulty calibration"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        if not cohorts_available():
+            return jsonify({'error': 'Cohort analytics need numpy installed'}), 503
+        
+        window = request.args.get('window', 30, type=int)
+        if window not in WINDOWS:
+            return jsonify({'error': f"window must be one of {', '.join(map(str, WINDOWS))} days"}), 400
+        
+        result = dict(get_cohort_cache().get(window))
+        result['computed_at'] = datetime.utcfromtimestamp(result['computed_at']).isoformat()
+        return read_response(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/analytics/known-words', methods=['GET'])
+@jwt_required()
+@query_budget(3)
+def get_known_word_analytics():
+    """Get the words known by at least a share of a group of users"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        share = request.args.get('share', 0.8, type=float)
+        if not 0 < share <= 1:
+            return jsonify({'error': 'share must be between 0 and 1'}), 400
+        try:
+            user_ids = [int(i) for i in request.args.get('user_ids', '').split(',') if i]
+        except ValueError:
+            return jsonify({'error': 'user_ids must be a comma-separated list of ids'}), 400
+        
+        session = read_session()
+        
+        # Each user's bitmap is kept up to date on the write path (see UserKnownWords);
+        # users without one know no words but still count towards the share
+        known = session.query(User.id, UserKnownWords.bitmap).outerjoin(
+            UserKnownWords, UserKnownWords.user_id == User.id)
+        if user_ids:
+            known = known.filter(User.id.in_(user_ids))
+        known = known.all()
+        learners = len(known)
+        bitmaps = [WordBitmap.from_bytes(data) for _, data in known if data is not None]
+        
+        # Bitmaps keep deleted words until they're purged; only live words are returned
+        word_ids = list(known_by_share(bitmaps, share, learners))
+        words = session.query(Word.id, Word.word, Word.category).filter(
+            Word.id.in_(word_ids), Word.deleted_at.is_(None)).order_by(Word.word).all() if word_ids else []
+        
+        return read_response({
+            'share': share,
+            'learners': learners,
+            'words': [{'id': id, 'word': word, 'category': category} for id, word, category in words],
+            'bitmap': WordBitmap(id for id, _, _ in words).to_base64()
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/analytics/schools', methods=['GET'])
+@jwt_required()
+@query_budget(1)
+def get_school_analytics():
+    """Get learner activity per school shard and merged across all schools"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        if not SHARD_DIR:
+            return jsonify({'error': 'School shards are not configured'}), 404
+        
+        # Each shard is summarized on the fan-out pool, then the counts are summed
+        return jsonify(school_analytics(SHARD_DIR)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@analytics_bp.route('/analytics/export', methods=['POST'])
+@jwt_required()
+@query_budget(1)
+def start_history_export():
+    """Start a background export of progress history to Parquet/Arrow/CSV"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        fmt = data.get('format', 'parquet')
+        names = data.get('tables') or list(ADMIN_TABLES)
+        
+        if fmt not in FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+        unknown = [name for name in names if name not in ADMIN_TABLES]
+        if unknown:
+            return jsonify({'error': f"Unknown table(s): {', '.join(unknown)}"}), 400
+        
+        # Export from the read replica so the API's database isn't held up
+        engine = current_app.extensions['read_replica'].engine
+        job = start_export(engine, [ADMIN_TABLES[name] for name in names], fmt=fmt)
+        return jsonify({'job': job.to_dict()}), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/analytics/export/<job_id>', methods=['GET'])
+@jwt_required()
+@query_budget(1)
+def get_history_export(job_id):
+    """Get the status of a background export"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        # Read from the job's status file, as another worker may be running it
+        job = load_job(job_id)
+        if not job:
+            return jsonify({'error': 'Export not found'}), 404
+        return jsonify({'job': job}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,5 +1,7 @@
 import os
-from flask import Flask, send_from_directory, jsonify
+import threading
+from datetime import timedelta
+from flask import Flask, send_from_directory, jsonify, request
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
@@ -8,14 +10,63 @@ app = Flask(__name__, static_folder='../dist')
 # Configuration
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-in-production'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # Tokens don't expire for demo
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 
 # Initialize extensions
 jwt = JWTManager(app)
 CORS(app, origins="*")  # Allow all origins for development
 
+class WordStore:
+    """Words by id, with secondary indexes, safe to share between request threads"""
+
+    STRIPES = 16
+
+    def __init__(self, words, indexed=('category', 'difficulty')):
+        self.indexed = indexed
+        self._words = {}
+        self._indexes = {field: {} for field in indexed}
+        # Guards the id map and indexes; each word's fields are guarded by its stripe
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(self.STRIPES)]
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        word = dict(word)
+        with self._lock:
+            self._words[word['id']] = word
+            for field, index in self._indexes.items():
+                index.setdefault(word.get(field), set()).add(word['id'])
+
+    def get(self, word_id):
+        word = self._words.get(word_id)
+        if word is None:
+            return None
+        with self._stripes[word_id % self.STRIPES]:
+            return dict(word)
+
+    def find(self, **filters):
+        """Copies of the words matching every indexed field = value, in id order"""
+        with self._lock:
+            ids = None
+            for field, value in filters.items():
+                matches = self._indexes[field].get(value, set())
+                ids = set(matches) if ids is None else ids & matches
+            ids = sorted(self._words if ids is None else ids)
+        return [word for word in map(self.get, ids) if word is not None]
+
+    def toggle_known(self, word_id):
+        """Flip a word's known flag; returns a copy of the word, or None"""
+        word = self._words.get(word_id)
+        if word is None:
+            return None
+        with self._stripes[word_id % self.STRIPES]:
+            word['known'] = not word['known']
+            return dict(word)
+
+
 # Sample data for demo
-sample_words = [
+words = WordStore([
     {"id": 1, "word": "Apple", "image": "🍎", "known": False, "difficulty": "easy"},
     {"id": 2, "word": "Banana", "image": "🍌", "known": False, "difficulty": "easy"},
     {"id": 3, "word": "Cat", "image": "🐱", "known": True, "difficulty": "easy"},
@@ -26,23 +77,23 @@ sample_words = [
     {"id": 8, "word": "House", "image": "🏠", "known": True, "difficulty": "easy"},
     {"id": 9, "word": "Ice cream", "image": "🍦", "known": True, "difficulty": "easy"},
     {"id": 10, "word": "Jellyfish", "image": "🪼", "known": False, "difficulty": "hard"}
-]
+])
 
 # API Routes
 @app.route('/api/words', methods=['GET'])
 def get_words():
-    """Get all words"""
-    return jsonify(sample_words)
+    """Get all words, optionally filtered by ?category= and ?difficulty="""
+    filters = {field: request.args[field] for field in words.indexed if field in request.args}
+    return jsonify(words.find(**filters))
 
 @app.route('/api/words/<int:word_id>', methods=['PUT'])
 def update_word(word_id):
     """Update word status"""
     # In a real app, this would update the database
-    for word in sample_words:
-        if word['id'] == word_id:
-            word['known'] = not word['known']
-            return jsonify(word)
-    return jsonify({'error': 'Word not found'}), 404
+    word = words.toggle_known(word_id)
+    if word is None:
+        return jsonify({'error': 'Word not found'}), 404
+    return jsonify(word)
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
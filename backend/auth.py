@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity, create_refresh_token
 from src.models.admin import Admin
 from src.database import db
+from src.revocation import revoke_token
 from datetime import timedelta
 
 auth_bp = Blueprint('auth', __name__)
@@ -85,10 +86,15 @@ def verify():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/auth/logout', methods=['POST'])
-@jwt_required()
+@jwt_required(verify_type=False)
 def logout():
-    """Logout endpoint (client should discard token)"""
-    return jsonify({'message': 'Successfully logged out'}), 200
+    """Logout endpoint: revokes the access or refresh token sent with the request"""
+    try:
+        revoke_token(get_jwt())
+        return jsonify({'message': 'Successfully logged out'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/auth/create-admin', methods=['POST'])
 def create_admin():
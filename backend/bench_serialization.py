@@ -0,0 +1,154 @@
+"""
+Micro-benchmark of list serialization: to_dict() per row vs. streamed tuples.
+
+Seeds a throwaway database and times building the JSON body of the word
+list both ways, the way the endpoints did before (a dict per sqlite3.Row,
+or an ORM object plus to_dict() per Word, then jsonify) and the way they
+do now (column-projected tuples through serialization.encode_rows). Both
+bodies are parsed and compared so the fast path can't drift from the old
+output.
+
+Usage:
+    python bench_serialization.py --words 20000 --repeat 5
+    python bench_serialization.py --admin --words 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(function, repeat):
+    """Best and median seconds of repeated calls, plus the last result"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times), result
+
+
+def learner_paths(db_path):
+    from storage import create_backend
+    from serialization import encode_rows
+    from enhanced_app import WORD_COLUMNS
+
+    backend = create_backend(f'sqlite:///{db_path}')
+    query = '''
+        SELECT w.id, w.word, w.image, w.pronunciation, w.definition, w.example, w.fun_fact,
+               w.difficulty, w.category, w.difficulty_score,
+               COALESCE(uwp.known, FALSE) as known, COALESCE(uwp.mastery_level, 0) as mastery_level
+        FROM words w
+        LEFT JOIN user_word_progress uwp ON w.id = uwp.word_id AND uwp.user_id = ?
+        ORDER BY w.word
+    '''
+
+    def fetch():
+        conn = backend.connect()
+        try:
+            return conn.cursor().execute(query, (1,)).fetchall()
+        finally:
+            conn.close()
+
+    def to_dict_path():
+        words = []
+        for row in fetch():
+            words.append({
+                'id': row['id'],
+                'word': row['word'],
+                'image': row['image'],
+                'pronunciation': row['pronunciation'],
+                'definition': row['definition'],
+                'example': row['example'],
+                'funFact': row['fun_fact'],
+                'difficulty': row['difficulty'],
+                'category': row['category'],
+                'difficultyScore': row['difficulty_score'],
+                'known': bool(row['known']),
+                'masteryLevel': row['mastery_level']
+            })
+        return json.dumps(words)
+
+    def tuple_path():
+        # As GET /api/words does: plain tuples, encoded straight off the cursor
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(query, (1,))
+            return ''.join(encode_rows(WORD_COLUMNS, cursor, convert={'known': bool}))
+        finally:
+            conn.close()
+
+    return to_dict_path, tuple_path
+
+
+def admin_paths(db_path, words, progress):
+    from loadtest import load_admin_app, seed_admin_data
+    app = load_admin_app(db_path)
+    seed_admin_data(app, words, progress)
+
+    from flask import jsonify
+    from src.database import db
+    from src.models.word import Word
+    from src.routes.words import WORD_FIELDS
+    from src.serialization import encode_rows
+
+    def to_dict_path():
+        with app.app_context():
+            return jsonify({'words': [w.to_dict() for w in Word.query.order_by(Word.created_at.desc())]}).get_data()
+
+    def tuple_path():
+        with app.app_context():
+            rows = db.session.query(*(getattr(Word, f) for f in WORD_FIELDS)).order_by(Word.created_at.desc()).all()
+            return '{"words":' + ''.join(encode_rows(WORD_FIELDS, rows)) + '}'
+
+    return to_dict_path, tuple_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark list serialization paths')
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--progress', type=int, default=20000, help='progress rows to seed')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--admin', action='store_true', help='benchmark the admin word list (needs main.py)')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='word-adventure-bench-'), 'bench.db')
+    if args.admin:
+        try:
+            to_dict_path, tuple_path = admin_paths(db_path, args.words, args.progress)
+        except ImportError as e:
+            print(f"Admin app is not importable here ({e})", file=sys.stderr)
+            return 2
+    else:
+        os.environ['WORD_ADVENTURE_DB'] = db_path
+        os.environ['WORD_ADVENTURE_DATABASE_URL'] = f'sqlite:///{db_path}'
+        import enhanced_app
+        from loadtest import seed_learner_data
+        enhanced_app.create_app()
+        seed_learner_data(db_path, users=100, words=args.words, progress=args.progress, quiz_results=0)
+        to_dict_path, tuple_path = learner_paths(db_path)
+
+    old_best, old_median, old_body = timed(to_dict_path, args.repeat)
+    new_best, new_median, new_body = timed(tuple_path, args.repeat)
+    parsed = json.loads(new_body)
+    if json.loads(old_body) != parsed:
+        print('Serialized bodies differ!', file=sys.stderr)
+        return 1
+    rows = len(parsed['words'] if args.admin else parsed)
+
+    print(f"{'path':<10} {'best ms':>10} {'median ms':>10}")
+    print(f"{'to_dict':<10} {old_best * 1000:>10.1f} {old_median * 1000:>10.1f}")
+    print(f"{'tuples':<10} {new_best * 1000:>10.1f} {new_median * 1000:>10.1f}")
+    print(f'{old_median / new_median:.2f}x faster over {rows} rows')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Compressed per-learner sets of known words.
+
+WordBitmap is a roaring-style bitmap of word ids: ids are split by their
+high 16 bits into containers, and each container holds the low 16 bits
+either as a sorted array of uint16 (up to ARRAY_MAX ids, 2 bytes each)
+or as a 65536-bit bitmap (8 KiB, kept as a Python int so union and
+intersection are single big-int operations). A learner who knows 300
+words costs about 600 bytes instead of 300 progress rows.
+
+The learner database keeps one bitmap per user in user_known_words,
+written in the same transaction as user_word_progress (set_known()). A
+user without a row gets one built from their progress rows on the next
+read or write. to_bytes() is the format served by GET /api/user/known:
+
+    header     b'WB', format version (uint8), container count (uint32)
+    container  key (uint16), kind (uint8: 0 array, 1 bitmap), cardinality (uint32),
+               then the cardinality uint16 values or the 8192 bitmap bytes
+    everything little-endian, containers in key order
+
+known_by_share() finds the words known by at least a share of a group of
+learners with bit-sliced counters: a few big-int operations per learner
+and container instead of one per (learner, word).
+
+Usage:
+    python bitmaps.py --db word_adventure.db --share 0.8
+    python bitmaps.py --shard-dir shards --share 0.5
+"""
+import sys
+import json
+import math
+import base64
+import struct
+import argparse
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+ARRAY_MAX = 4096
+BITMAP_BYTES = 8192
+FORMAT_VERSION = 1
+_FULL = (1 << 65536) - 1
+_HEADER = struct.Struct('<2sBI')
+_CONTAINER = struct.Struct('<HBI')
+
+
+def _as_int(container):
+    if isinstance(container, int):
+        return container
+    bits = bytearray(BITMAP_BYTES)
+    for low in container:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _positions(value):
+    return [i * 8 + j
+            for i, byte in enumerate(value.to_bytes(BITMAP_BYTES, 'little')) if byte
+            for j in range(8) if byte >> j & 1]
+
+
+def _compact(value):
+    """The smaller representation of a bitmap container"""
+    return array('H', _positions(value)) if value.bit_count() <= ARRAY_MAX else value
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array('H', values)
+        values.byteswap()
+    return values
+
+
+class WordBitmap:
+    """A compressed set of word ids (0 <= id < 2**32)"""
+
+    def __init__(self, ids=()):
+        self._containers = {}
+        for word_id in ids:
+            self.add(word_id)
+
+    def add(self, word_id):
+        if not 0 <= word_id < 1 << 32:
+            raise ValueError(f'Word id out of range: {word_id}')
+        key, low = word_id >> 16, word_id & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            self._containers[key] = array('H', [low])
+        elif isinstance(container, int):
+            self._containers[key] = container | 1 << low
+        else:
+            i = bisect_left(container, low)
+            if i == len(container) or container[i] != low:
+                container.insert(i, low)
+                if len(container) > ARRAY_MAX:
+                    self._containers[key] = _as_int(container)
+
+    def discard(self, word_id):
+        key, low = word_id >> 16, word_id & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = _compact(container & ~(1 << low))
+        else:
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                del container[i]
+        if isinstance(container, int) or len(container):
+            self._containers[key] = container
+        else:
+            del self._containers[key]
+
+    def __contains__(self, word_id):
+        container = self._containers.get(word_id >> 16)
+        if container is None:
+            return False
+        low = word_id & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+
+    def __len__(self):
+        return sum(c.bit_count() if isinstance(c, int) else len(c) for c in self._containers.values())
+
+    def __iter__(self):
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            for low in (_positions(container) if isinstance(container, int) else container):
+                yield key << 16 | low
+
+    def __eq__(self, other):
+        return isinstance(other, WordBitmap) and list(self) == list(other)
+
+    def _combine(self, other, operation, keys):
+        result = WordBitmap()
+        for key in keys:
+            value = operation(_as_int(self._containers.get(key, 0)), _as_int(other._containers.get(key, 0)))
+            if value:
+                result._containers[key] = _compact(value)
+        return result
+
+    def __or__(self, other):
+        return self._combine(other, lambda a, b: a | b, self._containers.keys() | other._containers.keys())
+
+    def __and__(self, other):
+        return self._combine(other, lambda a, b: a & b, self._containers.keys() & other._containers.keys())
+
+    def __sub__(self, other):
+        return self._combine(other, lambda a, b: a & ~b, self._containers.keys())
+
+    def to_bytes(self):
+        parts = [_HEADER.pack(b'WB', FORMAT_VERSION, len(self._containers))]
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            if isinstance(container, int):
+                parts.append(_CONTAINER.pack(key, 1, container.bit_count()))
+                parts.append(container.to_bytes(BITMAP_BYTES, 'little'))
+            else:
+                parts.append(_CONTAINER.pack(key, 0, len(container)))
+                parts.append(_little_endian(container).tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        magic, version, count = _HEADER.unpack_from(data)
+        if magic != b'WB' or version != FORMAT_VERSION:
+            raise ValueError('Not a word bitmap')
+        bitmap = cls()
+        offset = _HEADER.size
+        for _ in range(count):
+            key, kind, cardinality = _CONTAINER.unpack_from(data, offset)
+            offset += _CONTAINER.size
+            if kind == 1:
+                bitmap._containers[key] = int.from_bytes(data[offset:offset + BITMAP_BYTES], 'little')
+                offset += BITMAP_BYTES
+            else:
+                values = array('H')
+                values.frombytes(data[offset:offset + 2 * cardinality])
+                bitmap._containers[key] = _little_endian(values)
+                offset += 2 * cardinality
+        return bitmap
+
+    def to_base64(self):
+        return base64.b64encode(self.to_bytes()).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, text):
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def known_by_share(bitmaps, share, learners=None):
+    """Words in at least `share` (0-1] of `learners` (default: the bitmaps given)
+
+    Learners without a bitmap know no words, so they count towards the
+    threshold without being passed in.
+    """
+    bitmaps = list(bitmaps)
+    result = WordBitmap()
+    if not bitmaps:
+        return result
+    threshold = max(1, math.ceil(share * max(len(bitmaps), learners or 0) - 1e-9))
+    for key in set().union(*(b._containers.keys() for b in bitmaps)):
+        # planes[i] holds bit i of every word's count, added up like a ripple-carry adder
+        planes = []
+        for bitmap in bitmaps:
+            carry = _as_int(bitmap._containers.get(key, 0))
+            for i in range(len(planes)):
+                if not carry:
+                    break
+                planes[i], carry = planes[i] ^ carry, planes[i] & carry
+            if carry:
+                planes.append(carry)
+        if threshold >> len(planes):
+            continue
+        # Compare every count with the threshold from the most significant bit down
+        above, equal = 0, _FULL
+        for i in reversed(range(len(planes))):
+            if threshold >> i & 1:
+                equal &= planes[i]
+            else:
+                above |= equal & planes[i]
+                equal &= ~planes[i]
+        hits = above | equal
+        if hits:
+            result._containers[key] = _compact(hits)
+    return result
+
+
+def build_known(cursor, user_id):
+    """A user's known words from their progress rows"""
+    cursor.execute('SELECT word_id FROM user_word_progress WHERE user_id = ? AND known = TRUE', (user_id,))
+    return WordBitmap(row[0] for row in cursor.fetchall())
+
+
+def load_known(cursor, user_id, for_update=False):
+    """A user's stored bitmap, or one built from their progress rows"""
+    cursor.execute('SELECT bitmap FROM user_known_words WHERE user_id = ?' + (' FOR UPDATE' if for_update else ''),
+                   (user_id,))
+    row = cursor.fetchone()
+    return WordBitmap.from_bytes(row[0]) if row else build_known(cursor, user_id)
+
+
+def store_known(cursor, user_id, bitmap):
+    cursor.execute('''
+        INSERT INTO user_known_words (user_id, bitmap, known_count, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            bitmap = excluded.bitmap,
+            known_count = excluded.known_count,
+            updated_at = excluded.updated_at
+    ''', (user_id, bitmap.to_bytes(), len(bitmap), datetime.now()))
+
+
+def set_known(cursor, user_id, word_id, known, dialect='sqlite'):
+    """Update a user's bitmap; call in the transaction that writes their progress"""
+    # SQLite already holds the write lock here; PostgreSQL needs the row locked
+    bitmap = load_known(cursor, user_id, for_update=dialect == 'postgresql')
+    if known:
+        bitmap.add(word_id)
+    else:
+        bitmap.discard(word_id)
+    store_known(cursor, user_id, bitmap)
+    return bitmap
+
+
+def load_all_known(cursor):
+    """Every learner's bitmap, building the missing ones from progress rows"""
+    cursor.execute('SELECT user_id, bitmap FROM user_known_words')
+    bitmaps = {user_id: WordBitmap.from_bytes(data) for user_id, data in cursor.fetchall()}
+    cursor.execute('SELECT user_id, word_id FROM user_word_progress WHERE known = TRUE')
+    built = {}
+    for user_id, word_id in cursor.fetchall():
+        if user_id not in bitmaps:
+            built.setdefault(user_id, WordBitmap()).add(word_id)
+    bitmaps.update(built)
+    return bitmaps
+
+
+def share_summary(cursor, share):
+    bitmaps = load_all_known(cursor)
+    # A share of every learner, not just those who know a word
+    cursor.execute('SELECT COUNT(*) FROM users')
+    learners = cursor.fetchone()[0]
+    cursor.execute('SELECT id FROM words WHERE deleted_at IS NULL')
+    words = known_by_share(bitmaps.values(), share, learners) & WordBitmap(row[0] for row in cursor.fetchall())
+    return {'learners': learners, 'share': share, 'words': list(words)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the words known by a share of learners')
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--shard-dir', help='summarize every school shard instead')
+    parser.add_argument('--share', type=float, default=0.8, help='fraction of learners, 0-1')
+    args = parser.parse_args(argv)
+
+    if not 0 < args.share <= 1:
+        parser.error('--share must be in (0, 1]')
+    if args.shard_dir:
+        from tenants import fan_out
+        result = fan_out(args.shard_dir, lambda tenant, conn: share_summary(conn.cursor(), args.share))
+    else:
+        import sqlite3
+        conn = sqlite3.connect(args.db)
+        try:
+            result = share_summary(conn.cursor(), args.share)
+        finally:
+            conn.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Word difficulty calibration from quiz outcomes.
+
+Every quiz result is a match between a learner and a word: remembering
+the word is a win for the learner. Both sides carry an Elo rating, so a
+word's rating rises when learners of any level fail it and falls when
+even weak learners remember it. The word rating is stored in
+words.difficulty_score (indexed) for sorting word lists and quizzes.
+
+Runs are incremental: quiz_results are replayed in id order from the
+watermark stored in calibration_state, in chunks that commit together
+with the watermark, so an interrupted run resumes where it stopped.
+Ratings start from the hand-set label (easy/medium/hard) and the K-factor
+shrinks as a word or learner accumulates results.
+
+Usage:
+    python calibration.py --db word_adventure.db
+    python calibration.py --database-url postgresql://...
+"""
+import sys
+import time
+import argparse
+
+from quiz import bump_content_version
+
+INITIAL_RATINGS = {'easy': 1350.0, 'medium': 1500.0, 'hard': 1650.0}
+DEFAULT_RATING = 1500.0
+K_START = 48.0
+K_MIN = 8.0
+K_HALF_LIFE = 30
+CHUNK_ROWS = 50000
+WATERMARK = 'quiz_results'
+
+
+def k_factor(attempts):
+    """Large steps for new words and learners, small ones once settled"""
+    return max(K_MIN, K_START * K_HALF_LIFE / (K_HALF_LIFE + attempts))
+
+
+def load_ratings(cursor):
+    """Current word and learner ratings as {id: [rating, attempts]}"""
+    cursor.execute('SELECT id, difficulty, difficulty_score FROM words')
+    words = {
+        word_id: [score if score is not None else INITIAL_RATINGS.get(label, DEFAULT_RATING), 0]
+        for word_id, label, score in cursor.fetchall()
+    }
+    cursor.execute('SELECT word_id, attempts FROM word_calibration')
+    for word_id, attempts in cursor.fetchall():
+        if word_id in words:
+            words[word_id][1] = attempts
+
+    cursor.execute('SELECT user_id, rating, attempts FROM user_skill')
+    users = {user_id: [rating, attempts] for user_id, rating, attempts in cursor.fetchall()}
+    return words, users
+
+
+def get_watermark(cursor):
+    cursor.execute('SELECT last_id FROM calibration_state WHERE name = ?', (WATERMARK,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def apply_results(rows, words, users):
+    """Replay (user_id, word_id, remembered) results; returns the touched ids"""
+    touched_words, touched_users = set(), set()
+    for user_id, word_id, remembered in rows:
+        word = words.get(word_id)
+        if word is None or user_id is None:
+            continue
+        user = users.get(user_id)
+        if user is None:
+            user = users[user_id] = [DEFAULT_RATING, 0]
+
+        expected = 1.0 / (1.0 + 10.0 ** ((word[0] - user[0]) / 400.0))
+        surprise = (1.0 if remembered else 0.0) - expected
+        user[0] += k_factor(user[1]) * surprise
+        word[0] -= k_factor(word[1]) * surprise
+        user[1] += 1
+        word[1] += 1
+        touched_words.add(word_id)
+        touched_users.add(user_id)
+    return touched_words, touched_users
+
+
+def save(cursor, words, users, touched_words, touched_users, last_id):
+    cursor.executemany('UPDATE words SET difficulty_score = ? WHERE id = ?',
+                       [(words[w][0], w) for w in touched_words])
+    cursor.executemany('''
+        INSERT INTO word_calibration (word_id, attempts) VALUES (?, ?)
+        ON CONFLICT (word_id) DO UPDATE SET attempts = excluded.attempts
+    ''', [(w, words[w][1]) for w in touched_words])
+    cursor.executemany('''
+        INSERT INTO user_skill (user_id, rating, attempts) VALUES (?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET rating = excluded.rating, attempts = excluded.attempts
+    ''', [(u, users[u][0], users[u][1]) for u in touched_users])
+    cursor.execute('''
+        INSERT INTO calibration_state (name, last_id) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+    ''', (WATERMARK, last_id))
+
+
+def calibrate(conn, chunk_rows=CHUNK_ROWS, log=None):
+    """Fold quiz results newer than the watermark into the ratings; returns the count"""
+    cursor = conn.cursor()
+    words, users = load_ratings(cursor)
+
+    # Words nobody has been quizzed on yet still sort by their label
+    labels = ' '.join(f"WHEN '{label}' THEN {rating}" for label, rating in INITIAL_RATINGS.items())
+    cursor.execute(f'''
+        UPDATE words SET difficulty_score = CASE difficulty {labels} ELSE {DEFAULT_RATING} END
+        WHERE difficulty_score IS NULL
+    ''')
+    conn.commit()
+
+    last_id = get_watermark(cursor)
+    processed = 0
+    while True:
+        cursor.execute('''
+            SELECT id, user_id, word_id, remembered FROM quiz_results
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, chunk_rows))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        touched_words, touched_users = apply_results(((r[1], r[2], r[3]) for r in rows), words, users)
+        last_id = rows[-1][0]
+        save(cursor, words, users, touched_words, touched_users, last_id)
+        conn.commit()
+        processed += len(rows)
+        if log:
+            log(f'{processed} results calibrated (through id {last_id})')
+
+    if processed:
+        # Difficulty order changed; quiz pools need rebuilding
+        bump_content_version(cursor)
+        conn.commit()
+    return processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Calibrate word difficulty from quiz results')
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--database-url', help='learner database URL (instead of --db)')
+    args = parser.parse_args(argv)
+
+    from storage import create_backend
+    conn = create_backend(args.database_url or f'sqlite:///{args.db}').connect()
+    started = time.perf_counter()
+    try:
+        processed = calibrate(conn, log=print)
+    finally:
+        conn.close()
+    print(f'Calibrated {processed} new quiz results in {time.perf_counter() - started:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
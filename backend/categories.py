@@ -0,0 +1,117 @@
+"""
+Category listings with word counts, without scanning the words table.
+
+Subcategories are rows of their own (category, name, display position)
+rather than a JSON list on each category. Live words are counted per
+(category, subcategory, difficulty) in category_stats; count_words()
+adjusts those counts in the same transaction as every word insert or
+delete, so listing categories reads three small tables.
+
+CategoryCache builds the listing once per 'words' content version (every
+word write bumps it) and checks the version at most every
+VERSION_CHECK_INTERVAL seconds, like the quiz pools (and like them, takes
+it from the shared vocabulary snapshot when given one, see vocab.py).
+"""
+import time
+import threading
+from collections import Counter
+
+from quiz import content_version, VERSION_CHECK_INTERVAL
+
+
+def store_subcategories(cursor, category_id, names):
+    """Save a category's subcategories in display order"""
+    cursor.executemany('''
+        INSERT INTO subcategories (category_id, name, position) VALUES (?, ?, ?)
+        ON CONFLICT (category_id, name) DO UPDATE SET position = excluded.position
+    ''', [(category_id, name, position) for position, name in enumerate(names)])
+
+
+def count_words(cursor, words, delta=1):
+    """Add (or with delta=-1, remove) words given as (category, subcategory, difficulty) rows"""
+    counts = Counter((category, subcategory or '', difficulty or '') for category, subcategory, difficulty in words)
+    cursor.executemany('''
+        INSERT INTO category_stats (category, subcategory, difficulty, word_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (category, subcategory, difficulty) DO UPDATE SET
+            word_count = category_stats.word_count + excluded.word_count
+    ''', [(*key, count * delta) for key, count in counts.items()])
+
+
+def uncount_words(cursor, ids):
+    """Remove live words by id from the counts; call before soft-deleting them"""
+    if not ids:
+        return
+    cursor.execute(f'''
+        SELECT category, subcategory, difficulty FROM words
+        WHERE deleted_at IS NULL AND id IN ({', '.join('?' * len(ids))})
+    ''', tuple(ids))
+    count_words(cursor, [tuple(row) for row in cursor.fetchall()], delta=-1)
+
+
+def load_categories(cursor):
+    """Categories with their subcategories, word counts and difficulty breakdowns"""
+    cursor.execute('SELECT id, name, emoji, color, description, is_custom FROM categories ORDER BY name')
+    categories = {
+        row[0]: {
+            'id': row[0],
+            'name': row[1],
+            'emoji': row[2],
+            'color': row[3],
+            'description': row[4],
+            'subcategories': [],
+            'isCustom': bool(row[5]),
+            'wordCount': 0,
+            'difficulties': {},
+            'subcategoryCounts': {}
+        }
+        for row in cursor.fetchall()
+    }
+    cursor.execute('SELECT category_id, name FROM subcategories ORDER BY category_id, position')
+    for category_id, name in cursor.fetchall():
+        if category_id in categories:
+            categories[category_id]['subcategories'].append(name)
+    cursor.execute('SELECT category, subcategory, difficulty, word_count FROM category_stats WHERE word_count > 0')
+    for category_id, subcategory, difficulty, count in cursor.fetchall():
+        category = categories.get(category_id)
+        if category is None:
+            continue
+        category['wordCount'] += count
+        category['difficulties'][difficulty] = category['difficulties'].get(difficulty, 0) + count
+        if subcategory:
+            category['subcategoryCounts'][subcategory] = category['subcategoryCounts'].get(subcategory, 0) + count
+    return list(categories.values())
+
+
+class CategoryCache:
+    """The category listing, rebuilt when the words' content version changes"""
+
+    def __init__(self, connect, check_interval=VERSION_CHECK_INTERVAL, vocabulary=None):
+        self.connect = connect
+        self.vocabulary = vocabulary
+        self.check_interval = check_interval
+        self.version = None
+        self.categories = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.categories is not None and now - self._checked_at < self.check_interval:
+            return self.categories
+        with self._lock:
+            if self.categories is not None and now - self._checked_at < self.check_interval:
+                return self.categories
+            conn = self.connect()
+            try:
+                cursor = conn.cursor()
+                version = content_version(cursor)
+                if self.categories is None or self.version != version:
+                    if self.vocabulary is not None:
+                        self.categories = self.vocabulary.categories(cursor, version)
+                    else:
+                        self.categories = load_categories(cursor)
+                    self.version = version
+            finally:
+                conn.close()
+            self._checked_at = time.monotonic()
+            return self.categories
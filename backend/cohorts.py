@@ -0,0 +1,356 @@
+"""
+Vectorized cohort analytics: retention, mastery and difficulty calibration.
+
+The history of a time window is loaded once into NumPy column arrays
+(event user, word, day and success; user signup day; word category and
+difficulty) and every statistic is computed with array operations
+(bincount, unique, searchsorted) instead of per-row Python loops:
+
+- retention: for each weekly signup cohort, the share of users active in
+  each week after signing up; null for weeks that began before the window.
+- mastery: per category, the distribution of learners' success rates.
+- calibration: per difficulty label, the observed success rate of its
+  words, and the words whose rate doesn't match their label.
+
+Events come from quiz_results on the learner database and from
+user_progress (known / last_attempt) on the admin database, whose users
+have no signup date, so cohorts there start at a user's first activity in
+the window. Results are
+cached per window; once older than REFRESH_AFTER seconds the cached value
+is still served while a background thread recomputes it.
+
+NumPy is optional; without it available() is False.
+
+Usage:
+    python cohorts.py --db word_adventure.db --window 90
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import importlib.util
+
+# Imported on first use: numpy alone takes longer to import than the rest of the admin app
+np = None
+
+logger = logging.getLogger('word_adventure.cohorts')
+
+WINDOWS = (7, 30, 90, 365)
+REFRESH_AFTER = float(os.environ.get('WORD_ADVENTURE_COHORT_REFRESH', 300))
+CHUNK_ROWS = 100000
+RETENTION_WEEKS = 12
+MASTERY_BINS = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0000001)
+MIN_ATTEMPTS = 5
+DIFFICULTY_ORDER = ('easy', 'beginner', 'medium', 'intermediate', 'hard', 'advanced')
+
+
+def available():
+    """Whether numpy is installed, checked without importing it"""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def day_expression(column, dialect):
+    """SQL for whole days since the Unix epoch"""
+    if dialect == 'sqlite':
+        return f'CAST(julianday({column}) - 2440587.5 AS INTEGER)'
+    return f'CAST(FLOOR(EXTRACT(EPOCH FROM {column}) / 86400) AS INTEGER)'
+
+
+class Source:
+    """Where the events, users and words of one database live"""
+
+    def __init__(self, events, event_time, success, users, signup, words):
+        self.events = events
+        self.event_time = event_time
+        self.success = success
+        self.users = users
+        self.signup = signup
+        self.words = words
+
+
+LEARNER_SOURCE = Source('quiz_results', 'timestamp', 'remembered', 'users', 'created_at', 'words')
+ADMIN_SOURCE = Source('user_progress', 'last_attempt', 'known', '"user"', None, 'word')
+
+
+def fetch_columns(cursor, sql, params, dtypes):
+    """Run a query and return its columns as arrays, fetching in chunks"""
+    cursor.execute(sql, params)
+    chunks = [[] for _ in dtypes]
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        for chunk, values, dtype in zip(chunks, zip(*rows), dtypes):
+            chunk.append(np.array(values, dtype=dtype))
+    return [np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype) for chunk, dtype in zip(chunks, dtypes)]
+
+
+class Dataset:
+    """Column arrays of one window of history"""
+
+    def __init__(self, conn, source, window_days, dialect='sqlite', today=None):
+        cursor = conn.cursor()
+        param = '?' if dialect == 'sqlite' else '%s'
+        self.today = today if today is not None else int(time.time() // 86400)
+        self.since = since = self.today - window_days
+
+        day = day_expression(source.event_time, dialect)
+        self.event_user, self.event_word, self.event_day, self.event_success = fetch_columns(cursor, f'''
+            SELECT user_id, word_id, {day}, CASE WHEN {source.success} THEN 1 ELSE 0 END
+            FROM {source.events}
+            WHERE user_id IS NOT NULL AND word_id IS NOT NULL
+              AND {source.event_time} IS NOT NULL AND {day} >= {param}
+        ''', (since,), (np.int64, np.int64, np.int64, np.int8))
+
+        if source.signup:
+            self.user_id, self.user_signup = fetch_columns(cursor, f'''
+                SELECT id, COALESCE({day_expression(source.signup, dialect)}, {param}) FROM {source.users} ORDER BY id
+            ''', (self.today,), (np.int64, np.int64))
+        else:
+            self.user_id, = fetch_columns(cursor, f'SELECT id FROM {source.users} ORDER BY id', (), (np.int64,))
+            self.user_signup = None
+
+        word_id, category, difficulty = fetch_columns(cursor, f'''
+            SELECT id, category, difficulty FROM {source.words} ORDER BY id
+        ''', (), (np.int64, object, object))
+        cursor.close()
+        conn.rollback()
+
+        self.word_id = word_id
+        self.categories, self.word_category = np.unique(category.astype(str), return_inverse=True)
+        self.difficulties, self.word_difficulty = np.unique(difficulty.astype(str), return_inverse=True)
+
+        # Map events to user/word positions; drop events of deleted users or words
+        user_pos = np.searchsorted(self.user_id, self.event_user)
+        word_pos = np.searchsorted(self.word_id, self.event_word)
+        valid = ((user_pos < len(self.user_id)) & (word_pos < len(self.word_id)))
+        valid[valid] &= (self.user_id[user_pos[valid]] == self.event_user[valid])
+        valid[valid] &= (self.word_id[word_pos[valid]] == self.event_word[valid])
+        self.event_user_pos = user_pos[valid]
+        self.event_word_pos = word_pos[valid]
+        self.event_day = self.event_day[valid]
+        self.event_success = self.event_success[valid]
+
+        if self.user_signup is None:
+            # No signup dates: only active users count, from their first activity
+            active, self.event_user_pos = np.unique(self.event_user_pos, return_inverse=True)
+            self.user_id = self.user_id[active]
+            self.user_signup = np.full(len(active), self.today, dtype=np.int64)
+            np.minimum.at(self.user_signup, self.event_user_pos, self.event_day)
+
+
+def retention(data, weeks=RETENTION_WEEKS):
+    """Share of each weekly signup cohort active in each following week"""
+    if not len(data.user_id):
+        return []
+    # Day 0 (1970-01-01) was a Thursday; shift so weeks start on Monday
+    signup_week = (data.user_signup + 3) // 7
+    first_week = signup_week.min()
+    cohort = signup_week - first_week
+    cohort_sizes = np.bincount(cohort)
+
+    offset = (data.event_day - data.user_signup[data.event_user_pos]) // 7
+    keep = (offset >= 0) & (offset < weeks)
+    # Count each user once per week offset
+    pairs = np.unique(data.event_user_pos[keep] * weeks + offset[keep])
+    active_user, active_offset = pairs // weeks, pairs % weeks
+    active = np.zeros((len(cohort_sizes), weeks), dtype=np.int64)
+    np.add.at(active, (cohort[active_user], active_offset), 1)
+
+    rates = active / np.maximum(cohort_sizes, 1)[:, None]
+    # Events are only loaded from the window's start, so a week that began
+    # earlier for any of the cohort's users is unknown rather than inactive
+    first_signup = np.full(len(cohort_sizes), data.today, dtype=np.int64)
+    np.minimum.at(first_signup, cohort, data.user_signup)
+    curves = []
+    for index in np.flatnonzero(cohort_sizes):
+        week_start = int(first_week + index) * 7 - 3
+        # Only report weeks the cohort has actually lived through
+        elapsed = min(weeks, (data.today - week_start) // 7 + 1)
+        unseen = min(elapsed, max(0, -(-(data.since - int(first_signup[index])) // 7)))
+        if unseen == elapsed:
+            # Signed up too long before the window to have any week in it
+            continue
+        curves.append({
+            'cohort_week': time.strftime('%Y-%m-%d', time.gmtime(week_start * 86400)),
+            'users': int(cohort_sizes[index]),
+            'retention': [None] * unseen + [round(float(rate), 4) for rate in rates[index, unseen:elapsed]]
+        })
+    return curves
+
+
+def mastery(data, bins=MASTERY_BINS):
+    """Per category, how many learners fall in each success-rate band"""
+    n_categories = len(data.categories)
+    event_category = data.word_category[data.event_word_pos]
+    key = data.event_user_pos * n_categories + event_category
+    attempts = np.bincount(key, minlength=len(data.user_id) * n_categories)
+    successes = np.bincount(key, weights=data.event_success, minlength=len(attempts))
+
+    practiced = np.flatnonzero(attempts)
+    rate = successes[practiced] / attempts[practiced]
+    category = practiced % n_categories
+    band = np.digitize(rate, bins) - 1
+    histogram = np.zeros((n_categories, len(bins) - 1), dtype=np.int64)
+    np.add.at(histogram, (category, band), 1)
+
+    labels = [f'{int(low * 100)}-{int(min(high, 1.0) * 100)}%' for low, high in zip(bins, bins[1:])]
+    result = []
+    for index, name in enumerate(data.categories):
+        learners = int(histogram[index].sum())
+        in_category = rate[category == index]
+        result.append({
+            'category': str(name),
+            'learners': learners,
+            'median_success_rate': round(float(np.median(in_category)), 4) if learners else None,
+            'distribution': dict(zip(labels, (int(count) for count in histogram[index])))
+        })
+    return result
+
+
+def calibration(data, min_attempts=MIN_ATTEMPTS, limit=10):
+    """Observed success rate per difficulty label and the most mislabeled words"""
+    attempts = np.bincount(data.event_word_pos, minlength=len(data.word_id))
+    successes = np.bincount(data.event_word_pos, weights=data.event_success, minlength=len(data.word_id))
+    rated = attempts >= min_attempts
+    rate = np.divide(successes, attempts, out=np.full(len(attempts), np.nan), where=attempts > 0)
+
+    labels = []
+    medians = np.full(len(data.difficulties), np.nan)
+    for index, name in enumerate(data.difficulties):
+        words = rated & (data.word_difficulty == index)
+        if words.any():
+            medians[index] = np.median(rate[words])
+            p25, p75 = np.percentile(rate[words], [25, 75])
+        labels.append({
+            'difficulty': str(name),
+            'words': int((data.word_difficulty == index).sum()),
+            'rated_words': int(words.sum()),
+            'attempts': int(attempts[data.word_difficulty == index].sum()),
+            'success_rate': round(float(successes[words].sum() / attempts[words].sum()), 4) if words.any() else None,
+            'p25': round(float(p25), 4) if words.any() else None,
+            'median': round(float(medians[index]), 4) if words.any() else None,
+            'p75': round(float(p75), 4) if words.any() else None
+        })
+    labels.sort(key=lambda label: DIFFICULTY_ORDER.index(label['difficulty'])
+                if label['difficulty'] in DIFFICULTY_ORDER else len(DIFFICULTY_ORDER))
+
+    # Words furthest from the typical success rate of their label
+    deviation = np.abs(rate - medians[data.word_difficulty])
+    candidates = np.flatnonzero(rated & ~np.isnan(deviation))
+    worst = candidates[np.argsort(-deviation[candidates], kind='stable')[:limit]]
+    outliers = [{
+        'word_id': int(data.word_id[i]),
+        'difficulty': str(data.difficulties[data.word_difficulty[i]]),
+        'attempts': int(attempts[i]),
+        'success_rate': round(float(rate[i]), 4),
+        'label_median': round(float(medians[data.word_difficulty[i]]), 4)
+    } for i in worst]
+    return {'labels': labels, 'outliers': outliers}
+
+
+def compute(conn, source, window_days, dialect='sqlite', today=None):
+    load_numpy()
+    data = Dataset(conn, source, window_days, dialect, today)
+    return {
+        'window_days': window_days,
+        'events': int(len(data.event_day)),
+        'users': int(len(data.user_id)),
+        'retention': retention(data),
+        'mastery': mastery(data),
+        'calibration': calibration(data)
+    }
+
+
+class CohortCache:
+    """Results per window, served stale while a background refresh runs"""
+
+    def __init__(self, connect, source, dialect='sqlite', refresh_after=REFRESH_AFTER):
+        self.connect = connect
+        self.source = source
+        self.dialect = dialect
+        self.refresh_after = refresh_after
+        self._results = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def compute(self, window_days):
+        conn = self.connect()
+        try:
+            started = time.perf_counter()
+            result = compute(conn, self.source, window_days, self.dialect)
+            result['compute_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        finally:
+            conn.close()
+        result['computed_at'] = time.time()
+        self._results[window_days] = result
+        return result
+
+    def refresh_in_background(self, window_days):
+        with self._lock:
+            if window_days in self._refreshing:
+                return
+            self._refreshing.add(window_days)
+
+        def run():
+            try:
+                self.compute(window_days)
+            except Exception:
+                logger.exception('Cohort refresh for %s days failed', window_days)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(window_days)
+
+        threading.Thread(target=run, name=f'cohorts-{window_days}d', daemon=True).start()
+
+    def get(self, window_days):
+        """Cached result for a window; computed now only if never computed"""
+        result = self._results.get(window_days)
+        if result is None:
+            return self.compute(window_days)
+        if time.time() - result['computed_at'] > self.refresh_after:
+            self.refresh_in_background(window_days)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cohort retention, mastery and difficulty calibration')
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--admin-uri', help='admin database SQLAlchemy URI (instead of --db)')
+    parser.add_argument('--window', type=int, default=90, help='days of history to analyze')
+    args = parser.parse_args(argv)
+
+    if not available():
+        print('Cohort analytics need numpy: pip install numpy', file=sys.stderr)
+        return 1
+
+    if args.admin_uri:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.admin_uri)
+        pooled = engine.raw_connection()
+        conn, source, dialect = pooled.dbapi_connection, ADMIN_SOURCE, engine.dialect.name
+    else:
+        import sqlite3
+        pooled = conn = sqlite3.connect(args.db)
+        source, dialect = LEARNER_SOURCE, 'sqlite'
+
+    try:
+        print(json.dumps(compute(conn, source, args.window, dialect), indent=2))
+    finally:
+        pooled.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,26 @@
 import os
 import json
+import threading
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
 from flask_cors import CORS
-import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
+from events import hub, sse_response
+from achievements import AchievementEngine
+from streaks import record_activity, current_streak, is_valid_timezone
+from leaderboard import Leaderboards, BOARDS, MAX_LIMIT
+from instrumentation import init_app as init_instrumentation
+from migrations import migrate, analyze, is_current, LEARNER_MIGRATIONS
+from startup import phase
+from storage import SQLiteBackend, backend, read_backend
+from tenants import SHARD_DIR, ShardRouter, UnknownTenant, current_tenant, tenant_claims, valid_tenant
+from serialization import list_response
+from bitmaps import WordBitmap, load_known, set_known
+from categories import CategoryCache, count_words, store_subcategories
+from revocation import init_app as init_revocation, load as load_denylist, revoke_token
+from vocab import SNAPSHOT_PATH, VocabularyFile
+from quiz import QuizService, bump_content_version, DEFAULT_COUNT as QUIZ_DEFAULT_COUNT, MAX_COUNT as QUIZ_MAX_COUNT
 
 app = Flask(__name__, static_folder='../dist')
 
@@ -13,21 +28,33 @@ app = Flask(__name__, static_folder='../dist')
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-in-production'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
+# EventSource can't send headers, so the live stream takes the token from the URL
+app.config['JWT_TOKEN_LOCATION'] = ['headers', 'query_string']
+
+# The database is set up on first use (see setup()); this hook comes before
+# the instrumentation's so setup statements aren't counted against a request
+@app.before_request
+def ensure_setup():
+    setup()
 
 # Initialize extensions
 jwt = JWTManager(app)
 CORS(app, origins="*")  # Allow all origins for development
+init_instrumentation(app)
+init_revocation(app, jwt)
 
-# Database setup
-DATABASE = 'word_adventure.db'
-
-def init_db():
+# Database setup (SQLite by default, see storage.py for PostgreSQL)
+def init_db(db=backend):
     """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE)
+    conn = db.connect()
+    if is_current(conn, LEARNER_MIGRATIONS):
+        # Already set up by an earlier start
+        conn.close()
+        return
     cursor = conn.cursor()
     
     # Users table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
@@ -43,12 +70,13 @@ def init_db():
             last_play_date TEXT,
             total_words_learned INTEGER DEFAULT 0,
             total_quizzes_taken INTEGER DEFAULT 0,
-            perfect_scores INTEGER DEFAULT 0
+            perfect_scores INTEGER DEFAULT 0,
+            timezone TEXT DEFAULT 'UTC'
         )
-    ''')
+    '''))
     
     # Words table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS words (
             id INTEGER PRIMARY KEY,
             word TEXT NOT NULL,
@@ -61,10 +89,10 @@ def init_db():
             category TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
+    '''))
     
     # User word progress table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS user_word_progress (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER,
@@ -78,10 +106,10 @@ def init_db():
             FOREIGN KEY (word_id) REFERENCES words (id),
             UNIQUE(user_id, word_id)
         )
-    ''')
+    '''))
     
     # Quiz results table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS quiz_results (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER,
@@ -92,10 +120,10 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (id),
             FOREIGN KEY (word_id) REFERENCES words (id)
         )
-    ''')
+    '''))
     
     # Achievements table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS user_achievements (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER,
@@ -104,10 +132,10 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (id),
             UNIQUE(user_id, achievement_id)
         )
-    ''')
+    '''))
     
     # Virtual pet table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS virtual_pets (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER UNIQUE,
@@ -119,10 +147,10 @@ def init_db():
             last_fed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
-    ''')
+    '''))
     
     # Categories table
-    cursor.execute('''
+    cursor.execute(db.ddl('''
         CREATE TABLE IF NOT EXISTS categories (
             id TEXT PRIMARY KEY,
             name TEXT NOT NULL,
@@ -132,20 +160,84 @@ def init_db():
             subcategories TEXT DEFAULT '[]',
             is_custom BOOLEAN DEFAULT FALSE
         )
-    ''')
+    '''))
     
     conn.commit()
     conn.close()
+    
+    # Columns, tables and indexes added since the first release
+    with db.raw_connection() as raw:
+        migrate(raw, LEARNER_MIGRATIONS, dialect=db.dialect)
+
+class Shard:
+    """A learner database and the caches built on it"""
+    
+    def __init__(self, db, read_db, vocabulary=None):
+        self.db = db
+        self.read_db = read_db
+        self.vocabulary = vocabulary
+        self.leaderboards = Leaderboards(read_db.connect)
+        self.quiz_service = QuizService(db.connect, vocabulary=vocabulary)
+        self.categories = CategoryCache(read_db.connect, vocabulary=vocabulary)
+        # User ids are only unique within a shard, so each caches its own users' achievements
+        self.achievements = AchievementEngine()
+        self._live_words = None
+    
+    def live_words(self):
+        """Bitmap of the words not deleted, rebuilt along with the quiz pools"""
+        pools = self.quiz_service.get_pools()
+        if self._live_words is None or self._live_words[0] is not pools:
+            self._live_words = (pools, WordBitmap(pools.words))
+        return self._live_words[1]
+    
+    def close(self):
+        self.db.close()
+
+def open_school_shard(school, path):
+    """Open a school's database, creating its schema and sample words if new"""
+    db = SQLiteBackend(path)
+    init_db(db)
+    populate_sample_data(db)
+    return Shard(db, db.read_only())
+
+# Workers share the main database's words through a mapped snapshot when one is configured (see vocab.py)
+main_shard = Shard(backend, read_backend, VocabularyFile(SNAPSHOT_PATH) if SNAPSHOT_PATH else None)
+# Schools get their own SQLite files when WORD_ADVENTURE_SHARD_DIR is set (see tenants.py)
+school_shards = ShardRouter(SHARD_DIR, open_school_shard) if SHARD_DIR else None
+
+def current_shard():
+    """The database of the current request's school (the main one without a school)"""
+    school = current_tenant()
+    if school is None or school_shards is None:
+        return main_shard
+    return school_shards.get(school)
 
 def get_db_connection():
     """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return current_shard().db.connect()
+
+def known_school(school):
+    """Whether learners may name this school (only schools with a shard)"""
+    return school_shards is None or school_shards.exists(school)
+
+@app.errorhandler(UnknownTenant)
+def unknown_school(e):
+    # A token naming a school whose shard has since been removed
+    return jsonify({'error': 'Unknown school'}), 404
 
-def populate_sample_data():
+@app.teardown_request
+def end_database_request(exc):
+    # Runs even when the route raised, so a write it left open can't keep the memory backend's lock
+    backend.end_request()
+
+def user_topic(user_id):
+    """Live-event topic of a learner (ids are only unique within a school)"""
+    school = current_tenant() if school_shards is not None else None
+    return f'user:{school}:{user_id}' if school else f'user:{user_id}'
+
+def populate_sample_data(db=backend):
     """Populate database with sample words and categories"""
-    conn = get_db_connection()
+    conn = db.connect()
     cursor = conn.cursor()
     
     # Check if data already exists
@@ -167,9 +259,12 @@ def populate_sample_data():
     ]
     
     cursor.executemany('''
-        INSERT OR IGNORE INTO categories (id, name, emoji, color, description, subcategories, is_custom)
+        INSERT INTO categories (id, name, emoji, color, description, subcategories, is_custom)
         VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
     ''', categories)
+    for category in categories:
+        store_subcategories(cursor, category[0], json.loads(category[5]))
     
     # Sample words (first 50 from the database)
     sample_words = [
@@ -196,16 +291,68 @@ def populate_sample_data():
     ]
     
     cursor.executemany('''
-        INSERT OR IGNORE INTO words (id, word, image, pronunciation, definition, example, fun_fact, difficulty, category)
+        INSERT INTO words (id, word, image, pronunciation, definition, example, fun_fact, difficulty, category)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
     ''', sample_words)
+    count_words(cursor, [(w[8], None, w[7]) for w in sample_words])
+    bump_content_version(cursor)
     
     conn.commit()
+    analyze(conn, ['words', 'categories', 'subcategories'])
     conn.close()
 
-# Initialize database on startup
-init_db()
-populate_sample_data()
+def publish_user_stats(cursor, user_id, reason, **extra):
+    """Push the user's current XP and level to their live dashboard"""
+    topic = user_topic(user_id)
+    if not hub.subscriber_count(topic):
+        return
+    
+    cursor.execute('''
+        SELECT xp, level, streak, total_words_learned, total_quizzes_taken
+        FROM users WHERE id = ?
+    ''', (user_id,))
+    user = cursor.fetchone()
+    if not user:
+        return
+    
+    hub.publish(topic, 'stats', {
+        'reason': reason,
+        'xp': user['xp'],
+        'level': user['level'],
+        'streak': user['streak'],
+        'totalWordsLearned': user['total_words_learned'],
+        'totalQuizzesTaken': user['total_quizzes_taken'],
+        **extra
+    })
+
+_setup_lock = threading.Lock()
+_setup_done = False
+
+def setup():
+    """Create or upgrade the schema and seed sample data, once per process"""
+    global _setup_done
+    if _setup_done:
+        return
+    with _setup_lock:
+        if not _setup_done:
+            with phase('learner schema'):
+                init_db()
+            with phase('sample data'):
+                populate_sample_data()
+            if main_shard.vocabulary is not None:
+                with phase('vocabulary snapshot'):
+                    main_shard.vocabulary.refresh(backend.connect)
+            # Revocations live in the main database, whatever the learner's school
+            with phase('token denylist'):
+                load_denylist(app, backend.connect)
+            _setup_done = True
+
+def create_app():
+    """The app with its database ready (serve.py calls this in its master
+    process, so setup runs once before workers are forked)"""
+    setup()
+    return app
 
 # API Routes
 
@@ -218,10 +365,21 @@ def register():
     password = data.get('password', 'demo123')  # Default password for demo
     age_group = data.get('age_group', 'child')
     parent_email = data.get('parent_email', '')
+    user_timezone = data.get('timezone', 'UTC')
+    school = data.get('school')
     
     if not username:
         return jsonify({'error': 'Username is required'}), 400
     
+    if not is_valid_timezone(user_timezone):
+        return jsonify({'error': 'Unknown timezone'}), 400
+    
+    if school is not None and not valid_tenant(school):
+        return jsonify({'error': 'Invalid school'}), 400
+    
+    if school is not None and not known_school(school):
+        return jsonify({'error': 'Unknown school'}), 400
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -234,11 +392,12 @@ def register():
     # Create new user
     password_hash = generate_password_hash(password)
     cursor.execute('''
-        INSERT INTO users (username, email, password_hash, age_group, parent_email)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (username, email, password_hash, age_group, parent_email))
+        INSERT INTO users (username, email, password_hash, age_group, parent_email, timezone)
+        VALUES (?, ?, ?, ?, ?, ?)
+        RETURNING id
+    ''', (username, email, password_hash, age_group, parent_email, user_timezone))
     
-    user_id = cursor.lastrowid
+    user_id = cursor.fetchone()[0]
     
     # Create virtual pet for the user
     cursor.execute('''
@@ -250,7 +409,7 @@ def register():
     conn.close()
     
     # Create access token
-    access_token = create_access_token(identity=user_id)
+    access_token = create_access_token(identity=user_id, additional_claims=tenant_claims(school))
     
     return jsonify({
         'access_token': access_token,
@@ -258,7 +417,8 @@ def register():
             'id': user_id,
             'username': username,
             'email': email,
-            'age_group': age_group
+            'age_group': age_group,
+            'school': school
         }
     })
 
@@ -268,10 +428,21 @@ def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password', 'demo123')
+    user_timezone = data.get('timezone')
+    school = data.get('school')
     
     if not username:
         return jsonify({'error': 'Username is required'}), 400
     
+    if user_timezone is not None and not is_valid_timezone(user_timezone):
+        return jsonify({'error': 'Unknown timezone'}), 400
+    
+    if school is not None and not valid_tenant(school):
+        return jsonify({'error': 'Invalid school'}), 400
+    
+    if school is not None and not known_school(school):
+        return jsonify({'error': 'Unknown school'}), 400
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -283,11 +454,12 @@ def login():
         # Auto-register for demo purposes
         password_hash = generate_password_hash(password)
         cursor.execute('''
-            INSERT INTO users (username, email, password_hash, age_group)
-            VALUES (?, ?, ?, ?)
-        ''', (username, f'{username}@wordadventure.com', password_hash, 'child'))
+            INSERT INTO users (username, email, password_hash, age_group, timezone)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id
+        ''', (username, f'{username}@wordadventure.com', password_hash, 'child', user_timezone or 'UTC'))
         
-        user_id = cursor.lastrowid
+        user_id = cursor.fetchone()[0]
         
         # Create virtual pet
         cursor.execute('''
@@ -304,68 +476,83 @@ def login():
     # Update last login
     cursor.execute('UPDATE users SET last_login = ? WHERE id = ?', 
                    (datetime.now(), user['id']))
+    
+    # Keep the user's day boundaries in sync with their device
+    if user_timezone and user_timezone != user['timezone']:
+        cursor.execute('UPDATE users SET timezone = ? WHERE id = ?', (user_timezone, user['id']))
     conn.commit()
     conn.close()
     
     # Create access token
-    access_token = create_access_token(identity=user['id'])
+    access_token = create_access_token(identity=user['id'], additional_claims=tenant_claims(school))
     
     return jsonify({
         'access_token': access_token,
         'user': {
             'id': user['id'],
             'username': user['username'],
+            'school': school,
             'email': user['email'],
             'age_group': user['age_group'],
             'xp': user['xp'],
             'level': user['level'],
-            'streak': user['streak']
+            'streak': current_streak(user['streak'], user['last_play_date'], user_timezone or user['timezone'])
         }
     })
 
+# Word list orderings; difficulty uses the calibrated score (see calibration.py)
+WORD_SORTS = {
+    'word': 'w.word',
+    'difficulty': 'w.difficulty_score IS NULL, w.difficulty_score, w.word',
+    'difficulty_desc': 'w.difficulty_score IS NULL, w.difficulty_score DESC, w.word'
+}
+# Response keys of the word list, in SELECT order
+WORD_COLUMNS = ('id', 'word', 'image', 'pronunciation', 'definition', 'example', 'funFact',
+                'difficulty', 'category', 'difficultyScore', 'known', 'masteryLevel')
+
+@app.route('/api/auth/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Logout user by revoking their token"""
+    revoke_token(get_jwt())
+    return jsonify({'message': 'Successfully logged out'})
+
 @app.route('/api/words', methods=['GET'])
 @jwt_required()
 def get_words():
     """Get all words with user progress"""
     user_id = get_jwt_identity()
+    sort = request.args.get('sort', 'word')
+    
+    if sort not in WORD_SORTS:
+        return jsonify({'error': f"sort must be one of {', '.join(WORD_SORTS)}"}), 400
     
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # Get words with user progress
-    cursor.execute('''
-        SELECT w.*, COALESCE(uwp.known, 0) as known, 
+    # Plain tuples: the encoder pairs them with WORD_COLUMNS itself
+    cursor.row_factory = None
+    
+    # Get words with user progress, streamed from the cursor as the body is sent
+    cursor.execute(f'''
+        SELECT w.id, w.word, w.image, w.pronunciation, w.definition, w.example, w.fun_fact,
+               w.difficulty, w.category, w.difficulty_score,
+               COALESCE(uwp.known, FALSE) as known,
                COALESCE(uwp.mastery_level, 0) as mastery_level
         FROM words w
         LEFT JOIN user_word_progress uwp ON w.id = uwp.word_id AND uwp.user_id = ?
-        ORDER BY w.word
+        WHERE w.deleted_at IS NULL
+        ORDER BY {WORD_SORTS[sort]}
     ''', (user_id,))
     
-    words = []
-    for row in cursor.fetchall():
-        words.append({
-            'id': row['id'],
-            'word': row['word'],
-            'image': row['image'],
-            'pronunciation': row['pronunciation'],
-            'definition': row['definition'],
-            'example': row['example'],
-            'funFact': row['fun_fact'],
-            'difficulty': row['difficulty'],
-            'category': row['category'],
-            'known': bool(row['known']),
-            'masteryLevel': row['mastery_level']
-        })
-    
-    conn.close()
-    return jsonify(words)
+    response = list_response(WORD_COLUMNS, cursor, convert={'known': bool})
+    response.call_on_close(conn.close)
+    return response
 
 @app.route('/api/words/<int:word_id>/progress', methods=['PUT'])
 @jwt_required()
-def update_word_progress():
+def update_word_progress(word_id):
     """Update user's progress on a word"""
     user_id = get_jwt_identity()
-    word_id = request.view_args['word_id']
     data = request.get_json()
     
     known = data.get('known', False)
@@ -374,12 +561,20 @@ def update_word_progress():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # Keep the daily streak up to date
+    streak = record_activity(cursor, user_id)
+    
     # Update or insert progress
     cursor.execute('''
-        INSERT OR REPLACE INTO user_word_progress 
+        INSERT INTO user_word_progress 
         (user_id, word_id, known, mastery_level, last_practiced)
         VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, word_id) DO UPDATE SET
+            known = excluded.known,
+            mastery_level = excluded.mastery_level,
+            last_practiced = excluded.last_practiced
     ''', (user_id, word_id, known, mastery_level, datetime.now()))
+    set_known(cursor, user_id, word_id, known, current_shard().db.dialect)
     
     # Update user stats if word was learned
     if known:
@@ -387,22 +582,51 @@ def update_word_progress():
             UPDATE users SET 
                 total_words_learned = (
                     SELECT COUNT(*) FROM user_word_progress 
-                    WHERE user_id = ? AND known = 1
+                    WHERE user_id = ? AND known = TRUE
                 ),
                 xp = xp + 10
             WHERE id = ?
         ''', (user_id, user_id))
+        current_shard().leaderboards.record_xp(cursor, user_id, 10)
         
         # Update level based on XP
-        cursor.execute('SELECT xp FROM users WHERE id = ?', (user_id,))
-        xp = cursor.fetchone()['xp']
-        new_level = (xp // 100) + 1
+        cursor.execute('SELECT xp, total_words_learned FROM users WHERE id = ?', (user_id,))
+        user = cursor.fetchone()
+        new_level = (user['xp'] // 100) + 1
         cursor.execute('UPDATE users SET level = ? WHERE id = ?', (new_level, user_id))
+        
+        # Unlock achievements in the same transaction
+        evaluation = current_shard().achievements.process(
+            cursor, user_id,
+            xp=user['xp'],
+            level=new_level,
+            streak=streak,
+            total_words_learned=user['total_words_learned']
+        )
+    else:
+        evaluation = current_shard().achievements.process(cursor, user_id, streak=streak)
     
     conn.commit()
+    current_shard().achievements.confirm(evaluation)
+    unlocked = evaluation.unlocked
+    current_shard().quiz_service.forget(user_id)
+    if known:
+        current_shard().leaderboards.apply_xp(user_id, 10)
+    publish_user_stats(cursor, user_id, 'progress', wordId=word_id, known=bool(known),
+                       newAchievements=unlocked)
     conn.close()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'achievements_unlocked': unlocked})
+
+@app.route('/api/quiz/next', methods=['GET'])
+@jwt_required()
+def get_next_quiz():
+    """Get the next adaptive quiz questions with multiple-choice answers"""
+    user_id = get_jwt_identity()
+    count = max(1, min(request.args.get('count', QUIZ_DEFAULT_COUNT, type=int), QUIZ_MAX_COUNT))
+    category = request.args.get('category')
+    
+    return jsonify(current_shard().quiz_service.next_quiz(user_id, count=count, category=category))
 
 @app.route('/api/quiz/submit', methods=['POST'])
 @jwt_required()
@@ -424,6 +648,9 @@ def submit_quiz_result():
         VALUES (?, ?, ?, ?)
     ''', (user_id, word_id, remembered, quiz_type))
     
+    # Keep the daily streak up to date
+    streak = record_activity(cursor, user_id)
+    
     # Update user stats
     xp_gained = 15 if remembered else 5
     cursor.execute('''
@@ -432,17 +659,31 @@ def submit_quiz_result():
             xp = xp + ?
         WHERE id = ?
     ''', (xp_gained, user_id))
+    current_shard().leaderboards.record_xp(cursor, user_id, xp_gained)
     
     # Update level
-    cursor.execute('SELECT xp FROM users WHERE id = ?', (user_id,))
-    xp = cursor.fetchone()['xp']
-    new_level = (xp // 100) + 1
+    cursor.execute('SELECT xp, total_quizzes_taken FROM users WHERE id = ?', (user_id,))
+    user = cursor.fetchone()
+    new_level = (user['xp'] // 100) + 1
     cursor.execute('UPDATE users SET level = ? WHERE id = ?', (new_level, user_id))
     
+    # Unlock achievements in the same transaction
+    evaluation = current_shard().achievements.process(
+        cursor, user_id,
+        xp=user['xp'],
+        level=new_level,
+        streak=streak,
+        total_quizzes_taken=user['total_quizzes_taken']
+    )
+    
     conn.commit()
+    current_shard().achievements.confirm(evaluation)
+    unlocked = evaluation.unlocked
+    current_shard().leaderboards.apply_xp(user_id, xp_gained)
+    publish_user_stats(cursor, user_id, 'quiz', xpGained=xp_gained, newAchievements=unlocked)
     conn.close()
     
-    return jsonify({'success': True, 'xp_gained': xp_gained})
+    return jsonify({'success': True, 'xp_gained': xp_gained, 'achievements_unlocked': unlocked})
 
 @app.route('/api/user/stats', methods=['GET'])
 @jwt_required()
@@ -473,7 +714,7 @@ def get_user_stats():
             'username': user['username'],
             'xp': user['xp'],
             'level': user['level'],
-            'streak': user['streak'],
+            'streak': current_streak(user['streak'], user['last_play_date'], user['timezone']),
             'totalWordsLearned': user['total_words_learned'],
             'totalQuizzesTaken': user['total_quizzes_taken'],
             'perfectScores': user['perfect_scores'],
@@ -489,27 +730,74 @@ def get_user_stats():
         } if pet else None
     })
 
-@app.route('/api/categories', methods=['GET'])
-def get_categories():
-    """Get all categories"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+@app.route('/api/user/known', methods=['GET'])
+@jwt_required()
+def get_known_words():
+    """Get the user's known words as a compressed bitmap (see bitmaps.py)"""
+    user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'base64')
     
-    cursor.execute('SELECT * FROM categories ORDER BY name')
-    categories = []
-    for row in cursor.fetchall():
-        categories.append({
-            'id': row['id'],
-            'name': row['name'],
-            'emoji': row['emoji'],
-            'color': row['color'],
-            'description': row['description'],
-            'subcategories': json.loads(row['subcategories']),
-            'isCustom': bool(row['is_custom'])
-        })
+    if fmt not in ('base64', 'binary'):
+        return jsonify({'error': 'Format must be one of: base64, binary'}), 400
     
+    conn = get_db_connection()
+    known = load_known(conn.cursor(), user_id)
     conn.close()
-    return jsonify(categories)
+    
+    # Leave out words deleted since they were learned
+    known &= current_shard().live_words()
+    
+    if fmt == 'binary':
+        return Response(known.to_bytes(), mimetype='application/octet-stream',
+                        headers={'X-Known-Count': str(len(known))})
+    return jsonify({
+        'count': len(known),
+        'encoding': 'word-bitmap-v1',
+        'bitmap': known.to_base64()
+    })
+
+@app.route('/api/events', methods=['GET'])
+@jwt_required()
+def user_events():
+    """Stream live XP, level and achievement updates for the current user"""
+    user_id = get_jwt_identity()
+    return sse_response(user_topic(user_id))
+
+@app.route('/api/leaderboard', methods=['GET'])
+@jwt_required()
+def get_leaderboard():
+    """Get the top learners and the current user's rank"""
+    user_id = get_jwt_identity()
+    board = request.args.get('board', 'global')
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_LIMIT))
+    
+    if board not in BOARDS:
+        return jsonify({'error': f"Board must be one of: {', '.join(BOARDS)}"}), 400
+    
+    group = None
+    if board == 'age_group':
+        group = request.args.get('age_group')
+        if not group:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT age_group FROM users WHERE id = ?', (user_id,))
+            row = cursor.fetchone()
+            conn.close()
+            group = row['age_group'] if row else 'child'
+        elif not current_shard().leaderboards.valid_group(group):
+            return jsonify({'error': 'Unknown age group'}), 400
+    
+    return jsonify({
+        'board': board,
+        'group': group,
+        'entries': current_shard().leaderboards.top(board, group, limit),
+        'me': current_shard().leaderboards.rank(user_id, board, group)
+    })
+
+@app.route('/api/categories', methods=['GET'])
+def get_categories():
+    """Get all categories with their word counts (see categories.py)"""
+    return jsonify(current_shard().categories.get())
 
 @app.route('/api/pet/feed', methods=['POST'])
 @jwt_required()
@@ -522,18 +810,33 @@ def feed_pet():
     
     cursor.execute('''
         UPDATE virtual_pets SET 
-            happiness = MIN(100, happiness + 15),
+            happiness = CASE WHEN happiness + 15 > 100 THEN 100 ELSE happiness + 15 END,
             last_fed = ?
         WHERE user_id = ?
     ''', (datetime.now(), user_id))
     
     # Add XP for pet care
     cursor.execute('UPDATE users SET xp = xp + 5 WHERE id = ?', (user_id,))
+    current_shard().leaderboards.record_xp(cursor, user_id, 5)
+    
+    # Unlock achievements in the same transaction
+    cursor.execute('SELECT happiness, growth FROM virtual_pets WHERE user_id = ?', (user_id,))
+    pet = cursor.fetchone()
+    evaluation = current_shard().achievements.process(
+        cursor, user_id,
+        pet_happiness=pet['happiness'],
+        pet_growth=pet['growth']
+    ) if pet else None
     
     conn.commit()
+    if evaluation:
+        current_shard().achievements.confirm(evaluation)
+    unlocked = evaluation.unlocked if evaluation else []
+    current_shard().leaderboards.apply_xp(user_id, 5)
+    publish_user_stats(cursor, user_id, 'pet_feed', xpGained=5, newAchievements=unlocked)
     conn.close()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'achievements_unlocked': unlocked})
 
 @app.route('/api/pet/play', methods=['POST'])
 @jwt_required()
@@ -546,18 +849,33 @@ def play_with_pet():
     
     cursor.execute('''
         UPDATE virtual_pets SET 
-            happiness = MIN(100, happiness + 10),
-            growth = MIN(100, growth + 5)
+            happiness = CASE WHEN happiness + 10 > 100 THEN 100 ELSE happiness + 10 END,
+            growth = CASE WHEN growth + 5 > 100 THEN 100 ELSE growth + 5 END
         WHERE user_id = ?
     ''', (user_id,))
     
     # Add XP for pet play
     cursor.execute('UPDATE users SET xp = xp + 5 WHERE id = ?', (user_id,))
+    current_shard().leaderboards.record_xp(cursor, user_id, 5)
+    
+    # Unlock achievements in the same transaction
+    cursor.execute('SELECT happiness, growth FROM virtual_pets WHERE user_id = ?', (user_id,))
+    pet = cursor.fetchone()
+    evaluation = current_shard().achievements.process(
+        cursor, user_id,
+        pet_happiness=pet['happiness'],
+        pet_growth=pet['growth']
+    ) if pet else None
     
     conn.commit()
+    if evaluation:
+        current_shard().achievements.confirm(evaluation)
+    unlocked = evaluation.unlocked if evaluation else []
+    current_shard().leaderboards.apply_xp(user_id, 5)
+    publish_user_stats(cursor, user_id, 'pet_play', xpGained=5, newAchievements=unlocked)
     conn.close()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'achievements_unlocked': unlocked})
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
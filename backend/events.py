@@ -0,0 +1,121 @@
+"""
+In-process event hub used to push live updates to dashboards.
+
+Routes publish small events to a topic (``user:<id>`` for a learner,
+``admin`` for the admin dashboards) and every subscriber of that topic
+receives them through a Server-Sent Events stream. Publishing never
+blocks: each subscriber has a bounded buffer and the oldest events are
+dropped when a slow client falls behind.
+
+The hub is per process. When running several workers with serve.py a
+client only receives events published by the worker it is connected to.
+"""
+import json
+import threading
+from collections import deque
+from flask import Response, stream_with_context
+
+SUBSCRIBER_BUFFER = 64
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscription:
+    """A single subscriber's buffered view of one topic"""
+
+    __slots__ = ('topic', 'events', 'ready', 'dropped')
+
+    def __init__(self, topic, buffer_size=SUBSCRIBER_BUFFER):
+        self.topic = topic
+        self.events = deque(maxlen=buffer_size)
+        self.ready = threading.Event()
+        self.dropped = 0
+
+    def push(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        self.ready.set()
+
+    def wait(self, timeout=HEARTBEAT_INTERVAL):
+        """Wait for events and return everything buffered so far"""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+
+class EventHub:
+    """Fan-out of published events to topic subscribers"""
+
+    def __init__(self, buffer_size=SUBSCRIBER_BUFFER):
+        self.buffer_size = buffer_size
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        subscription = Subscription(topic, self.buffer_size)
+        with self._lock:
+            # Topics hold immutable tuples so publish() can read them without the lock
+            self._topics[topic] = self._topics.get(topic, ()) + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            remaining = tuple(s for s in self._topics.get(subscription.topic, ()) if s is not subscription)
+            if remaining:
+                self._topics[subscription.topic] = remaining
+            else:
+                self._topics.pop(subscription.topic, None)
+
+    def publish(self, topic, event, data):
+        """Send an event to every subscriber of a topic; returns the subscriber count"""
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        message = format_sse(event, data)
+        for subscription in subscribers:
+            subscription.push(message)
+        return len(subscribers)
+
+    def subscriber_count(self, topic=None):
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+    def stream(self, topic, heartbeat=HEARTBEAT_INTERVAL):
+        """Generator yielding SSE-formatted messages until the client disconnects"""
+        subscription = self.subscribe(topic)
+        try:
+            # Tell the client how long to wait before reconnecting
+            yield 'retry: 5000\n\n'
+            while True:
+                events = subscription.wait(heartbeat)
+                if events:
+                    yield ''.join(events)
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_sse(event, data):
+    """Encode an event in the text/event-stream wire format"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def sse_response(topic):
+    """Build a streaming Flask response for a topic"""
+    return Response(
+        stream_with_context(hub.stream(topic)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+# Shared hub for the process
+hub = EventHub()
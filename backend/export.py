@@ -0,0 +1,374 @@
+"""
+Streaming columnar export of learning history for offline reporting.
+
+Exports quiz_results and user_word_progress from the learner database and
+user_progress from the admin database, partitioned by date:
+
+    <out>/<table>/date=YYYY-MM-DD/part-00000.parquet
+
+Rows are read in CHUNK_ROWS batches from a server-side cursor (a named
+cursor on PostgreSQL, the lazily stepped cursor on SQLite) in date order,
+and each batch is written out before the next one is fetched, so memory
+stays constant however large the table is. Parquet and Arrow IPC need
+pyarrow; without it the export falls back to CSV.
+
+Usage:
+    python export.py --db word_adventure.db --out exports
+    python export.py --database-url postgresql://... --format arrow --out exports
+    python export.py --admin-uri sqlite:///database/app.db --out exports
+
+The admin API runs the same export as a background job (see analytics.py).
+Each job writes its status to job.json in its output directory, so any
+worker can report on it. A job whose status file hasn't changed for
+WORD_ADVENTURE_EXPORT_TTL seconds is removed with its output when the
+next export starts. That covers finished jobs and ones whose worker died.
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import logging
+import argparse
+import threading
+import importlib.util
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby
+
+# Imported by the first Parquet/Arrow export rather than at app start-up
+pa = None
+
+logger = logging.getLogger('word_adventure.export')
+
+CHUNK_ROWS = int(os.environ.get('WORD_ADVENTURE_EXPORT_CHUNK_ROWS', 50000))
+EXPORT_DIR = os.environ.get('WORD_ADVENTURE_EXPORT_DIR', 'exports')
+FORMATS = ('parquet', 'arrow', 'csv')
+JOB_TTL = float(os.environ.get('WORD_ADVENTURE_EXPORT_TTL', 7 * 24 * 3600))
+STATUS_FILE = 'job.json'
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ExportTable:
+    """A table to export: typed columns and the column it is partitioned by"""
+
+    def __init__(self, name, columns, date_column):
+        self.name = name
+        self.columns = columns
+        self.date_column = date_column
+
+    @property
+    def column_names(self):
+        return [name for name, _ in self.columns]
+
+    def query(self):
+        return f"SELECT {', '.join(self.column_names)} FROM {self.name} ORDER BY {self.date_column}"
+
+    def arrow_schema(self):
+        types = {'int': pa.int64(), 'bool': pa.bool_(), 'str': pa.string(), 'timestamp': pa.timestamp('us')}
+        return pa.schema([(name, types[kind]) for name, kind in self.columns])
+
+
+LEARNER_TABLES = {
+    'quiz_results': ExportTable('quiz_results', [
+        ('id', 'int'), ('user_id', 'int'), ('word_id', 'int'), ('remembered', 'bool'),
+        ('quiz_type', 'str'), ('timestamp', 'timestamp'),
+    ], 'timestamp'),
+    'user_word_progress': ExportTable('user_word_progress', [
+        ('id', 'int'), ('user_id', 'int'), ('word_id', 'int'), ('known', 'bool'),
+        ('mastery_level', 'int'), ('last_practiced', 'timestamp'),
+        ('correct_attempts', 'int'), ('total_attempts', 'int'),
+    ], 'last_practiced'),
+}
+
+ADMIN_TABLES = {
+    'user_progress': ExportTable('user_progress', [
+        ('id', 'int'), ('user_id', 'int'), ('word_id', 'int'), ('known', 'bool'),
+        ('attempts', 'int'), ('last_attempt', 'timestamp'),
+    ], 'last_attempt'),
+}
+
+
+def load_pyarrow():
+    global pa
+    if pa is None:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+        pa = pyarrow
+    return pa
+
+
+def resolve_format(fmt):
+    """The format to actually write, falling back to CSV without pyarrow"""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    if fmt != 'csv' and importlib.util.find_spec('pyarrow') is None:
+        logger.warning('pyarrow is not installed; exporting CSV instead of %s', fmt)
+        return 'csv'
+    return fmt
+
+
+def partition_of(value):
+    """date=YYYY-MM-DD partition for a timestamp (datetime or SQLite text)"""
+    if value is None:
+        return 'date=unknown'
+    return f'date={str(value)[:10]}'
+
+
+def to_timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class CsvPartWriter:
+    def __init__(self, path, table):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(table.column_names)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowPartWriter:
+    """Writes record batches to a Parquet or Arrow IPC file"""
+
+    def __init__(self, path, table, fmt):
+        load_pyarrow()
+        self.table = table
+        self.schema = table.arrow_schema()
+        if fmt == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        arrays = []
+        for (name, kind), values in zip(self.table.columns, columns):
+            if kind == 'timestamp':
+                values = [to_timestamp(v) for v in values]
+            elif kind == 'bool':
+                values = [None if v is None else bool(v) for v in values]
+            arrays.append(pa.array(values, type=self.schema.field(name).type))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_cursor(conn, dialect, name):
+    """A cursor that streams rows from the server instead of buffering them"""
+    if dialect == 'postgresql':
+        cursor = conn.cursor(name=f'export_{name}_{uuid.uuid4().hex[:8]}')
+        cursor.itersize = CHUNK_ROWS
+        return cursor
+    return conn.cursor()
+
+
+def export_table(conn, table, out_dir, fmt='parquet', dialect='sqlite', chunk_rows=CHUNK_ROWS, progress=None):
+    """Stream one table into date partitions; returns {'rows', 'files'}"""
+    fmt = resolve_format(fmt)
+    date_index = table.column_names.index(table.date_column)
+    cursor = open_cursor(conn, dialect, table.name)
+    cursor.execute(table.query())
+
+    files = []
+    parts = {}
+    writer = current = None
+    total = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            for partition, group in groupby(rows, key=lambda row: partition_of(row[date_index])):
+                if partition != current:
+                    if writer:
+                        writer.close()
+                    directory = os.path.join(out_dir, table.name, partition)
+                    os.makedirs(directory, exist_ok=True)
+                    # A partition seen again (e.g. mixed timestamp formats) gets a new part file
+                    number = parts.get(partition, 0)
+                    parts[partition] = number + 1
+                    path = os.path.join(directory, f'part-{number:05d}.{fmt}')
+                    writer = CsvPartWriter(path, table) if fmt == 'csv' else ArrowPartWriter(path, table, fmt)
+                    files.append(path)
+                    current = partition
+                writer.write([tuple(row) for row in group])
+            total += len(rows)
+            if progress:
+                progress(table.name, total)
+    finally:
+        if writer:
+            writer.close()
+        cursor.close()
+        # End the read transaction (and close the named cursor) on the connection
+        conn.rollback()
+    return {'rows': total, 'files': files, 'format': fmt}
+
+
+def export_tables(conn, tables, out_dir, fmt='parquet', dialect='sqlite', progress=None):
+    """Export several tables over one connection; returns results per table"""
+    return {table.name: export_table(conn, table, out_dir, fmt, dialect, progress=progress) for table in tables}
+
+
+class ExportJob:
+    """An export running on a background thread"""
+
+    def __init__(self, engine, tables, out_dir, fmt):
+        self.id = uuid.uuid4().hex
+        self.engine = engine
+        self.tables = tables
+        self.out_dir = os.path.join(out_dir, self.id)
+        self.format = fmt
+        self.status = 'pending'
+        self.rows = {}
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    def progress(self, table, rows):
+        self.rows[table] = rows
+        self.save()
+
+    def save(self):
+        """Write the job's status where every worker can read it (see load_job)"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.out_dir, prefix='.job-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temporary, os.path.join(self.out_dir, STATUS_FILE))
+
+    def run(self):
+        self.status = 'running'
+        self.started_at = datetime.utcnow()
+        self.save()
+        conn = self.engine.raw_connection()
+        try:
+            self.result = export_tables(conn.dbapi_connection, self.tables, self.out_dir, self.format,
+                                        self.engine.dialect.name, progress=self.progress)
+            self.status = 'finished'
+        except Exception as e:
+            logger.exception('Export %s failed', self.id)
+            self.error = str(e)
+            self.status = 'failed'
+        finally:
+            conn.close()
+            self.finished_at = datetime.utcnow()
+            self.save()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'format': self.format,
+            'tables': [table.name for table in self.tables],
+            'output_dir': self.out_dir,
+            'rows': self.rows,
+            'result': self.result,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+def load_job(job_id, out_dir=EXPORT_DIR):
+    """A job's last saved status, or None for an unknown or expired job"""
+    if not _JOB_ID.match(job_id):
+        return None
+    try:
+        with open(os.path.join(out_dir, job_id, STATUS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def expire_jobs(out_dir=EXPORT_DIR, ttl=JOB_TTL):
+    """Remove jobs, output included, whose status hasn't changed for ttl seconds"""
+    cutoff = time.time() - ttl
+    try:
+        names = os.listdir(out_dir)
+    except FileNotFoundError:
+        return []
+    expired = []
+    for name in names:
+        if not _JOB_ID.match(name):
+            continue
+        try:
+            saved = os.path.getmtime(os.path.join(out_dir, name, STATUS_FILE))
+        except FileNotFoundError:
+            continue
+        if saved < cutoff:
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+            expired.append(name)
+    return expired
+
+
+def start_export(engine, tables, out_dir=EXPORT_DIR, fmt='parquet'):
+    """Start an export of SQLAlchemy engine tables on a daemon thread"""
+    expire_jobs(out_dir)
+    job = ExportJob(engine, tables, out_dir, resolve_format(fmt))
+    job.save()
+    threading.Thread(target=job.run, name=f'export-{job.id[:8]}', daemon=True).start()
+    return job
+
+
+@contextmanager
+def cli_connection(args):
+    """DB-API connection and dialect for the database named on the command line"""
+    if args.admin_uri:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.admin_uri)
+        pooled = engine.raw_connection()
+        try:
+            yield pooled.dbapi_connection, engine.dialect.name
+        finally:
+            pooled.close()
+    else:
+        from storage import create_backend
+        backend = create_backend(args.database_url or f'sqlite:///{args.db}')
+        with backend.raw_connection() as conn:
+            yield conn, backend.dialect
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export learning history to Parquet, Arrow or CSV')
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--database-url', help='learner database URL (instead of --db)')
+    parser.add_argument('--admin-uri', help='admin database SQLAlchemy URI (instead of --db)')
+    parser.add_argument('--tables', nargs='+', help='tables to export (default: all of the database)')
+    parser.add_argument('--format', choices=FORMATS, default='parquet')
+    parser.add_argument('--out', default=EXPORT_DIR, help='output directory')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    available = ADMIN_TABLES if args.admin_uri else LEARNER_TABLES
+    unknown = set(args.tables or ()) - set(available)
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(sorted(unknown))}")
+    tables = [available[name] for name in (args.tables or available)]
+
+    def progress(table, rows):
+        print(f'{table}: {rows} rows', file=sys.stderr)
+
+    with cli_connection(args) as (conn, dialect):
+        results = export_tables(conn, tables, args.out, args.format, dialect, progress=progress)
+
+    for name, result in results.items():
+        print(f"{name}: {result['rows']} rows in {len(result['files'])} {result['format']} file(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
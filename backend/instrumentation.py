@@ -0,0 +1,448 @@
+"""
+Request and SQL instrumentation with a Prometheus /metrics endpoint.
+
+init_app(app) records a latency histogram per route and, for every
+request, how many SQL statements ran and how long they took. Statements
+are captured from sqlite3 connections created with
+``factory=InstrumentedConnection`` and from SQLAlchemy engines passed to
+instrument_engine(). Statements slower than SLOW_QUERY_MS are logged
+with their query plan on the 'word_adventure.sql' logger.
+
+Each response carries a Server-Timing header with the database time and
+statement count. Setting WORD_ADVENTURE_PROFILER=1 enables a sampling
+profiler at GET /debug/profile?seconds=N, which returns collapsed stacks
+(one line per stack, ready for flamegraph.pl or speedscope).
+
+Query checks run in development and tests (app.debug, app.testing or
+WORD_ADVENTURE_QUERY_DEBUG=1). Statements are reduced to their shape
+(literals and IN-lists collapsed), and any shape repeated
+N_PLUS_ONE_THRESHOLD times in one request is logged as a likely N+1.
+Views decorated with @query_budget(n) that run more than n statements
+raise QueryBudgetExceeded when QUERY_BUDGET_ENFORCE is set (the default
+under app.testing). assert_max_queries(n) checks code outside requests.
+
+Metrics are kept per process. /metrics (and the profiler) expose SQL
+shapes and per-route latency, so they answer only clients presenting
+WORD_ADVENTURE_METRICS_TOKEN as a bearer token or, with no token set,
+clients on the loopback interface; anyone else gets a 404.
+"""
+import os
+import re
+import sys
+import hmac
+import time
+import logging
+import sqlite3
+import threading
+from collections import Counter
+
+from flask import Response, g, request, has_request_context
+
+logger = logging.getLogger('word_adventure.sql')
+
+SLOW_QUERY_MS = float(os.environ.get('WORD_ADVENTURE_SLOW_QUERY_MS', 100))
+PROFILER_ENABLED = os.environ.get('WORD_ADVENTURE_PROFILER') == '1'
+QUERY_DEBUG = os.environ.get('WORD_ADVENTURE_QUERY_DEBUG') == '1'
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('WORD_ADVENTURE_N_PLUS_ONE_THRESHOLD', 5))
+METRICS_TOKEN = os.environ.get('WORD_ADVENTURE_METRICS_TOKEN')
+LOOPBACK = ('127.0.0.1', '::1')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One slot per bucket plus +Inf, then the running sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            base = format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{self.name}_bucket{format_labels(self.label_names + ("le",), labels + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{base} {series[-1]}')
+            lines.append(f'{self.name}_count{base} {cumulative}')
+        return lines
+
+
+class CounterMetric:
+    """Prometheus counter keyed by label values"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{format_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+REQUEST_LATENCY = Histogram('word_adventure_http_request_duration_seconds',
+                            'Request latency by route', ('method', 'route', 'status'))
+REQUEST_SQL_STATEMENTS = Histogram('word_adventure_http_request_sql_statements',
+                                   'SQL statements executed per request', ('route',), COUNT_BUCKETS)
+REQUEST_SQL_TIME = Histogram('word_adventure_http_request_sql_duration_seconds',
+                             'Total SQL time per request', ('route',))
+SQL_LATENCY = Histogram('word_adventure_sql_statement_duration_seconds',
+                        'SQL statement latency', ('database', 'operation'))
+SLOW_STATEMENTS = CounterMetric('word_adventure_sql_slow_statements_total',
+                                'Statements slower than the slow query threshold', ('database',))
+
+METRICS = [REQUEST_LATENCY, REQUEST_SQL_STATEMENTS, REQUEST_SQL_TIME, SQL_LATENCY, SLOW_STATEMENTS]
+
+
+class RequestStats:
+    """SQL activity of the current request"""
+
+    __slots__ = ('started', 'statements', 'sql_time', 'statement_log')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_time = 0.0
+        self.statement_log = []
+
+
+_captures = threading.local()
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('_instrumentation')
+    return None
+
+
+class capture_statements:
+    """Context manager collecting (statement, duration) pairs run on this thread"""
+
+    def __enter__(self):
+        self.statements = []
+        stack = getattr(_captures, 'stack', None)
+        if stack is None:
+            stack = _captures.stack = []
+        stack.append(self.statements)
+        return self.statements
+
+    def __exit__(self, *exc_info):
+        _captures.stack.remove(self.statements)
+        return False
+
+
+def operation_of(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+
+
+def record_statement(database, statement, duration, explain=None):
+    """Record one executed statement; `explain` returns its query plan on demand"""
+    SQL_LATENCY.observe(duration, database, operation_of(statement))
+
+    stats = current_stats()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_time += duration
+        stats.statement_log.append((statement, duration))
+    for captured in getattr(_captures, 'stack', ()):
+        captured.append((statement, duration))
+
+    if duration * 1000 >= SLOW_QUERY_MS:
+        SLOW_STATEMENTS.inc(database)
+        plan = None
+        if explain is not None:
+            try:
+                plan = explain()
+            except Exception as e:
+                plan = f'(no plan: {e})'
+        route = request.url_rule.rule if has_request_context() and request.url_rule else None
+        logger.warning('slow %s statement (%.1f ms) on %s: %s\n  plan: %s',
+                       database, duration * 1000, route, ' '.join(statement.split()), plan)
+
+
+def explain_sqlite(connection, statement, parameters):
+    cursor = sqlite3.Cursor(connection)
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that times every statement it executes"""
+
+    def execute(self, statement, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(statement, parameters)
+        finally:
+            record_statement('sqlite', statement, time.perf_counter() - start,
+                             lambda: explain_sqlite(self.connection, statement, parameters))
+
+    def executemany(self, statement, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(statement, seq_of_parameters)
+        finally:
+            record_statement('sqlite', statement, time.perf_counter() - start)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            record_statement('sqlite', script, time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The shortcut methods don't go through cursor(), so route them explicitly
+    def execute(self, statement, parameters=()):
+        return self.cursor().execute(statement, parameters)
+
+    def executemany(self, statement, seq_of_parameters):
+        return self.cursor().executemany(statement, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def instrument_engine(engine, database=None):
+    """Time every statement run through a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    database = database or engine.dialect.name
+    explain_prefix = 'EXPLAIN QUERY PLAN' if engine.dialect.name == 'sqlite' else 'EXPLAIN'
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['_query_start'].pop()
+
+        def explain():
+            plan_cursor = cursor.connection.cursor()
+            try:
+                plan_cursor.execute(f'{explain_prefix} {statement}', parameters)
+                return '; '.join(str(row[-1]) for row in plan_cursor.fetchall())
+            finally:
+                plan_cursor.close()
+
+        record_statement(database, statement, duration, None if executemany else explain)
+
+    return engine
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    def collect(self, seconds):
+        stacks = Counter()
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r'\?|%s|%\(\w+\)s|:\w+')
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More SQL statements ran than the declared budget allows"""
+
+
+def statement_shape(statement):
+    """Normalize a statement so repeated executions compare equal"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('(?+)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def repeated_shapes(statements, threshold=N_PLUS_ONE_THRESHOLD):
+    """Return {shape: count} for shapes executed at least `threshold` times"""
+    counts = Counter(statement_shape(statement) for statement, _ in statements)
+    return {shape: count for shape, count in counts.items() if count >= threshold}
+
+
+def describe_statements(statements, budget):
+    lines = [f'{len(statements)} statements executed, budget is {budget}:']
+    for shape, count in Counter(statement_shape(s) for s, _ in statements).most_common():
+        lines.append(f'  {count} x {shape}')
+    return '\n'.join(lines)
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL statements a view may run"""
+    def decorator(view):
+        view.__query_budget__ = max_queries
+        return view
+    return decorator
+
+
+class assert_max_queries(capture_statements):
+    """Fail if the enclosed block runs more than `max_queries` statements"""
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+
+    def __exit__(self, exc_type, exc, traceback):
+        super().__exit__(exc_type, exc, traceback)
+        if exc_type is None and len(self.statements) > self.max_queries:
+            raise QueryBudgetExceeded(describe_statements(self.statements, self.max_queries))
+        return False
+
+
+def check_queries(app, stats, route, response):
+    """Flag repeated statement shapes and enforce the view's query budget"""
+    response.headers['X-Query-Count'] = str(stats.statements)
+
+    repeats = repeated_shapes(stats.statement_log)
+    if repeats:
+        response.headers['X-Query-Repeats'] = str(max(repeats.values()))
+        for shape, count in repeats.items():
+            logger.warning('possible N+1 on %s %s: %d x %s', request.method, route, count, shape)
+
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, '__query_budget__', None)
+    if budget is not None and stats.statements > budget:
+        message = f'{request.method} {route}: ' + describe_statements(stats.statement_log, budget)
+        if app.config.get('QUERY_BUDGET_ENFORCE', app.testing):
+            raise QueryBudgetExceeded(message)
+        logger.warning('query budget exceeded on %s', message)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_allowed():
+    """Whether the current request may read metrics and profiles"""
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+    return request.remote_addr in LOOPBACK
+
+
+def init_app(app):
+    """Register request timing hooks, query checks, /metrics and the optional profiler"""
+
+    @app.before_request
+    def start_request_timer():
+        g._instrumentation = RequestStats()
+
+    @app.after_request
+    def record_request(response):
+        stats = g.pop('_instrumentation', None)
+        if stats is None:
+            return response
+
+        elapsed = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(elapsed, request.method, route, str(response.status_code))
+        REQUEST_SQL_STATEMENTS.observe(stats.statements, route)
+        REQUEST_SQL_TIME.observe(stats.sql_time, route)
+
+        if app.debug or app.testing or QUERY_DEBUG:
+            check_queries(app, stats, route, response)
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.statements} queries", '
+            f'app;dur={elapsed * 1000:.2f}'
+        )
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics for this process"""
+        if not metrics_allowed():
+            return Response('Not Found\n', status=404, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    if PROFILER_ENABLED:
+        profiler = SamplingProfiler()
+
+        @app.route('/debug/profile', methods=['GET'])
+        def profile():
+            """Sample all threads for a few seconds and return collapsed stacks"""
+            if not metrics_allowed():
+                return Response('Not Found\n', status=404, mimetype='text/plain')
+            seconds = min(request.args.get('seconds', 5, type=float), 60)
+            stacks = profiler.collect(seconds)
+            body = '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common())
+            return Response(body + '\n', mimetype='text/plain')
+
+    return app
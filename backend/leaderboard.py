@@ -0,0 +1,229 @@
+"""
+Leaderboards for the learner API.
+
+Three boards are available: 'global' (all users by XP), 'age_group'
+(users of one age group by XP) and 'weekly' (XP earned this week, kept
+in the weekly_xp rollup table). Top-N lists come from index-ordered
+queries and are cached for a few seconds, so classroom screens can
+refresh often. "My rank" lookups use an in-memory sorted score list per
+board, giving O(log n) rank queries. The lists are updated in place as
+XP is awarded in this process and reloaded from the database after
+INDEX_MAX_AGE seconds to pick up other workers' writes.
+
+Only age groups some user belongs to can be queried, and at most
+MAX_INDEXES rank indexes and MAX_TOP_ENTRIES top-N lists are kept (least
+recently used first out), so request parameters can't grow the caches.
+"""
+import threading
+import time
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+
+BOARDS = ('global', 'age_group', 'weekly')
+TOP_CACHE_TTL = 5
+INDEX_MAX_AGE = 60
+MAX_LIMIT = 100
+MAX_INDEXES = 16
+MAX_TOP_ENTRIES = 256
+
+
+def week_start(moment=None):
+    """ISO date of the Monday starting the (UTC) week"""
+    day = (moment or datetime.now(timezone.utc)).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+class RankIndex:
+    """Sorted scores of one board supporting O(log n) rank lookups"""
+
+    def __init__(self, scores):
+        self.scores = dict(scores)
+        self.sorted_scores = sorted(self.scores.values())
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def rank(self, user_id):
+        """1-based competition rank (ties share a rank), or None if absent"""
+        with self.lock:
+            score = self.scores.get(user_id)
+            if score is None:
+                return None
+            return len(self.sorted_scores) - bisect_right(self.sorted_scores, score) + 1, score
+
+    def add(self, user_id, delta):
+        with self.lock:
+            old = self.scores.get(user_id)
+            if old is not None:
+                del self.sorted_scores[bisect_left(self.sorted_scores, old)]
+            new = (old or 0) + delta
+            self.scores[user_id] = new
+            insort(self.sorted_scores, new)
+
+    def __contains__(self, user_id):
+        return user_id in self.scores
+
+    def __len__(self):
+        return len(self.sorted_scores)
+
+
+class Leaderboards:
+    """Top-N and rank queries over the users and weekly_xp tables"""
+
+    def __init__(self, connect, top_ttl=TOP_CACHE_TTL, index_max_age=INDEX_MAX_AGE):
+        self.connect = connect
+        self.top_ttl = top_ttl
+        self.index_max_age = index_max_age
+        self._indexes = OrderedDict()
+        self._top_cache = OrderedDict()
+        self._groups = set()
+        self._lock = threading.Lock()
+
+    def valid_group(self, group):
+        """Whether any user is in this age group"""
+        if group in self._groups:
+            return True
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM users WHERE age_group = ? LIMIT 1', (group,))
+            found = cursor.fetchone() is not None
+        finally:
+            conn.close()
+        if found:
+            self._groups.add(group)
+        return found
+
+    def user_group(self, user_id):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT age_group FROM users WHERE id = ?', (user_id,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def board_key(self, board, group=None):
+        if board == 'weekly':
+            return ('weekly', group or week_start())
+        if board == 'age_group':
+            return ('age_group', group)
+        return ('global', None)
+
+    def load_scores(self, key):
+        board, group = key
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if board == 'weekly':
+                cursor.execute('SELECT user_id, xp FROM weekly_xp WHERE week_start = ?', (group,))
+            elif board == 'age_group':
+                cursor.execute('SELECT id, xp FROM users WHERE age_group = ?', (group,))
+            else:
+                cursor.execute('SELECT id, xp FROM users')
+            return [(row[0], row[1] or 0) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def get_index(self, key):
+        index = self._indexes.get(key)
+        if index is None or time.monotonic() - index.loaded_at > self.index_max_age:
+            index = RankIndex(self.load_scores(key))
+            with self._lock:
+                # Only keep the current week's index around
+                if key[0] == 'weekly':
+                    for stale in [k for k in self._indexes if k[0] == 'weekly' and k != key]:
+                        del self._indexes[stale]
+                self._indexes[key] = index
+                self._indexes.move_to_end(key)
+                while len(self._indexes) > MAX_INDEXES:
+                    self._indexes.popitem(last=False)
+        else:
+            with self._lock:
+                if key in self._indexes:
+                    self._indexes.move_to_end(key)
+        return index
+
+    def rank(self, user_id, board='global', group=None):
+        """Return {'rank', 'xp'} for a user on a board, or None if unranked"""
+        result = self.get_index(self.board_key(board, group)).rank(user_id)
+        if result is None:
+            return None
+        rank, score = result
+        return {'rank': rank, 'xp': score}
+
+    def top(self, board='global', group=None, limit=10):
+        """Return the top `limit` entries of a board, cached for top_ttl seconds"""
+        key = self.board_key(board, group) + (limit,)
+        cached = self._top_cache.get(key)
+        now = time.monotonic()
+        if cached and now - cached[0] < self.top_ttl:
+            return cached[1]
+
+        entries = self.query_top(key[0], key[1], limit)
+        with self._lock:
+            self._top_cache[key] = (now, entries)
+            self._top_cache.move_to_end(key)
+            while len(self._top_cache) > MAX_TOP_ENTRIES:
+                self._top_cache.popitem(last=False)
+        return entries
+
+    def query_top(self, board, group, limit):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if board == 'weekly':
+                cursor.execute('''
+                    SELECT w.user_id, u.username, w.xp, u.level
+                    FROM weekly_xp w
+                    JOIN users u ON u.id = w.user_id
+                    WHERE w.week_start = ?
+                    ORDER BY w.xp DESC
+                    LIMIT ?
+                ''', (group, limit))
+            elif board == 'age_group':
+                cursor.execute('''
+                    SELECT id, username, xp, level FROM users
+                    WHERE age_group = ?
+                    ORDER BY xp DESC
+                    LIMIT ?
+                ''', (group, limit))
+            else:
+                cursor.execute('''
+                    SELECT id, username, xp, level FROM users
+                    ORDER BY xp DESC
+                    LIMIT ?
+                ''', (limit,))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        entries = []
+        for position, (user_id, username, xp, level) in enumerate(rows, start=1):
+            # Users with equal XP share the rank of the first of them
+            rank = entries[-1]['rank'] if entries and entries[-1]['xp'] == xp else position
+            entries.append({'rank': rank, 'id': user_id, 'username': username, 'xp': xp, 'level': level})
+        return entries
+
+    def record_xp(self, cursor, user_id, amount):
+        """Add XP to this week's rollup; call inside the awarding transaction"""
+        cursor.execute('''
+            INSERT INTO weekly_xp (week_start, user_id, xp) VALUES (?, ?, ?)
+            ON CONFLICT(week_start, user_id) DO UPDATE SET xp = weekly_xp.xp + excluded.xp
+        ''', (week_start(), user_id, amount))
+
+    def apply_xp(self, user_id, amount):
+        """Reflect committed XP in the loaded rank indexes"""
+        current_week = week_start()
+        indexes = list(self._indexes.items())
+        age_groups = [index for (board, _), index in indexes if board == 'age_group']
+        # A user missing from every loaded age group index joined after they were loaded
+        user_group = None
+        if age_groups and not any(user_id in index for index in age_groups):
+            user_group = self.user_group(user_id)
+        for (board, group), index in indexes:
+            if board == 'global' or (board == 'weekly' and group == current_week):
+                index.add(user_id, amount)
+            elif board == 'age_group' and (user_id in index or group == user_group):
+                index.add(user_id, amount)
@@ -0,0 +1,470 @@
+"""
+Load-testing benchmarks for the learner and admin APIs.
+
+Seeds a throwaway database with synthetic data, drives a request mix
+through either the Flask test client (in-process, measures app + DB
+time) or a real local HTTP server (adds WSGI and socket overhead), and
+reports p50/p95/p99 latency and throughput per endpoint.
+
+Usage:
+    python loadtest.py --mix quiz_burst --users 1000 --words 500 --requests 5000
+    python loadtest.py --driver server --concurrency 16 --output results.json
+    python loadtest.py --mix dashboard_polling --baseline results.json
+
+Mixes:
+    login_storm        many users logging in at once
+    quiz_burst         a class answering quiz questions
+    dashboard_polling  dashboards refreshing stats, words and leaderboards
+    learner            a blend of the three above
+    admin              admin word listing, analytics and bulk import
+                       (needs the admin app from main.py to be importable)
+
+With --baseline, the run is compared with a previous --output file and
+the exit status is 1 if any endpoint's p95 latency regressed by more than
+--tolerance (default 20%).
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import http.client
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CATEGORIES = ['food', 'animals', 'objects', 'nature', 'body', 'colors', 'numbers', 'actions']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+AGE_GROUPS = ['child', 'preteen', 'teen']
+
+
+def seed_learner_data(db_path, users=1000, words=500, progress=20000, quiz_results=50000, seed=42):
+    """Fill the learner database with synthetic users, words and history"""
+    from werkzeug.security import generate_password_hash
+    from migrations import analyze
+    from categories import count_words
+    from quiz import bump_content_version
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM words')
+    first_word = cursor.fetchone()[0] + 1
+    new_words = [
+        (i, f'word{i}', '🔤', f'/wɜːd{i}/', f'Definition of word {i}', f'An example using word {i}',
+         f'Fun fact number {i}', rng.choice(DIFFICULTIES), rng.choice(CATEGORIES))
+        for i in range(first_word, first_word + words)
+    ]
+    cursor.executemany('''
+        INSERT INTO words (id, word, image, pronunciation, definition, example, fun_fact, difficulty, category)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', new_words)
+    count_words(cursor, [(w[8], None, w[7]) for w in new_words])
+    bump_content_version(cursor)
+    word_ids = [row[0] for row in cursor.execute('SELECT id FROM words')]
+
+    # Hashing is deliberately slow, so every synthetic user shares one hash
+    password_hash = generate_password_hash('demo123')
+    cursor.executemany('''
+        INSERT INTO users (username, email, password_hash, age_group, xp, level, total_quizzes_taken)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (f'loaduser{i}', f'loaduser{i}@example.com', password_hash, rng.choice(AGE_GROUPS), xp, xp // 100 + 1, xp // 15)
+        for i, xp in ((i, rng.randint(0, 5000)) for i in range(users))
+    ])
+    user_ids = [row[0] for row in cursor.execute("SELECT id FROM users WHERE username LIKE 'loaduser%'")]
+    cursor.executemany('INSERT OR IGNORE INTO virtual_pets (user_id) VALUES (?)', [(u,) for u in user_ids])
+
+    pairs = set()
+    while len(pairs) < min(progress, len(user_ids) * len(word_ids)):
+        pairs.add((rng.choice(user_ids), rng.choice(word_ids)))
+    cursor.executemany('''
+        INSERT OR IGNORE INTO user_word_progress
+        (user_id, word_id, known, mastery_level, last_practiced, correct_attempts, total_attempts)
+        VALUES (?, ?, ?, ?, datetime('now', ?), ?, ?)
+    ''', [
+        (u, w, rng.random() < 0.5, rng.randint(0, 5), f'-{rng.randint(0, 60)} days', rng.randint(0, 5), rng.randint(5, 10))
+        for u, w in pairs
+    ])
+
+    cursor.executemany('''
+        INSERT INTO quiz_results (user_id, word_id, remembered, quiz_type, timestamp)
+        VALUES (?, ?, ?, ?, datetime('now', ?))
+    ''', (
+        (rng.choice(user_ids), rng.choice(word_ids), rng.random() < 0.7, 'basic', f'-{rng.randint(0, 90 * 86400)} seconds')
+        for _ in range(quiz_results)
+    ))
+
+    conn.commit()
+    analyze(conn)
+    conn.close()
+    return user_ids, word_ids
+
+
+def seed_admin_data(app, words=500, progress=20000, seed=42):
+    """Fill the admin database through its models and return an admin token"""
+    from flask_jwt_extended import create_access_token
+    from src.database import db
+    from src.models.admin import Admin
+    from src.models.user import User
+    from src.models.word import Word, UserProgress, rebuild_known_words
+    from src.routes.words import bump_content_version, count_words
+
+    rng = random.Random(seed)
+    with app.app_context():
+        admin = Admin.query.first()
+        new_words = [
+            {'word': f'loadword{i}', 'category': rng.choice(CATEGORIES), 'difficulty': rng.choice(DIFFICULTIES)}
+            for i in range(words)
+        ]
+        db.session.bulk_insert_mappings(Word, new_words)
+        count_words([(w['category'], w['difficulty'], 1) for w in new_words])
+        bump_content_version()
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'loaduser{i}', 'email': f'loaduser{i}@example.com'}
+            for i in range(max(1, progress // 50))
+        ])
+        db.session.commit()
+        word_ids = [w for (w,) in db.session.query(Word.id)]
+        user_ids = [u for (u,) in db.session.query(User.id)]
+        db.session.bulk_insert_mappings(UserProgress, [
+            {'user_id': rng.choice(user_ids), 'word_id': rng.choice(word_ids),
+             'known': rng.random() < 0.5, 'attempts': rng.randint(1, 10)}
+            for _ in range(progress)
+        ])
+        # Bulk inserts skip the session hook that keeps the bitmaps current
+        rebuild_known_words(db.session.connection(), user_ids)
+        db.session.commit()
+        return create_access_token(identity=admin.id), word_ids
+
+
+class Request:
+    __slots__ = ('name', 'method', 'path', 'body', 'token')
+
+    def __init__(self, name, method, path, body=None, token=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.token = token
+
+
+def learner_mixes(tokens, word_ids, rng):
+    """Request generators for the learner API, keyed by mix name"""
+
+    def login(i):
+        return Request('POST /api/auth/login', 'POST', '/api/auth/login',
+                       {'username': f'loaduser{rng.randrange(len(tokens))}', 'password': 'demo123'})
+
+    def quiz(i):
+        return Request('POST /api/quiz/submit', 'POST', '/api/quiz/submit',
+                       {'word_id': rng.choice(word_ids), 'remembered': rng.random() < 0.7},
+                       rng.choice(tokens))
+
+    def progress(i):
+        word_id = rng.choice(word_ids)
+        return Request('PUT /api/words/<id>/progress', 'PUT', f'/api/words/{word_id}/progress',
+                       {'known': rng.random() < 0.5, 'mastery_level': rng.randint(0, 5)},
+                       rng.choice(tokens))
+
+    def stats(i):
+        return Request('GET /api/user/stats', 'GET', '/api/user/stats', token=rng.choice(tokens))
+
+    def words(i):
+        return Request('GET /api/words', 'GET', '/api/words', token=rng.choice(tokens))
+
+    def leaderboard(i):
+        board = rng.choice(['global', 'weekly', 'age_group'])
+        return Request('GET /api/leaderboard', 'GET', f'/api/leaderboard?board={board}', token=rng.choice(tokens))
+
+    def categories(i):
+        return Request('GET /api/categories', 'GET', '/api/categories')
+
+    return {
+        'login_storm': [(1, login)],
+        'quiz_burst': [(8, quiz), (2, progress)],
+        'dashboard_polling': [(5, stats), (2, leaderboard), (2, words), (1, categories)],
+        'learner': [(1, login), (4, quiz), (1, progress), (3, stats), (1, leaderboard), (1, words)],
+    }
+
+
+def admin_mixes(token, word_ids, rng):
+    """Request generators for the admin API"""
+    counter = iter(range(10 ** 9))
+
+    def list_words(i):
+        return Request('GET /api/words', 'GET', f'/api/words?category={rng.choice(CATEGORIES)}', token=token)
+
+    def get_word(i):
+        return Request('GET /api/words/<id>', 'GET', f'/api/words/{rng.choice(word_ids)}', token=token)
+
+    def overview(i):
+        return Request('GET /api/analytics/overview', 'GET', '/api/analytics/overview', token=token)
+
+    def word_analytics(i):
+        return Request('GET /api/analytics/words', 'GET', '/api/analytics/words', token=token)
+
+    def user_analytics(i):
+        return Request('GET /api/analytics/users', 'GET', '/api/analytics/users', token=token)
+
+    def bulk_import(i):
+        batch = next(counter)
+        return Request('POST /api/words/bulk-import', 'POST', '/api/words/bulk-import', {
+            'words': [
+                {'word': f'bulk{batch}x{n}', 'category': rng.choice(CATEGORIES), 'difficulty': rng.choice(DIFFICULTIES)}
+                for n in range(50)
+            ]
+        }, token)
+
+    return {
+        'admin': [(4, list_words), (2, get_word), (2, overview), (1, word_analytics),
+                  (1, user_analytics), (1, bulk_import)],
+    }
+
+
+def build_plan(mix, total, rng):
+    """Expand a weighted mix into a list of `total` requests"""
+    weights = [w for w, _ in mix]
+    builders = [b for _, b in mix]
+    return [rng.choices(builders, weights)[0](i) for i in range(total)]
+
+
+class ClientDriver:
+    """Sends requests through the Flask test client"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def send(self, req):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {req.token}'} if req.token else {}
+        response = client.open(req.path, method=req.method, json=req.body, headers=headers)
+        response.close()
+        return response.status_code
+
+
+class ServerDriver:
+    """Sends requests over HTTP to the app served by a local threaded server"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.port = self.server.port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def send(self, req):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = {'Content-Type': 'application/json'}
+        if req.token:
+            headers['Authorization'] = f'Bearer {req.token}'
+        body = json.dumps(req.body) if req.body is not None else None
+        try:
+            conn.request(req.method, req.path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            raise
+
+    def close(self):
+        self.server.shutdown()
+
+
+def run_plan(driver, plan, concurrency):
+    """Execute requests on `concurrency` threads; returns (samples, errors, elapsed)"""
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    position = iter(range(len(plan)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            req = plan[i]
+            start = time.perf_counter()
+            try:
+                status = driver.send(req)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - start
+            samples[req.name].append(elapsed)
+            if status >= 400:
+                errors[req.name] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, errors, elapsed):
+    endpoints = {}
+    for name, values in sorted(samples.items()):
+        values.sort()
+        endpoints[name] = {
+            'count': len(values),
+            'errors': errors.get(name, 0),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+            'max_ms': round(values[-1] * 1000, 3),
+            'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        }
+    total = sum(len(v) for v in samples.values())
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'total_requests': total,
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'endpoints': endpoints,
+    }
+
+
+def print_report(result):
+    print(f"\n{'endpoint':<36} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name, stats in result['endpoints'].items():
+        print(f"{name:<36} {stats['count']:>7} {stats['errors']:>5} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['throughput_rps']:>9.1f}")
+    print(f"\n{result['total_requests']} requests in {result['elapsed_s']:.2f}s "
+          f"({result['throughput_rps']:.1f} req/s)")
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of p95 regressions against a baseline run"""
+    regressions = []
+    for name, stats in result['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before or not before['p95_ms']:
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms']
+        if change > tolerance:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms (+{change:.0%})")
+    return regressions
+
+
+def load_learner_app(db_path):
+    os.environ['WORD_ADVENTURE_DB'] = db_path
+    os.environ['WORD_ADVENTURE_DATABASE_URL'] = f'sqlite:///{db_path}'
+    import enhanced_app
+    return enhanced_app.create_app()
+
+
+def load_admin_app(db_path):
+    os.environ['WORD_ADVENTURE_ADMIN_DB_URI'] = f'sqlite:///{db_path}'
+    import main
+    return main.create_app()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Word Adventure APIs')
+    parser.add_argument('--mix', default='learner',
+                        choices=['login_storm', 'quiz_burst', 'dashboard_polling', 'learner', 'admin'])
+    parser.add_argument('--driver', default='client', choices=['client', 'server'])
+    parser.add_argument('--requests', type=int, default=2000, help='total requests to send')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--warmup', type=int, default=100, help='unmeasured requests sent first')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--words', type=int, default=500)
+    parser.add_argument('--progress', type=int, default=20000, help='progress rows to seed')
+    parser.add_argument('--quiz-results', type=int, default=50000, help='quiz results to seed')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write machine-readable results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='word-adventure-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+
+    seed_started = time.perf_counter()
+    if args.mix == 'admin':
+        try:
+            app = load_admin_app(db_path)
+        except ImportError as e:
+            print(f"Admin app is not importable here ({e}); cannot run the admin mix", file=sys.stderr)
+            return 2
+        token, word_ids = seed_admin_data(app, args.words, args.progress, args.seed)
+        mixes = admin_mixes(token, word_ids, rng)
+    else:
+        app = load_learner_app(db_path)
+        user_ids, word_ids = seed_learner_data(db_path, args.users, args.words, args.progress,
+                                               args.quiz_results, args.seed)
+        from flask_jwt_extended import create_access_token
+        with app.app_context():
+            tokens = [create_access_token(identity=u) for u in user_ids]
+        mixes = learner_mixes(tokens, word_ids, rng)
+    print(f"Seeded {db_path} in {time.perf_counter() - seed_started:.1f}s")
+
+    driver = ServerDriver(app) if args.driver == 'server' else ClientDriver(app)
+    try:
+        mix = mixes[args.mix]
+        if args.warmup:
+            run_plan(driver, build_plan(mix, args.warmup, rng), args.concurrency)
+        samples, errors, elapsed = run_plan(driver, build_plan(mix, args.requests, rng), args.concurrency)
+    finally:
+        if isinstance(driver, ServerDriver):
+            driver.close()
+
+    result = summarize(samples, errors, elapsed)
+    result['config'] = {
+        'mix': args.mix, 'driver': args.driver, 'requests': args.requests,
+        'concurrency': args.concurrency, 'users': args.users, 'words': args.words,
+        'progress': args.progress, 'quiz_results': args.quiz_results, 'seed': args.seed,
+        'python': platform.python_version(), 'machine': platform.machine(),
+    }
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
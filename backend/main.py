@@ -1,5 +1,7 @@
 import os
 import sys
+import threading
+from datetime import timedelta
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
@@ -14,17 +16,36 @@ from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.words import words_bp
 from src.routes.analytics import analytics_bp
+from src.instrumentation import init_app as init_instrumentation, instrument_engine
+from src.migrations import migrate_engine, is_current, ADMIN_MIGRATIONS
+from src.startup import phase
+from src.replica import init_app as init_read_replica, create_replica
+from src.purge import init_app as init_purger
+from src.revocation import init_app as init_revocation, load as load_denylist
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 
 # Configuration
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-in-production'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # Tokens don't expire for demo
+# Tokens expire so revoked ones only need remembering for a bounded time
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
+# EventSource can't send headers, so live streams take the token from the URL
+app.config['JWT_TOKEN_LOCATION'] = ['headers', 'query_string']
+
+# The database is set up on first use (see setup()); this hook comes before
+# the instrumentation's so setup statements aren't counted against a request
+@app.before_request
+def ensure_setup():
+    setup()
 
 # Initialize extensions
 jwt = JWTManager(app)
 CORS(app, origins="*")  # Allow all origins for development
+init_instrumentation(app)
+init_revocation(app, jwt)
+init_read_replica(app)
 
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
@@ -33,23 +54,80 @@ app.register_blueprint(words_bp, url_prefix='/api')
 app.register_blueprint(analytics_bp, url_prefix='/api')
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'WORD_ADVENTURE_ADMIN_DB_URI',
+    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
+    # SQLAlchemy only accepts the postgresql:// scheme
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://' + app.config['SQLALCHEMY_DATABASE_URI'][len('postgres://'):]
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql://'):
+    # Pooled connections shared by the request threads of each worker
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('WORD_ADVENTURE_DB_POOL_SIZE', 20)),
+        'max_overflow': 10,
+        'pool_timeout': float(os.environ.get('WORD_ADVENTURE_DB_POOL_TIMEOUT', 30)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
-with app.app_context():
-    db.create_all()
-    
-    # Create default admin if none exists
-    if not Admin.query.first():
-        default_admin = Admin(
-            username='admin',
-            email='admin@wordadventure.com'
-        )
-        default_admin.set_password('admin123')
-        db.session.add(default_admin)
-        db.session.commit()
-        print("Default admin created: username='admin', password='admin123'")
+_setup_lock = threading.Lock()
+_setup_done = False
+
+def setup():
+    """Create or upgrade the schema and start background services, once per process"""
+    global _setup_done
+    if _setup_done:
+        return
+    with _setup_lock:
+        if _setup_done:
+            return
+        with app.app_context():
+            instrument_engine(db.engine)
+            
+            with phase('admin schema'):
+                # Skip create_all and the migration pass once the schema is current
+                conn = db.engine.raw_connection()
+                try:
+                    current = is_current(conn.dbapi_connection, ADMIN_MIGRATIONS)
+                finally:
+                    conn.close()
+                if not current:
+                    db.create_all()
+                    migrate_engine(db.engine, ADMIN_MIGRATIONS)
+            
+            # Create default admin if none exists
+            with phase('default admin'):
+                if not Admin.query.first():
+                    default_admin = Admin(
+                        username='admin',
+                        email='admin@wordadventure.com'
+                    )
+                    default_admin.set_password('admin123')
+                    db.session.add(default_admin)
+                    db.session.commit()
+                    print("Default admin created: username='admin', password='admin123'")
+            
+            # Analytics read from a replica (or snapshot) so they don't contend with writes
+            with phase('read replica'):
+                read_replica = create_replica(app, db.engine)
+                if read_replica.engine is not db.engine:
+                    instrument_engine(read_replica.engine, database='replica')
+            
+            # Logged-out tokens, checked in memory on every request
+            with phase('token denylist'):
+                load_denylist(app, db.engine.raw_connection, 'revoked_token', db.engine.dialect.name)
+            
+            # Deleted words are hidden at once and their progress purged in small batches
+            init_purger(app, db.engine)
+        _setup_done = True
+
+def create_app():
+    """The app with its database ready"""
+    setup()
+    return app
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
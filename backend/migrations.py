@@ -0,0 +1,565 @@
+"""
+Versioned schema migrations for the learner and admin databases.
+
+Both schemas keep their applied versions in a schema_migrations table.
+Each migration is a list of steps: plain SQL statements, AddColumn (only
+applied when the column is missing), CreateIndex and RunPython (data
+moves that SQL alone can't express portably). Every index is
+built in its own short transaction, with the database in WAL mode, so
+readers keep working while it builds and writers only wait for that one
+index (on PostgreSQL, CREATE INDEX CONCURRENTLY outside a transaction).
+Tables that got new indexes are ANALYZEd afterwards so the query
+planner can use them.
+
+Migrations run on a DB-API connection of either dialect ('sqlite' or
+'postgresql'); SQL here is written with '?' placeholders and converted
+for psycopg2.
+
+Usage:
+    python migrations.py upgrade --db word_adventure.db
+    python migrations.py status --db word_adventure.db
+    python migrations.py check-indexes --db word_adventure.db
+    python migrations.py upgrade --database-url postgresql://localhost/word_adventure
+    python migrations.py upgrade --admin-uri sqlite:///database/app.db
+
+check-indexes runs EXPLAIN (QUERY PLAN) on the app's known queries and
+reports full table scans and sorts that suggest a missing index (exit
+status 1 with --strict).
+"""
+import sys
+import json
+import sqlite3
+import argparse
+import importlib
+from datetime import datetime
+
+
+class AddColumn:
+    """Add a column unless the table already has it"""
+
+    def __init__(self, table, column, definition):
+        self.table = table
+        self.column = column
+        self.definition = definition
+
+    def apply(self, conn, dialect='sqlite'):
+        if self.column in table_columns(conn, self.table, dialect):
+            return False
+        cursor = conn.cursor()
+        # Quoted: the admin app has a table named "user", a reserved word in PostgreSQL
+        cursor.execute(f'ALTER TABLE "{self.table}" ADD COLUMN {self.column} {self.definition}')
+        conn.commit()
+        return True
+
+
+class CreateIndex:
+    """Create an index in its own transaction"""
+
+    def __init__(self, name, table, columns, unique=False):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+
+    def apply(self, conn, dialect='sqlite'):
+        unique = 'UNIQUE ' if self.unique else ''
+        if dialect == 'postgresql':
+            # Build without blocking writes; CONCURRENTLY can't run in a transaction
+            conn.commit()
+            conn.autocommit = True
+            try:
+                conn.cursor().execute(
+                    f'CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({self.columns})')
+            finally:
+                conn.autocommit = False
+            return True
+        cursor = conn.cursor()
+        cursor.execute(f'CREATE {unique}INDEX IF NOT EXISTS {self.name} ON {self.table} ({self.columns})')
+        conn.commit()
+        return True
+
+
+class RunPython:
+    """Call function(conn, dialect), then commit"""
+
+    def __init__(self, function):
+        self.function = function
+
+    def apply(self, conn, dialect='sqlite'):
+        self.function(conn, dialect)
+        conn.commit()
+        return True
+
+
+def normalize_subcategories(conn, dialect='sqlite'):
+    """Copy each category's JSON subcategory list into the subcategories table"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, subcategories FROM categories')
+    rows = [
+        (category_id, name, position)
+        for category_id, names in cursor.fetchall()
+        for position, name in enumerate(json.loads(names or '[]'))
+    ]
+    if rows:
+        cursor.executemany(paramstyle('''
+            INSERT INTO subcategories (category_id, name, position) VALUES (?, ?, ?)
+            ON CONFLICT (category_id, name) DO NOTHING
+        ''', dialect), rows)
+
+
+def build_admin_known_words(conn, dialect='sqlite'):
+    """Build each admin user's known-word bitmap from their progress rows"""
+    # src.bitmaps in the admin app, bitmaps when run from backend/
+    bitmaps = importlib.import_module(f'{__package__}.bitmaps' if __package__ else 'bitmaps')
+    cursor = conn.cursor()
+    cursor.execute('SELECT user_id, word_id FROM user_progress WHERE known = TRUE')
+    known = {}
+    for user_id, word_id in cursor.fetchall():
+        known.setdefault(user_id, bitmaps.WordBitmap()).add(word_id)
+    now = datetime.utcnow()
+    if known:
+        cursor.executemany(paramstyle('''
+            INSERT INTO user_known_words (user_id, bitmap, known_count, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO NOTHING
+        ''', dialect), [(user_id, bitmap.to_bytes(), len(bitmap), now) for user_id, bitmap in known.items()])
+
+
+class Migration:
+    def __init__(self, version, description, steps):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+    def apply(self, conn, dialect='sqlite'):
+        """Run every step; returns the tables that need re-analyzing"""
+        analyze = set()
+        for step in self.steps:
+            if isinstance(step, str):
+                cursor = conn.cursor()
+                cursor.execute(step)
+                conn.commit()
+            elif step.apply(conn, dialect) and isinstance(step, CreateIndex):
+                analyze.add(step.table)
+        return analyze
+
+
+LEARNER_MIGRATIONS = [
+    Migration(1, 'per-user timezone for streaks', [
+        AddColumn('users', 'timezone', "TEXT DEFAULT 'UTC'"),
+    ]),
+    Migration(2, 'weekly XP rollup and leaderboard indexes', [
+        '''
+        CREATE TABLE IF NOT EXISTS weekly_xp (
+            week_start TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            xp INTEGER DEFAULT 0,
+            PRIMARY KEY (week_start, user_id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        CreateIndex('idx_users_xp', 'users', 'xp DESC'),
+        CreateIndex('idx_users_age_group_xp', 'users', 'age_group, xp DESC'),
+        CreateIndex('idx_weekly_xp_rank', 'weekly_xp', 'week_start, xp DESC'),
+    ]),
+    Migration(3, 'indexes for per-user history and category lookups', [
+        CreateIndex('idx_quiz_results_user_timestamp', 'quiz_results', 'user_id, timestamp'),
+        CreateIndex('idx_quiz_results_word', 'quiz_results', 'word_id'),
+        CreateIndex('idx_words_category', 'words', 'category'),
+        CreateIndex('idx_words_word', 'words', 'word'),
+        CreateIndex('idx_user_word_progress_word', 'user_word_progress', 'word_id'),
+    ]),
+    Migration(4, 'date-ordered scans of quiz history for exports', [
+        CreateIndex('idx_quiz_results_timestamp', 'quiz_results', 'timestamp'),
+    ]),
+    Migration(5, 'calibrated word difficulty', [
+        AddColumn('words', 'difficulty_score', 'REAL'),
+        '''
+        CREATE TABLE IF NOT EXISTS word_calibration (
+            word_id INTEGER PRIMARY KEY,
+            attempts INTEGER DEFAULT 0,
+            FOREIGN KEY (word_id) REFERENCES words (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_skill (
+            user_id INTEGER PRIMARY KEY,
+            rating REAL NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS calibration_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+        ''',
+        CreateIndex('idx_words_difficulty_score', 'words', 'difficulty_score'),
+    ]),
+    Migration(6, 'content versions for cached word pools', [
+        '''
+        CREATE TABLE IF NOT EXISTS content_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ]),
+    Migration(7, 'soft-deleted words awaiting purge', [
+        AddColumn('words', 'deleted_at', 'TIMESTAMP'),
+        CreateIndex('idx_words_deleted_at', 'words', 'deleted_at'),
+    ]),
+    Migration(8, 'known-word bitmaps per user', [
+        # BYTEA for PostgreSQL; SQLite stores the bytes as a BLOB either way
+        '''
+        CREATE TABLE IF NOT EXISTS user_known_words (
+            user_id INTEGER PRIMARY KEY,
+            bitmap BYTEA NOT NULL,
+            known_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+    Migration(9, 'revoked tokens', [
+        '''
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            jti VARCHAR(36) PRIMARY KEY,
+            expires_at BIGINT NOT NULL,
+            revoked_at DOUBLE PRECISION NOT NULL
+        )
+        ''',
+        CreateIndex('idx_revoked_tokens_revoked_at', 'revoked_tokens', 'revoked_at'),
+        CreateIndex('idx_revoked_tokens_expires_at', 'revoked_tokens', 'expires_at'),
+    ]),
+    Migration(10, 'normalized subcategories and kept word counts', [
+        AddColumn('words', 'subcategory', 'TEXT'),
+        '''
+        CREATE TABLE IF NOT EXISTS subcategories (
+            category_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category_id, name),
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT NOT NULL,
+            subcategory TEXT NOT NULL DEFAULT '',
+            difficulty TEXT NOT NULL DEFAULT '',
+            word_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, subcategory, difficulty)
+        )
+        ''',
+        CreateIndex('idx_subcategories_name', 'subcategories', 'name'),
+        CreateIndex('idx_words_category_subcategory', 'words', 'category, subcategory'),
+        RunPython(normalize_subcategories),
+        'DELETE FROM category_stats',
+        '''
+        INSERT INTO category_stats (category, subcategory, difficulty, word_count)
+        SELECT category, COALESCE(subcategory, ''), COALESCE(difficulty, ''), COUNT(*) FROM words
+        WHERE deleted_at IS NULL
+        GROUP BY category, COALESCE(subcategory, ''), COALESCE(difficulty, '')
+        ''',
+    ]),
+]
+
+# Rebuilds the admin's kept word counts from the word table
+ADMIN_CATEGORY_RECOUNT = [
+    'DELETE FROM category_stat',
+    '''
+    INSERT INTO category_stat (category, difficulty, word_count)
+    SELECT COALESCE(category, ''), COALESCE(difficulty, ''), COUNT(*) FROM word
+    WHERE deleted_at IS NULL
+    GROUP BY COALESCE(category, ''), COALESCE(difficulty, '')
+    ''',
+]
+
+ADMIN_MIGRATIONS = [
+    Migration(1, 'indexes for word lookups and progress joins', [
+        CreateIndex('ix_word_word', 'word', 'word'),
+        CreateIndex('ix_word_category', 'word', 'category'),
+        CreateIndex('ix_user_progress_word_id', 'user_progress', 'word_id'),
+        CreateIndex('ix_user_progress_user_id', 'user_progress', 'user_id'),
+    ]),
+    Migration(2, 'soft-deleted words awaiting purge', [
+        AddColumn('word', 'deleted_at', 'TIMESTAMP'),
+        CreateIndex('ix_word_deleted_at', 'word', 'deleted_at'),
+    ]),
+    Migration(3, 'content version counter', [
+        '''
+        CREATE TABLE IF NOT EXISTS content_version (
+            name VARCHAR(50) PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ]),
+    Migration(4, 'revoked tokens', [
+        '''
+        CREATE TABLE IF NOT EXISTS revoked_token (
+            jti VARCHAR(36) PRIMARY KEY,
+            expires_at BIGINT NOT NULL,
+            revoked_at DOUBLE PRECISION NOT NULL
+        )
+        ''',
+        CreateIndex('ix_revoked_token_revoked_at', 'revoked_token', 'revoked_at'),
+        CreateIndex('ix_revoked_token_expires_at', 'revoked_token', 'expires_at'),
+    ]),
+    Migration(5, 'word counts per category and difficulty', [
+        '''
+        CREATE TABLE IF NOT EXISTS category_stat (
+            category VARCHAR(50) NOT NULL,
+            difficulty VARCHAR(20) NOT NULL,
+            word_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, difficulty)
+        )
+        ''',
+        *ADMIN_CATEGORY_RECOUNT,
+    ]),
+    Migration(6, 'user signup time for user analytics', [
+        AddColumn('user', 'created_at', 'TIMESTAMP'),
+    ]),
+    Migration(7, 'known-word bitmaps per user', [
+        '''
+        CREATE TABLE IF NOT EXISTS user_known_words (
+            user_id INTEGER PRIMARY KEY,
+            bitmap BYTEA NOT NULL,
+            known_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES "user" (id)
+        )
+        ''',
+        RunPython(build_admin_known_words),
+    ]),
+]
+
+# Queries the apps run, checked by check-indexes
+LEARNER_QUERIES = [
+    ('words with progress', '''
+        SELECT w.*, COALESCE(uwp.known, FALSE) as known, COALESCE(uwp.mastery_level, 0) as mastery_level
+        FROM words w
+        LEFT JOIN user_word_progress uwp ON w.id = uwp.word_id AND uwp.user_id = ?
+        WHERE w.deleted_at IS NULL
+        ORDER BY w.word
+    ''', (1,)),
+    ('words learned count', 'SELECT COUNT(*) FROM user_word_progress WHERE user_id = ? AND known = TRUE', (1,)),
+    ('user achievements', 'SELECT achievement_id FROM user_achievements WHERE user_id = ?', (1,)),
+    ('user pet', 'SELECT * FROM virtual_pets WHERE user_id = ?', (1,)),
+    ('recent quiz history', '''
+        SELECT * FROM quiz_results WHERE user_id = ? AND timestamp >= ? ORDER BY timestamp
+    ''', (1, '2024-01-01')),
+    ('quiz results for a word', 'SELECT COUNT(*) FROM quiz_results WHERE word_id = ?', (1,)),
+    ('words in category', 'SELECT * FROM words WHERE category = ?', ('animals',)),
+    ('words in subcategory', 'SELECT id FROM words WHERE category = ? AND subcategory = ?', ('animals', 'pets')),
+    ('categories with a subcategory', 'SELECT category_id FROM subcategories WHERE name = ?', ('pets',)),
+    ('words by difficulty', 'SELECT id, word FROM words ORDER BY difficulty_score LIMIT ?', (20,)),
+    ('progress on a word', 'SELECT COUNT(*) FROM user_word_progress WHERE word_id = ?', (1,)),
+    ('words awaiting purge', 'SELECT id FROM words WHERE deleted_at IS NOT NULL', ()),
+    ('known-word bitmap', 'SELECT bitmap FROM user_known_words WHERE user_id = ?', (1,)),
+    ('new token revocations', 'SELECT jti, expires_at FROM revoked_tokens WHERE revoked_at >= ?', (0,)),
+    ('global leaderboard', 'SELECT id, username, xp, level FROM users ORDER BY xp DESC LIMIT ?', (10,)),
+    ('age group leaderboard', '''
+        SELECT id, username, xp, level FROM users WHERE age_group = ? ORDER BY xp DESC LIMIT ?
+    ''', ('child', 10)),
+    ('weekly leaderboard', '''
+        SELECT w.user_id, u.username, w.xp, u.level FROM weekly_xp w JOIN users u ON u.id = w.user_id
+        WHERE w.week_start = ? ORDER BY w.xp DESC LIMIT ?
+    ''', ('2024-01-01', 10)),
+]
+
+ADMIN_QUERIES = [
+    ('word by name', 'SELECT * FROM word WHERE word = ?', ('apple',)),
+    ('words in category', 'SELECT * FROM word WHERE category = ? ORDER BY created_at DESC', ('animals',)),
+    ('progress on a word', '''
+        DELETE FROM user_progress WHERE id IN (SELECT id FROM user_progress WHERE word_id = ? LIMIT ?)
+    ''', (1, 500)),
+    ('words awaiting purge', 'SELECT id FROM word WHERE deleted_at IS NOT NULL', ()),
+    ('progress of a user', 'SELECT * FROM user_progress WHERE user_id = ?', (1,)),
+    ('new token revocations', 'SELECT jti, expires_at FROM revoked_token WHERE revoked_at >= ?', (0,)),
+    ('word attempts', '''
+        SELECT word.word, word.id, SUM(user_progress.attempts) FROM word
+        JOIN user_progress ON word.id = user_progress.word_id
+        GROUP BY word.id ORDER BY SUM(user_progress.attempts) DESC LIMIT 10
+    ''', ()),
+]
+
+
+def paramstyle(sql, dialect):
+    """Convert '?' placeholders for psycopg2"""
+    return sql if dialect == 'sqlite' else sql.replace('?', '%s')
+
+
+def table_columns(conn, table, dialect='sqlite'):
+    cursor = conn.cursor()
+    if dialect == 'postgresql':
+        cursor.execute(paramstyle('SELECT column_name FROM information_schema.columns WHERE table_name = ?', dialect),
+                       (table,))
+        return [row[0] for row in cursor.fetchall()]
+    cursor.execute(f'PRAGMA table_info("{table}")')
+    return [row[1] for row in cursor.fetchall()]
+
+
+def ensure_migrations_table(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def applied_versions(conn):
+    ensure_migrations_table(conn)
+    cursor = conn.cursor()
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def is_current(conn, migrations):
+    """Whether the newest migration is recorded, checked without creating anything
+
+    Apps use this to skip their CREATE TABLE and migration pass at start-up;
+    a schema change therefore always needs a migration.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT MAX(version) FROM schema_migrations')
+        latest = cursor.fetchone()[0]
+    except Exception:
+        # No schema_migrations table yet
+        latest = None
+    conn.rollback()
+    return latest == max(m.version for m in migrations)
+
+
+def enable_wal(conn):
+    """Let readers continue while migrations (and other writers) run"""
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.fetchall()
+    cursor.execute('PRAGMA busy_timeout=5000')
+
+
+def analyze(conn, tables=None):
+    """Refresh planner statistics, e.g. after bulk changes or new indexes"""
+    cursor = conn.cursor()
+    if tables is None:
+        cursor.execute('ANALYZE')
+    else:
+        for table in sorted(tables):
+            cursor.execute(f'ANALYZE {table}')
+    conn.commit()
+
+
+def migrate(conn, migrations, log=None, dialect='sqlite'):
+    """Apply pending migrations in version order; returns the versions applied"""
+    if dialect == 'sqlite':
+        enable_wal(conn)
+    done = applied_versions(conn)
+    applied = []
+    analyze_tables = set()
+
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        if log:
+            log(f'Applying migration {migration.version}: {migration.description}')
+        analyze_tables |= migration.apply(conn, dialect)
+        cursor = conn.cursor()
+        cursor.execute(paramstyle('INSERT INTO schema_migrations (version, description) VALUES (?, ?)', dialect),
+                       (migration.version, migration.description))
+        conn.commit()
+        applied.append(migration.version)
+
+    if analyze_tables:
+        analyze(conn, analyze_tables)
+    return applied
+
+
+def migrate_engine(engine, migrations=ADMIN_MIGRATIONS, log=None):
+    """Apply migrations through a SQLAlchemy engine's DBAPI connection"""
+    conn = engine.raw_connection()
+    try:
+        return migrate(conn.dbapi_connection, migrations, log, dialect=engine.dialect.name)
+    finally:
+        conn.close()
+
+
+def status(conn, migrations):
+    done = applied_versions(conn)
+    return [(m.version, m.description, m.version in done) for m in sorted(migrations, key=lambda m: m.version)]
+
+
+def check_indexes(conn, queries, dialect='sqlite'):
+    """EXPLAIN the known queries; returns [(name, plan line)] for likely missing indexes"""
+    findings = []
+    cursor = conn.cursor()
+    explain = 'EXPLAIN QUERY PLAN' if dialect == 'sqlite' else 'EXPLAIN'
+    for name, sql, params in queries:
+        try:
+            cursor.execute(paramstyle(f'{explain} {sql}', dialect), params)
+        except Exception as e:
+            conn.rollback()
+            findings.append((name, f'could not explain: {e}'))
+            continue
+        for row in cursor.fetchall():
+            detail = row[-1].strip()
+            if dialect == 'sqlite':
+                suspicious = (detail.startswith('SCAN ') and 'INDEX' not in detail) or 'USE TEMP B-TREE' in detail
+            else:
+                suspicious = detail.startswith(('Seq Scan', '->  Seq Scan', 'Sort', '->  Sort'))
+            if suspicious:
+                findings.append((name, detail))
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage Word Adventure database migrations')
+    parser.add_argument('command', choices=['upgrade', 'status', 'check-indexes'])
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--database-url', help='learner database URL (instead of --db), e.g. postgresql://...')
+    parser.add_argument('--admin-uri', help='admin database SQLAlchemy URI (instead of --db)')
+    parser.add_argument('--strict', action='store_true', help='exit 1 if check-indexes finds problems')
+    args = parser.parse_args(argv)
+
+    if args.admin_uri:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.admin_uri)
+        pooled = engine.raw_connection()
+        conn = pooled.dbapi_connection
+        dialect = engine.dialect.name
+        migrations, queries = ADMIN_MIGRATIONS, ADMIN_QUERIES
+    elif args.database_url and args.database_url.startswith(('postgresql://', 'postgres://')):
+        import psycopg2
+        conn = psycopg2.connect(args.database_url)
+        dialect = 'postgresql'
+        migrations, queries = LEARNER_MIGRATIONS, LEARNER_QUERIES
+    else:
+        conn = sqlite3.connect(args.database_url[len('sqlite:///'):] if args.database_url else args.db)
+        dialect = 'sqlite'
+        migrations, queries = LEARNER_MIGRATIONS, LEARNER_QUERIES
+
+    try:
+        if args.command == 'upgrade':
+            applied = migrate(conn, migrations, log=print, dialect=dialect)
+            print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+        elif args.command == 'status':
+            for version, description, done in status(conn, migrations):
+                print(f"{'[x]' if done else '[ ]'} {version:>3}  {description}")
+        else:
+            findings = check_indexes(conn, queries, dialect)
+            for name, detail in findings:
+                print(f'{name}: {detail}')
+            print(f'{len(findings)} potential missing index(es) in {len(queries)} queries')
+            if findings and args.strict:
+                return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
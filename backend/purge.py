@@ -0,0 +1,225 @@
+"""
+Background purging of soft-deleted words.
+
+Deleting a word only stamps its deleted_at column, which hides it from
+listings right away. A Purger thread then removes the rows that depend
+on it (progress, quiz history, ...) in batches of BATCH_SIZE rows, each
+in its own short transaction with PAUSE seconds in between, so learner
+writes are never stuck behind one huge delete. The word row itself goes
+last. Purging resumes after a restart because the pending work is just
+"words with deleted_at set".
+
+Usage:
+    python purge.py --db word_adventure.db
+    python purge.py --db word_adventure.db --delete 12 13
+    python purge.py --admin-uri sqlite:///database/app.db
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from flask import current_app
+
+logger = logging.getLogger('word_adventure.purge')
+
+BATCH_SIZE = int(os.environ.get('WORD_ADVENTURE_PURGE_BATCH', 500))
+PAUSE = float(os.environ.get('WORD_ADVENTURE_PURGE_PAUSE', 0.05))
+POLL_INTERVAL = 30.0
+
+
+class PurgeTarget:
+    """A soft-deletable table and the (table, column, key) triples referencing it"""
+
+    def __init__(self, table, dependents):
+        self.table = table
+        self.dependents = dependents
+
+
+LEARNER_TARGET = PurgeTarget('words', [
+    ('user_word_progress', 'word_id', 'id'),
+    ('quiz_results', 'word_id', 'id'),
+    ('word_calibration', 'word_id', 'word_id'),
+])
+
+ADMIN_TARGET = PurgeTarget('word', [
+    ('user_progress', 'word_id', 'id'),
+])
+
+
+class Purger:
+    """Deletes soft-deleted rows and their dependents in throttled batches"""
+
+    def __init__(self, connect, target, dialect='sqlite', batch_size=BATCH_SIZE, pause=PAUSE,
+                 poll_interval=POLL_INTERVAL, param=None):
+        self.connect = connect
+        self.target = target
+        self.dialect = dialect
+        self.param = param or ('?' if dialect == 'sqlite' else '%s')
+        self.batch_size = batch_size
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def pending(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT id FROM {self.target.table} WHERE deleted_at IS NOT NULL')
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.rollback()
+        return ids
+
+    def purge_rows(self, conn, table, column, key, row_id):
+        """Delete one table's rows for a deleted id, a batch per transaction"""
+        p = self.param
+        total = 0
+        while not self._stopped.is_set():
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                DELETE FROM {table} WHERE {key} IN (
+                    SELECT {key} FROM {table} WHERE {column} = {p} LIMIT {p}
+                )
+            ''', (row_id, self.batch_size))
+            deleted = cursor.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return total
+
+    def purge(self, conn, row_id):
+        """Remove a soft-deleted row's dependents, then the row itself"""
+        counts = {}
+        for table, column, key in self.target.dependents:
+            counts[table] = self.purge_rows(conn, table, column, key, row_id)
+        if self._stopped.is_set():
+            return counts
+        cursor = conn.cursor()
+        cursor.execute(f'DELETE FROM {self.target.table} WHERE id = {self.param} AND deleted_at IS NOT NULL',
+                       (row_id,))
+        conn.commit()
+        logger.info('Purged %s %s: %s', self.target.table, row_id, counts)
+        return counts
+
+    def run_once(self):
+        """Purge everything pending; returns the purged ids"""
+        conn = self.connect()
+        try:
+            purged = []
+            for row_id in self.pending(conn):
+                if self._stopped.is_set():
+                    break
+                self.purge(conn, row_id)
+                purged.append(row_id)
+            return purged
+        finally:
+            conn.close()
+
+    def loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Purge of %s failed', self.target.table)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.loop, name=f'purge-{self.target.table}', daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Start purging now instead of at the next poll"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+
+def soft_delete(cursor, table, ids, param='?'):
+    """Hide rows from listings until the purger gets to them; returns the count"""
+    if not ids:
+        return 0
+    p = param
+    cursor.execute(f'''
+        UPDATE {table} SET deleted_at = {p}
+        WHERE deleted_at IS NULL AND id IN ({', '.join([p] * len(ids))})
+    ''', (datetime.utcnow().isoformat(' '), *ids))
+    return cursor.rowcount
+
+
+def init_app(app, engine, **options):
+    """Start the app's purger thread for soft-deleted admin words"""
+    purger = Purger(engine.raw_connection, ADMIN_TARGET, engine.dialect.name, **options)
+    app.extensions['purger'] = purger
+    return purger.start()
+
+
+def wake():
+    """Tell the current app's purger there are new deletions"""
+    purger = current_app.extensions.get('purger')
+    if purger:
+        purger.wake()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Purge soft-deleted words and their history')
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--database-url', help='learner database URL (instead of --db)')
+    parser.add_argument('--admin-uri', help='admin database SQLAlchemy URI (instead of --db)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=PAUSE, help='seconds between batches')
+    parser.add_argument('--delete', type=int, nargs='+', metavar='ID', help='soft-delete these words first')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.admin_uri:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.admin_uri)
+        purger = Purger(engine.raw_connection, ADMIN_TARGET, engine.dialect.name, args.batch_size, args.pause)
+    else:
+        from storage import create_backend
+        backend = create_backend(args.database_url or f'sqlite:///{args.db}')
+        # Learner backends take '?' placeholders on either database
+        purger = Purger(backend.connect, LEARNER_TARGET, backend.dialect, args.batch_size, args.pause, param='?')
+
+    if args.delete:
+        conn = purger.connect()
+        try:
+            cursor = conn.cursor()
+            if args.admin_uri:
+                from migrations import ADMIN_CATEGORY_RECOUNT
+                deleted = soft_delete(cursor, purger.target.table, args.delete, purger.param)
+                for statement in ADMIN_CATEGORY_RECOUNT:
+                    cursor.execute(statement)
+                cursor.execute('''
+                    INSERT INTO content_version (name, version) VALUES ('words', 1)
+                    ON CONFLICT (name) DO UPDATE SET version = content_version.version + 1
+                ''')
+            else:
+                from categories import uncount_words
+                from quiz import bump_content_version
+                uncount_words(cursor, args.delete)
+                deleted = soft_delete(cursor, purger.target.table, args.delete, purger.param)
+                # Drop the words from cached quiz pools and category listings
+                bump_content_version(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+        print(f'Soft-deleted {deleted} word(s)')
+
+    purged = purger.run_once()
+    print(f'Purged {len(purged)} deleted word(s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
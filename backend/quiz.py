@@ -0,0 +1,291 @@
+"""
+Adaptive quiz selection for the learner API.
+
+next_quiz() picks the next N words for a learner from three buckets:
+
+- new: words the learner hasn't practiced, nearest to their skill rating
+  (user_skill, see calibration.py) by calibrated difficulty
+- due: known words whose review interval (longer for higher mastery)
+  has passed, most overdue first
+- weak: practiced words that aren't known yet, lowest mastery first
+
+Each bucket is drawn round-robin across categories so one category can't
+fill the quiz. Every question comes with multiple-choice distractors from
+the same category.
+
+Word pools per category (sorted by difficulty score) are built once and
+rebuilt only when the 'words' content version changes; the version is
+checked at most every VERSION_CHECK_INTERVAL seconds. Learner progress is
+cached per user and dropped by forget() when their progress changes, so a
+typical request does no database work at all. Another worker's writes
+can't call this process's forget(), so cached progress is also reloaded
+after STATE_TTL seconds. Calibration bumps the content version, and
+cached skill ratings from before that are reloaded too. Given a vocab.VocabularyFile,
+the pools are views of the shared vocabulary snapshot instead.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+VERSION_CHECK_INTERVAL = 2.0
+USER_CACHE_SIZE = 10000
+STATE_TTL = 30.0
+DEFAULT_COUNT = 10
+MAX_COUNT = 50
+DISTRACTORS = 3
+# Share of a quiz drawn from each bucket before leftovers are redistributed
+MIX = (('due', 0.3), ('weak', 0.3), ('new', 0.4))
+# Days before a known word is due again, by mastery level
+REVIEW_DAYS = (1, 2, 4, 7, 14, 30)
+DEFAULT_SKILL = 1500.0
+
+
+def content_version(cursor, name='words'):
+    cursor.execute('SELECT version FROM content_versions WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump_content_version(cursor, name='words'):
+    """Mark content as changed; call in the transaction that changes it"""
+    cursor.execute('''
+        INSERT INTO content_versions (name, version) VALUES (?, 1)
+        ON CONFLICT (name) DO UPDATE SET version = content_versions.version + 1
+    ''', (name,))
+
+
+def parse_time(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class PoolWord:
+    __slots__ = ('id', 'word', 'image', 'pronunciation', 'category', 'difficulty', 'score')
+
+    def __init__(self, row):
+        self.id, self.word, self.image, self.pronunciation, self.category, self.difficulty, self.score = row
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'word': self.word,
+            'image': self.image,
+            'pronunciation': self.pronunciation,
+            'category': self.category,
+            'difficulty': self.difficulty,
+            'difficultyScore': self.score
+        }
+
+
+class Pools:
+    """Words of one content version, per category and sorted by difficulty"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.words = {}
+        self.categories = {}
+        for row in rows:
+            word = PoolWord(row)
+            self.words[word.id] = word
+            self.categories.setdefault(word.category, []).append(word)
+        self.all_words = list(self.words.values())
+        self.scores = {}
+        for category, words in self.categories.items():
+            words.sort(key=lambda w: (w.score is None, w.score or 0, w.word))
+            self.scores[category] = [w.score if w.score is not None else float('inf') for w in words]
+
+
+class LearnerState:
+    __slots__ = ('progress', 'skill', 'version', 'loaded_at')
+
+    def __init__(self, progress, skill, version):
+        self.progress = progress
+        self.skill = skill
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+
+class QuizService:
+    """Builds adaptive quizzes from precomputed pools"""
+
+    def __init__(self, connect, cache_size=USER_CACHE_SIZE, check_interval=VERSION_CHECK_INTERVAL, vocabulary=None,
+                 state_ttl=STATE_TTL):
+        self.connect = connect
+        self.vocabulary = vocabulary
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self.state_ttl = state_ttl
+        self.pools = None
+        self._checked_at = 0.0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load_pools(self, cursor, version):
+        cursor.execute('''
+            SELECT id, word, image, pronunciation, category, difficulty, difficulty_score
+            FROM words WHERE deleted_at IS NULL
+        ''')
+        return Pools(version, [tuple(row) for row in cursor.fetchall()])
+
+    def get_pools(self):
+        """Current pools, rebuilt if the words' content version moved on"""
+        now = time.monotonic()
+        if self.pools is not None and now - self._checked_at < self.check_interval:
+            return self.pools
+        with self._lock:
+            if self.pools is not None and now - self._checked_at < self.check_interval:
+                return self.pools
+            conn = self.connect()
+            try:
+                cursor = conn.cursor()
+                version = content_version(cursor)
+                if self.pools is None or self.pools.version != version:
+                    if self.vocabulary is not None:
+                        self.pools = self.vocabulary.pools(cursor, version)
+                    else:
+                        self.pools = self.load_pools(cursor, version)
+            finally:
+                conn.close()
+            self._checked_at = time.monotonic()
+            return self.pools
+
+    def load_state(self, user_id, version):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT word_id, known, mastery_level, last_practiced
+                FROM user_word_progress WHERE user_id = ?
+            ''', (user_id,))
+            progress = {
+                row[0]: (bool(row[1]), row[2] or 0, parse_time(row[3]))
+                for row in cursor.fetchall()
+            }
+            cursor.execute('SELECT rating FROM user_skill WHERE user_id = ?', (user_id,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        return LearnerState(progress, row[0] if row else DEFAULT_SKILL, version)
+
+    def get_state(self, user_id, version):
+        """A learner's progress and skill, cached until forgotten, expired or recalibrated"""
+        with self._lock:
+            state = self._users.get(user_id)
+            if (state is not None and state.version == version
+                    and time.monotonic() - state.loaded_at < self.state_ttl):
+                self._users.move_to_end(user_id)
+                return state
+        state = self.load_state(user_id, version)
+        with self._lock:
+            self._users[user_id] = state
+            while len(self._users) > self.cache_size:
+                self._users.popitem(last=False)
+        return state
+
+    def forget(self, user_id):
+        """Drop a learner's cached progress after it changes"""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def buckets(self, pools, state, categories, now):
+        """Candidate word ids per bucket and category, best first"""
+        due, weak = {}, {}
+        for word_id, (known, mastery_level, last_practiced) in state.progress.items():
+            word = pools.words.get(word_id)
+            if word is None or word.category not in categories:
+                continue
+            if known:
+                interval = timedelta(days=REVIEW_DAYS[min(mastery_level, len(REVIEW_DAYS) - 1)])
+                overdue = now - (last_practiced or now - interval) - interval
+                if overdue >= timedelta(0):
+                    due.setdefault(word.category, []).append((-overdue.total_seconds(), word_id))
+            else:
+                weak.setdefault(word.category, []).append((mastery_level, word_id))
+        return {
+            'due': {c: [w for _, w in sorted(items)] for c, items in due.items()},
+            'weak': {c: [w for _, w in sorted(items)] for c, items in weak.items()},
+            'new': {c: self.new_words(pools, c, state) for c in categories}
+        }
+
+    def new_words(self, pools, category, state):
+        """Lazily yield unpracticed words of a category, closest to the learner's skill first"""
+        words, scores = pools.categories.get(category, []), pools.scores.get(category, [])
+        above = bisect_left(scores, state.skill)
+        below = above - 1
+        while below >= 0 or above < len(words):
+            take_above = below < 0 or (above < len(words) and
+                                       scores[above] - state.skill <= state.skill - scores[below])
+            if take_above:
+                word, above = words[above], above + 1
+            else:
+                word, below = words[below], below - 1
+            if word.id not in state.progress:
+                yield word.id
+
+    def draw(self, per_category, count, order, chosen):
+        """Take up to count words round-robin over categories"""
+        taken = []
+        iterators = {c: iter(per_category[c]) for c in order if c in per_category}
+        while len(taken) < count and iterators:
+            for category in list(iterators):
+                word_id = next(iterators[category], None)
+                while word_id is not None and word_id in chosen:
+                    word_id = next(iterators[category], None)
+                if word_id is None:
+                    del iterators[category]
+                    continue
+                chosen.add(word_id)
+                taken.append(word_id)
+                if len(taken) == count:
+                    break
+        return taken
+
+    def distractors(self, pools, word, rng, count=DISTRACTORS):
+        same = [w for w in rng.sample(pools.categories[word.category],
+                                      min(len(pools.categories[word.category]), count + 1)) if w.id != word.id]
+        choices = same[:count]
+        if len(choices) < count:
+            # Tiny category: borrow from the rest of the vocabulary
+            others = [w for w in rng.sample(pools.all_words, min(len(pools.all_words), count * 3))
+                      if w.category != word.category]
+            choices += others[:count - len(choices)]
+        return choices
+
+    def next_quiz(self, user_id, count=DEFAULT_COUNT, category=None, seed=None):
+        """The next `count` questions for a learner, each with its choices"""
+        pools = self.get_pools()
+        state = self.get_state(user_id, pools.version)
+        rng = random.Random(seed)
+        now = datetime.now()
+
+        categories = [category] if category else list(pools.categories)
+        categories = [c for c in categories if c in pools.categories]
+        buckets = self.buckets(pools, state, set(categories), now)
+
+        order = categories[:]
+        rng.shuffle(order)
+        chosen, picks = set(), []
+        for bucket, share in MIX:
+            quota = round(count * share)
+            picks += [(word_id, bucket) for word_id in self.draw(buckets[bucket], quota, order, chosen)]
+        # Fill whatever a bucket couldn't supply from the others
+        for bucket, _ in MIX:
+            if len(picks) >= count:
+                break
+            picks += [(word_id, bucket) for word_id in self.draw(buckets[bucket], count - len(picks), order, chosen)]
+        rng.shuffle(picks)
+
+        questions = []
+        for word_id, reason in picks[:count]:
+            word = pools.words[word_id]
+            choices = [word] + self.distractors(pools, word, rng)
+            rng.shuffle(choices)
+            question = word.to_dict()
+            question['reason'] = reason
+            question['choices'] = [{'id': c.id, 'word': c.word, 'image': c.image} for c in choices]
+            questions.append(question)
+        return {'version': pools.version, 'questions': questions}
@@ -0,0 +1,207 @@
+"""
+Read/write routing for analytics queries.
+
+Writes (and anything that must see them right away, like admin lookups)
+go through db.session on the primary. Dashboards read through
+read_session(), a per-request session bound to:
+
+- WORD_ADVENTURE_ADMIN_REPLICA_URI when set, e.g. a PostgreSQL streaming
+  replica; staleness is its replay lag.
+- otherwise, for a SQLite primary, a snapshot copy taken with the online
+  backup API and opened read-only. The snapshot is retaken once it is
+  older than WORD_ADVENTURE_REPLICA_MAX_STALENESS seconds, so dashboard
+  GROUP BYs never hold locks on the file learners write to. The copy is
+  made on a background thread while requests keep reading the old
+  snapshot, and only one worker copies at a time.
+- otherwise the primary itself (staleness 0).
+
+read_response() adds a data_freshness object and an X-Data-Staleness
+header, so clients can tell how old the numbers are.
+"""
+import os
+import time
+import fcntl
+import logging
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app, g, jsonify
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from src.serialization import list_response
+
+REPLICA_URI = os.environ.get('WORD_ADVENTURE_ADMIN_REPLICA_URI')
+MAX_STALENESS = float(os.environ.get('WORD_ADVENTURE_REPLICA_MAX_STALENESS', 30))
+
+logger = logging.getLogger('word_adventure.replica')
+
+
+class ReadReplica:
+    """A read-only engine with a known upper bound on staleness"""
+
+    def __init__(self, primary, url=REPLICA_URI, max_staleness=MAX_STALENESS):
+        self.primary = primary
+        self.max_staleness = max_staleness
+        self.snapshot_path = None
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+        if url:
+            self.source = 'replica'
+            self.engine = create_engine(url, pool_pre_ping=True)
+        elif primary.dialect.name == 'sqlite' and primary.url.database not in (None, '', ':memory:'):
+            self.source = 'snapshot'
+            self.snapshot_path = primary.url.database + '.snapshot'
+            self.refresh()
+            self.engine = create_engine(f'sqlite:///file:{self.snapshot_path}?mode=ro&uri=true')
+        else:
+            self.source = 'primary'
+            self.engine = primary
+
+    def refresh(self):
+        """Copy the primary into a new snapshot and swap it in atomically
+
+        Workers share the snapshot file and take turns through a lock file
+        next to it; one that finds the snapshot retaken while it waited
+        uses that copy instead of making another.
+        """
+        directory, name = os.path.split(os.path.abspath(self.snapshot_path))
+        with open(self.snapshot_path + '.lock', 'a') as lock:
+            # Released when the file is closed
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if time.time() - self.snapshot_time() >= self.max_staleness:
+                fd, partial = tempfile.mkstemp(dir=directory, prefix=f'.{name}-', suffix='.partial')
+                os.close(fd)
+                try:
+                    started = time.time()
+                    self.copy_primary(partial)
+                    # The data is as old as the copy's start, which is what staleness reports
+                    os.utime(partial, (started, started))
+                    os.replace(partial, self.snapshot_path)
+                except BaseException:
+                    if os.path.exists(partial):
+                        os.unlink(partial)
+                    raise
+        self.swap_in()
+
+    def copy_primary(self, path):
+        source = sqlite3.connect(self.primary.url.database)
+        try:
+            target = sqlite3.connect(path)
+            try:
+                # One read transaction gives a consistent copy; under WAL it doesn't block writers
+                source.backup(target)
+                # A read-only WAL database needs -shm/-wal files; snapshots don't
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+    def snapshot_time(self):
+        """When the snapshot file was last retaken, by any process"""
+        try:
+            return os.path.getmtime(self.snapshot_path)
+        except FileNotFoundError:
+            return 0.0
+
+    def swap_in(self):
+        self.refreshed_at = self.snapshot_time()
+        if getattr(self, 'engine', None) is not None:
+            # Pooled connections still see the old file; open new ones on the next checkout
+            self.engine.dispose()
+
+    def ensure_fresh(self):
+        """Retake a snapshot past its staleness bound, serving the old one until the copy is done"""
+        if self.source != 'snapshot':
+            return
+        if self.snapshot_time() > self.refreshed_at:
+            # Another worker retook it
+            self.swap_in()
+        if time.time() - self.refreshed_at < self.max_staleness:
+            return
+        if not self.max_staleness:
+            # A bound of 0 asks for current data, so the copy has to finish first
+            with self._lock:
+                self.refresh()
+        elif self._lock.acquire(blocking=False):
+            threading.Thread(target=self.refresh_in_background, name='replica-refresh', daemon=True).start()
+
+    def refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Refreshing the analytics snapshot failed')
+        finally:
+            self._lock.release()
+
+    def staleness(self):
+        """Seconds the data served by this replica may lag the primary"""
+        if self.source == 'snapshot':
+            return time.time() - self.refreshed_at
+        if self.source == 'replica' and self.engine.dialect.name == 'postgresql':
+            with self.engine.connect() as conn:
+                lag = conn.execute(text(
+                    'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+                )).scalar()
+            return float(lag or 0)
+        return 0.0
+
+    def freshness(self):
+        staleness = self.staleness()
+        as_of = datetime.now(timezone.utc).timestamp() - staleness
+        return {
+            'source': self.source,
+            'staleness_seconds': round(staleness, 3),
+            'as_of': datetime.fromtimestamp(as_of, timezone.utc).isoformat(),
+            'max_staleness_seconds': self.max_staleness
+        }
+
+    def session(self):
+        self.ensure_fresh()
+        return Session(bind=self.engine)
+
+
+def init_app(app):
+    """Close each request's read session; call at import, before the app serves"""
+
+    @app.teardown_appcontext
+    def close_read_session(exc):
+        session = g.pop('_read_session', None)
+        if session is not None:
+            session.close()
+
+
+def create_replica(app, engine, **options):
+    """Create the app's read replica for a primary engine"""
+    replica = ReadReplica(engine, **options)
+    app.extensions['read_replica'] = replica
+    return replica
+
+
+def read_session():
+    """Session on the current app's read replica, closed at the end of the request"""
+    if '_read_session' not in g:
+        g._read_session = current_app.extensions['read_replica'].session()
+    return g._read_session
+
+
+def read_list_response(key, columns, rows, **extra):
+    """Streamed list response (see serialization.py) annotated like read_response"""
+    freshness = current_app.extensions['read_replica'].freshness()
+    return list_response(columns, rows, key=key, headers={
+        'X-Data-Staleness': f"{freshness['staleness_seconds']:.3f}"
+    }, data_freshness=freshness, **extra)
+
+
+def read_response(payload, status=200):
+    """JSON response annotated with how stale the replica data may be"""
+    freshness = current_app.extensions['read_replica'].freshness()
+    payload['data_freshness'] = freshness
+    response = jsonify(payload)
+    response.status_code = status
+    response.headers['X-Data-Staleness'] = f"{freshness['staleness_seconds']:.3f}"
+    return response
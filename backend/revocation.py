@@ -0,0 +1,183 @@
+"""
+Token revocation by JWT id (jti).
+
+Logging out adds the token's jti to a Denylist, a dict of jti -> expiry
+time held in memory, so the check flask-jwt-extended makes on every
+@jwt_required() request (token_in_blocklist_loader) is one hash probe.
+
+Revocations are written to the database first and loaded when the app
+sets up. Other worker processes pick them up within REFRESH_INTERVAL
+seconds: the first check after the interval runs one indexed query for
+rows revoked since the last refresh (with REFRESH_OVERLAP seconds of
+overlap, so rows committed out of order aren't missed). An expired
+token is rejected by its exp claim before the denylist is consulted, so
+entries are pruned from memory and from the table once they expire.
+
+Usage:
+    python revocation.py --db word_adventure.db
+    python revocation.py --admin-uri sqlite:///database/app.db
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import timedelta
+
+from flask import current_app
+
+logger = logging.getLogger('word_adventure.revocation')
+
+REFRESH_INTERVAL = float(os.environ.get('WORD_ADVENTURE_REVOCATION_REFRESH', 5))
+REFRESH_OVERLAP = 60.0
+PRUNE_INTERVAL = 3600.0
+# Kept this long when a token has no exp claim
+DEFAULT_TTL = timedelta(days=30)
+
+
+class Denylist:
+    """Revoked token ids in memory, backed by a revocation table"""
+
+    def __init__(self, connect, table='revoked_tokens', dialect='sqlite',
+                 refresh_interval=REFRESH_INTERVAL, prune_interval=PRUNE_INTERVAL):
+        self.connect = connect
+        self.table = table
+        self.param = '?' if dialect == 'sqlite' else '%s'
+        self.refresh_interval = refresh_interval
+        self.prune_interval = prune_interval
+        self._revoked = {}
+        self._seen = 0.0
+        self._refreshed_at = 0.0
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _fetch(self, since):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT jti, expires_at, revoked_at FROM {self.table}
+                WHERE revoked_at >= {self.param} AND expires_at > {self.param}
+            ''', (since, time.time()))
+            rows = cursor.fetchall()
+            conn.rollback()
+            return rows
+        finally:
+            conn.close()
+
+    def load(self):
+        """Read every unexpired revocation; returns how many there are"""
+        self.refresh(since=0.0)
+        return len(self._revoked)
+
+    def refresh(self, since=None):
+        """Pick up revocations made by other processes"""
+        started = time.time()
+        rows = self._fetch(max(0.0, self._seen - REFRESH_OVERLAP) if since is None else since)
+        for jti, expires_at, revoked_at in rows:
+            self._revoked[jti] = expires_at
+        self._seen = started
+        self._refreshed_at = time.monotonic()
+        if self._refreshed_at - self._pruned_at >= self.prune_interval:
+            self.prune()
+
+    def is_revoked(self, jti):
+        if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            # One thread refreshes; the others check against the current set
+            if self._lock.acquire(blocking=False):
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception('Refreshing the token denylist failed')
+                    self._refreshed_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return jti in self._revoked
+
+    def revoke(self, jti, expires_at=None):
+        """Revoke a token id until its expiry (a Unix timestamp)"""
+        if expires_at is None:
+            expires_at = time.time() + DEFAULT_TTL.total_seconds()
+        p = self.param
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                INSERT INTO {self.table} (jti, expires_at, revoked_at) VALUES ({p}, {p}, {p})
+                ON CONFLICT (jti) DO NOTHING
+            ''', (jti, int(expires_at), time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+        self._revoked[jti] = int(expires_at)
+
+    def prune(self):
+        """Forget expired revocations; returns how many rows were deleted"""
+        now = time.time()
+        for jti, expires_at in list(self._revoked.items()):
+            if expires_at <= now:
+                self._revoked.pop(jti, None)
+        self._pruned_at = time.monotonic()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'DELETE FROM {self.table} WHERE expires_at <= {self.param}', (now,))
+            deleted = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if deleted:
+            logger.info('Pruned %d expired revocation(s)', deleted)
+        return deleted
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+def init_app(app, jwt):
+    """Check every protected request's token against the app's denylist"""
+    @jwt.token_in_blocklist_loader
+    def token_revoked(jwt_header, jwt_payload):
+        denylist = app.extensions.get('denylist')
+        return denylist is not None and denylist.is_revoked(jwt_payload['jti'])
+
+
+def load(app, connect, table='revoked_tokens', dialect='sqlite', **options):
+    """Create the app's denylist and read the current revocations"""
+    denylist = Denylist(connect, table, dialect, **options)
+    denylist.load()
+    app.extensions['denylist'] = denylist
+    return denylist
+
+
+def revoke_token(payload):
+    """Revoke a decoded token (get_jwt()) in the current app"""
+    current_app.extensions['denylist'].revoke(payload['jti'], payload.get('exp'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prune expired token revocations')
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--database-url', help='learner database URL (instead of --db)')
+    parser.add_argument('--admin-uri', help='admin database SQLAlchemy URI (instead of --db)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.admin_uri:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.admin_uri)
+        denylist = Denylist(engine.raw_connection, 'revoked_token', engine.dialect.name)
+    else:
+        from storage import create_backend
+        backend = create_backend(args.database_url or f'sqlite:///{args.db}')
+        # Learner backends take '?' placeholders on either database
+        denylist = Denylist(backend.connect)
+
+    deleted = denylist.prune()
+    print(f'{denylist.load()} active revocation(s), {deleted} expired pruned')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
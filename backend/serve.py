@@ -0,0 +1,239 @@
+"""
+Production launcher for the Word Adventure API.
+
+The master process loads the application once, calling its factory (which
+runs the schema check and sample data seeding), then forks the worker
+processes so they share the preloaded code and data copy-on-write. Workers accept
+connections on a socket bound by the master.
+
+Usage:
+    python serve.py --workers 4 --bind 0.0.0.0:5000 --app 'enhanced_app:create_app()'
+
+Signals (sent to the master):
+    SIGHUP   graceful reload: start a new set of workers, then stop the old ones
+    SIGTTIN  add one worker
+    SIGTTOU  remove one worker
+    SIGTERM  graceful shutdown
+    SIGINT   graceful shutdown
+"""
+import os
+import sys
+import gc
+import time
+import errno
+import signal
+import socket
+import argparse
+import importlib
+import threading
+
+from werkzeug.serving import make_server
+
+DEFAULT_WORKERS = (os.cpu_count() or 1) * 2 + 1
+GRACEFUL_TIMEOUT = 30
+
+
+def load_app(app_path):
+    """Import an application from a 'module:attribute' or 'module:factory()' string"""
+    module_name, _, attr = app_path.partition(':')
+    module = importlib.import_module(module_name)
+    if attr.endswith('()'):
+        return getattr(module, attr[:-2])()
+    return getattr(module, attr or 'app')
+
+
+def bind_socket(bind, backlog=2048):
+    """Create the listening socket shared by all workers"""
+    host, _, port = bind.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Worker:
+    """A single forked worker serving requests from the shared socket"""
+
+    def __init__(self, app, sock):
+        self.app = app
+        self.sock = sock
+        self.server = None
+        self.stopping = False
+
+    def run(self):
+        # Restore default handlers inherited from the master
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTTIN, signal.SIG_IGN)
+        signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+
+        host, port = self.sock.getsockname()[:2]
+        self.server = make_server(host, port, self.app, threaded=True, fd=self.sock.fileno())
+        self.server.daemon_threads = False
+        self.server.block_on_close = True
+        try:
+            # A signal that came before the server existed only set the flag
+            if not self.stopping:
+                self.server.serve_forever()
+        finally:
+            # Wait for in-flight requests before exiting
+            self.server.server_close()
+
+    def handle_exit(self, signum, frame):
+        self.stopping = True
+        if self.server is None:
+            return
+        # shutdown() blocks until serve_forever() returns, so it must not
+        # run on the thread that is serving (called before serve_forever(),
+        # it makes the loop return at once)
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class Arbiter:
+    """Master process that forks, monitors and reloads workers"""
+
+    def __init__(self, app, sock, num_workers=DEFAULT_WORKERS, graceful_timeout=GRACEFUL_TIMEOUT):
+        self.app = app
+        self.sock = sock
+        self.num_workers = num_workers
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}
+        self.pending_signals = []
+        self.running = True
+
+    def log(self, message):
+        print(f"[{os.getpid()}] [serve] {message}", file=sys.stderr, flush=True)
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return pid
+
+        # Worker process
+        exit_code = 0
+        try:
+            Worker(self.app, self.sock).run()
+        except Exception as e:
+            print(f"[{os.getpid()}] [serve] worker failed: {e}", file=sys.stderr, flush=True)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def spawn_workers(self):
+        while len(self.workers) < self.num_workers:
+            self.spawn_worker()
+
+    def kill_worker(self, pid, sig=signal.SIGTERM):
+        try:
+            os.kill(pid, sig)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                self.workers.pop(pid, None)
+            else:
+                raise
+
+    def reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if self.workers.pop(pid, None) is not None and self.running:
+                if os.waitstatus_to_exitcode(status) != 0:
+                    self.log(f"worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def reload(self):
+        """Start fresh workers, then gracefully stop the previous generation"""
+        old_workers = list(self.workers)
+        self.log(f"reloading {len(old_workers)} workers")
+        for _ in range(self.num_workers):
+            self.spawn_worker()
+        for pid in old_workers:
+            self.kill_worker(pid)
+
+    def stop(self):
+        """Gracefully stop all workers, killing any that outlive the timeout"""
+        self.running = False
+        for pid in list(self.workers):
+            self.kill_worker(pid)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap_workers()
+            time.sleep(0.1)
+
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGKILL)
+        self.reap_workers()
+        self.sock.close()
+
+    def handle_signal(self, signum, frame):
+        self.pending_signals.append(signum)
+
+    def run(self):
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN,
+                    signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, self.handle_signal)
+
+        # Move everything imported so far into the permanent generation so
+        # the garbage collector doesn't touch (and un-share) those pages
+        gc.collect()
+        gc.freeze()
+
+        self.log(f"listening on {self.sock.getsockname()[:2]} with {self.num_workers} workers")
+        self.spawn_workers()
+
+        while self.running:
+            while self.pending_signals:
+                signum = self.pending_signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.log("shutting down")
+                    self.stop()
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGTTIN:
+                    self.num_workers += 1
+                elif signum == signal.SIGTTOU and self.num_workers > 1:
+                    self.num_workers -= 1
+                    self.kill_worker(max(self.workers, key=self.workers.get))
+
+            self.reap_workers()
+            # Replace workers that died unexpectedly
+            self.spawn_workers()
+            time.sleep(0.5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Word Adventure API with preforked workers')
+    parser.add_argument('--app', default=os.environ.get('WORD_ADVENTURE_APP', 'enhanced_app:create_app()'),
+                        help="application to serve as 'module:attribute' or 'module:factory()'")
+    parser.add_argument('--bind', default=os.environ.get('WORD_ADVENTURE_BIND', '0.0.0.0:5000'),
+                        help='host:port to listen on')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('WORD_ADVENTURE_WORKERS', DEFAULT_WORKERS)),
+                        help='number of worker processes')
+    parser.add_argument('--graceful-timeout', type=int, default=GRACEFUL_TIMEOUT,
+                        help='seconds to wait for workers to finish in-flight requests')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    # Importing the app runs schema creation and seeding, once, before any fork
+    app = load_app(args.app)
+    sock = bind_socket(args.bind)
+
+    Arbiter(app, sock, args.workers, args.graceful_timeout).run()
+
+
+if __name__ == '__main__':
+    main()
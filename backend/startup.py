@@ -0,0 +1,110 @@
+"""
+Start-up timing for the Word Adventure apps.
+
+Setup work runs inside phase() blocks, which record how long each step
+took; report() formats the phases recorded so far. Importing either app
+does no database work: the schema check and seeding run once, from
+create_app() (which serve.py calls in the master before forking) or from
+the first request.
+
+The CLI measures a cold start in a fresh interpreter: module imports
+(grouped by top-level package, from python -X importtime), the app's
+setup phases and the first request.
+
+Usage:
+    python startup.py --app 'enhanced_app:create_app()'
+    python startup.py --app 'main:create_app()' --budget-ms 100
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from contextlib import contextmanager
+from collections import defaultdict
+
+logger = logging.getLogger('word_adventure.startup')
+
+phases = []
+
+
+@contextmanager
+def phase(name):
+    """Time a start-up step"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        phases.append((name, elapsed))
+        logger.debug('%s took %.1f ms', name, elapsed)
+
+
+def report(recorded=None):
+    recorded = phases if recorded is None else recorded
+    return '\n'.join(f'{name:<24} {ms:>8.1f} ms' for name, ms in recorded)
+
+
+def measure(app_path, path='/api/health'):
+    """Run in the child interpreter: import, set up and serve one request"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from serve import load_app
+
+    started = time.perf_counter()
+    with phase('load app'):
+        app = load_app(app_path)
+    with phase('first request'):
+        app.test_client().get(path)
+    json.dump({'phases': phases, 'total_ms': (time.perf_counter() - started) * 1000}, sys.stdout)
+
+
+def parse_importtime(stderr):
+    """Self time in ms per top-level package from -X importtime output"""
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us) / 1000
+    return packages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold start of a Word Adventure app')
+    parser.add_argument('--app', default='enhanced_app:create_app()', help="'module:app' or 'module:factory()'")
+    parser.add_argument('--path', default='/api/health', help='first request to send')
+    parser.add_argument('--top', type=int, default=10, help='slowest packages to list')
+    parser.add_argument('--budget-ms', type=float, help='exit with status 1 if the cold start is slower')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import startup; startup.measure({args.app!r}, {args.path!r})'],
+        cwd=os.getcwd(), capture_output=True, text=True,
+        env={**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [
+            os.path.dirname(os.path.abspath(__file__)), os.environ.get('PYTHONPATH')]))}
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if child.returncode:
+        print(child.stderr, file=sys.stderr)
+        return child.returncode
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+
+    packages = parse_importtime(child.stderr)
+    print(f"Cold start of {args.app}: {result['total_ms']:.1f} ms in-process, {wall_ms:.1f} ms with interpreter")
+    print(report(result['phases']))
+    print(f'\nSlowest imports ({sum(packages.values()):.1f} ms total):')
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{name:<24} {ms:>8.1f} ms')
+
+    if args.budget_ms is not None and result['total_ms'] > args.budget_ms:
+        print(f"\nOver budget: {result['total_ms']:.1f} ms > {args.budget_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Daily learning streaks for the learner API.
+
+Streaks are maintained on the write path: every quiz answer or progress
+update calls record_activity(), which compares the user's local date with
+users.last_play_date and bumps, keeps or restarts users.streak with a
+single-row read and at most one write. Day boundaries follow the user's
+own timezone (users.timezone, an IANA name such as 'Europe/London').
+
+Existing histories can be backfilled from quiz_results in one grouped pass:
+    python streaks.py backfill --db word_adventure.db
+"""
+import argparse
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = 'UTC'
+
+
+def get_timezone(name):
+    """Resolve a timezone name, falling back to UTC for unknown names"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def is_valid_timezone(name):
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+
+
+def local_date(moment, tz_name):
+    """The calendar date of a UTC datetime in the user's timezone"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(get_timezone(tz_name)).date()
+
+
+def next_streak(streak, last_play_date, today):
+    """Streak after playing on `today` given the previous play date"""
+    if last_play_date == today:
+        return max(streak or 0, 1)
+    if last_play_date == today - timedelta(days=1):
+        return (streak or 0) + 1
+    return 1
+
+
+def current_streak(streak, last_play_date, tz_name, now=None):
+    """Streak to display: zero once a whole local day has passed without play"""
+    if not streak or not last_play_date:
+        return 0
+    today = local_date(now or datetime.now(timezone.utc), tz_name)
+    if date.fromisoformat(last_play_date) < today - timedelta(days=1):
+        return 0
+    return streak
+
+
+def record_activity(cursor, user_id, now=None):
+    """Update the user's streak for activity happening now; returns the streak"""
+    cursor.execute('SELECT streak, last_play_date, timezone FROM users WHERE id = ?', (user_id,))
+    row = cursor.fetchone()
+    if not row:
+        return 0
+
+    streak, last_play, tz_name = row[0], row[1], row[2]
+    today = local_date(now or datetime.now(timezone.utc), tz_name)
+    last_play_date = date.fromisoformat(last_play) if last_play else None
+
+    if last_play_date == today and streak:
+        return streak
+
+    streak = next_streak(streak, last_play_date, today)
+    cursor.execute('UPDATE users SET streak = ?, last_play_date = ? WHERE id = ?',
+                   (streak, today.isoformat(), user_id))
+    return streak
+
+
+def backfill(conn, now=None):
+    """Recompute every user's streak from quiz_results in a single pass
+
+    Results are grouped by user and 15-minute UTC bucket (every timezone
+    offset is a multiple of 15 minutes), so each bucket maps to exactly one
+    local date. Returns the number of users updated.
+    """
+    now = now or datetime.now(timezone.utc)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT q.user_id, u.timezone,
+               substr(CAST(q.timestamp AS TEXT), 1, 13) AS hour,
+               CAST(substr(CAST(q.timestamp AS TEXT), 15, 2) AS INTEGER) / 15 AS quarter
+        FROM quiz_results q
+        JOIN users u ON u.id = q.user_id
+        GROUP BY q.user_id, u.timezone, hour, quarter
+        ORDER BY q.user_id, hour, quarter
+    ''')
+
+    updates = []
+    user_id = tz_name = last_day = None
+    run = 0
+
+    def flush():
+        if user_id is None:
+            return
+        today = local_date(now, tz_name)
+        streak = run if last_day >= today - timedelta(days=1) else 0
+        updates.append((streak, last_day.isoformat(), user_id))
+
+    for row_user_id, row_tz, hour, quarter in cursor:
+        if row_user_id != user_id:
+            flush()
+            user_id, tz_name, last_day, run = row_user_id, row_tz, None, 0
+
+        bucket = datetime.fromisoformat(hour.replace(' ', 'T') + ':00') + timedelta(minutes=15 * quarter)
+        day = local_date(bucket, tz_name)
+        if day == last_day:
+            continue
+        run = run + 1 if last_day == day - timedelta(days=1) else 1
+        last_day = day
+    flush()
+
+    cursor.executemany('UPDATE users SET streak = ?, last_play_date = ? WHERE id = ?', updates)
+    conn.commit()
+    return len(updates)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Learning streak maintenance')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--db', default='word_adventure.db', help='learner database file')
+    parser.add_argument('--database-url', help='learner database URL (instead of --db)')
+    args = parser.parse_args(argv)
+
+    from storage import create_backend
+    conn = create_backend(args.database_url or f'sqlite:///{args.db}').connect()
+    try:
+        updated = backfill(conn)
+    finally:
+        conn.close()
+    print(f"Backfilled streaks for {updated} users")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Per-school database sharding for the learner API.
+
+With WORD_ADVENTURE_SHARD_DIR set, each school gets its own SQLite file
+(<shard dir>/<school>.db), so one school's quiz bursts only contend
+for its own file's write lock. The school comes from the 'school' claim
+of the learner's token, which login and registration add when the
+request names a school. Learners without a school use the main database.
+
+Only schools that already have a shard file can be named: shards are
+created ahead of time with --create (below), never by a login request.
+
+ShardRouter keeps at most MAX_OPEN_SHARDS shards open (a backend plus
+the caches built on it); the least recently used are closed first. A
+shard's schema is created the first time a process opens it, and an
+existing shard's check is a single query (see migrations.is_current).
+
+fan_out() runs a function on every shard in parallel on a thread pool
+(sqlite3 releases the GIL while a query runs). shard_summary() and
+merge_summaries() use it for cross-school totals in admin analytics.
+The merged totals come from summed counts, not averaged rates.
+
+Usage:
+    python tenants.py --shard-dir shards
+    python tenants.py --shard-dir shards --create north south
+"""
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt
+
+SHARD_DIR = os.environ.get('WORD_ADVENTURE_SHARD_DIR')
+MAX_OPEN_SHARDS = int(os.environ.get('WORD_ADVENTURE_MAX_OPEN_SHARDS', 64))
+FANOUT_WORKERS = int(os.environ.get('WORD_ADVENTURE_FANOUT_WORKERS', 8))
+TENANT_CLAIM = 'school'
+ACTIVE_DAYS = 7
+
+_TENANT = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+
+def valid_tenant(tenant):
+    """School names double as file names, so only a safe subset is allowed"""
+    return isinstance(tenant, str) and bool(_TENANT.match(tenant))
+
+
+def tenant_claims(tenant):
+    """Extra JWT claims for a learner of this school"""
+    return {TENANT_CLAIM: tenant} if tenant else {}
+
+
+def current_tenant():
+    """School of the current request: the token's claim, else the request body's"""
+    if not has_request_context():
+        return None
+    if '_tenant' not in g:
+        try:
+            tenant = get_jwt().get(TENANT_CLAIM)
+        except RuntimeError:
+            # Not a protected endpoint (login, registration)
+            tenant = (request.get_json(silent=True) or {}).get(TENANT_CLAIM)
+        g._tenant = tenant if valid_tenant(tenant) else None
+    return g._tenant
+
+
+def list_tenants(shard_dir):
+    """Schools with a shard file"""
+    if not shard_dir or not os.path.isdir(shard_dir):
+        return []
+    return sorted(name[:-3] for name in os.listdir(shard_dir)
+                  if name.endswith('.db') and valid_tenant(name[:-3]))
+
+
+class UnknownTenant(LookupError):
+    """A school without a shard"""
+
+
+class ShardRouter:
+    """Opens shards by school, keeping the most recently used ones open"""
+
+    def __init__(self, shard_dir, open_shard, max_open=MAX_OPEN_SHARDS):
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = shard_dir
+        # open_shard(tenant, path) creates the schema if needed and returns an object with close()
+        self.open_shard = open_shard
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._opening = {}
+        self._lock = threading.Lock()
+
+    def path(self, tenant):
+        if not valid_tenant(tenant):
+            raise ValueError(f'Invalid school: {tenant!r}')
+        return os.path.join(self.shard_dir, f'{tenant}.db')
+
+    def exists(self, tenant):
+        return valid_tenant(tenant) and os.path.exists(self.path(tenant))
+
+    def get(self, tenant, create=False):
+        """The school's shard; raises UnknownTenant if it has none unless create is set"""
+        with self._lock:
+            shard = self._open.get(tenant)
+            if shard is not None:
+                self._open.move_to_end(tenant)
+                return shard
+            # One opener per school, so a new shard's schema creation doesn't block the others
+            opening = self._opening.setdefault(tenant, threading.Lock())
+
+        with opening:
+            with self._lock:
+                shard = self._open.get(tenant)
+                if shard is not None:
+                    self._open.move_to_end(tenant)
+                    return shard
+            if not create and not self.exists(tenant):
+                with self._lock:
+                    self._opening.pop(tenant, None)
+                raise UnknownTenant(tenant)
+            shard = self.open_shard(tenant, self.path(tenant))
+            with self._lock:
+                self._open[tenant] = shard
+                evicted = []
+                while len(self._open) > self.max_open:
+                    evicted.append(self._open.popitem(last=False)[1])
+                self._opening.pop(tenant, None)
+        for old in evicted:
+            old.close()
+        return shard
+
+    def open_count(self):
+        return len(self._open)
+
+    def close(self):
+        with self._lock:
+            shards = list(self._open.values())
+            self._open.clear()
+        for shard in shards:
+            shard.close()
+
+
+def fan_out(shard_dir, function, max_workers=FANOUT_WORKERS):
+    """Run function(tenant, conn) on every shard in parallel; returns {tenant: result}"""
+    tenants = list_tenants(shard_dir)
+
+    def run(tenant):
+        uri = Path(shard_dir, f'{tenant}.db').absolute().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            return function(tenant, conn)
+        finally:
+            conn.close()
+
+    if not tenants:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tenants)),
+                            thread_name_prefix='shard-fanout') as pool:
+        return dict(zip(tenants, pool.map(run, tenants)))
+
+
+def shard_summary(tenant, conn, now=None):
+    """Additive aggregates of one school's learning activity"""
+    since = ((now or datetime.now()) - timedelta(days=ACTIVE_DAYS)).isoformat(' ')
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*), COALESCE(SUM(xp), 0) FROM users')
+    users, xp = cursor.fetchone()
+    cursor.execute('SELECT COUNT(DISTINCT user_id) FROM quiz_results WHERE timestamp >= ?', (since,))
+    active_users = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) FROM user_word_progress WHERE known = TRUE')
+    words_known = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT w.category, COUNT(*), COALESCE(SUM(q.remembered), 0)
+        FROM quiz_results q JOIN words w ON w.id = q.word_id
+        GROUP BY w.category
+    ''')
+    categories = {category: {'attempts': attempts, 'remembered': remembered}
+                  for category, attempts, remembered in cursor.fetchall()}
+    return {
+        'users': users,
+        'active_users': active_users,
+        'xp': xp,
+        'words_known': words_known,
+        'quiz_attempts': sum(c['attempts'] for c in categories.values()),
+        'quiz_remembered': sum(c['remembered'] for c in categories.values()),
+        'categories': categories
+    }
+
+
+def success_rate(summary):
+    attempts = summary['quiz_attempts']
+    return round(summary['quiz_remembered'] / attempts * 100, 2) if attempts else 0
+
+
+def merge_summaries(summaries):
+    """Sum per-school summaries into totals"""
+    totals = {key: 0 for key in ('users', 'active_users', 'xp', 'words_known', 'quiz_attempts', 'quiz_remembered')}
+    categories = {}
+    for summary in summaries:
+        for key in totals:
+            totals[key] += summary[key]
+        for category, counts in summary['categories'].items():
+            merged = categories.setdefault(category, {'attempts': 0, 'remembered': 0})
+            merged['attempts'] += counts['attempts']
+            merged['remembered'] += counts['remembered']
+    totals['categories'] = categories
+    totals['success_rate'] = success_rate(totals)
+    return totals
+
+
+def school_analytics(shard_dir, max_workers=FANOUT_WORKERS):
+    """Per-school summaries and their totals, gathered in parallel"""
+    schools = fan_out(shard_dir, shard_summary, max_workers)
+    for summary in schools.values():
+        summary['success_rate'] = success_rate(summary)
+    return {'schools': schools, 'totals': merge_summaries(schools.values())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize learning activity across school shards')
+    parser.add_argument('--shard-dir', default=SHARD_DIR or 'shards')
+    parser.add_argument('--workers', type=int, default=FANOUT_WORKERS)
+    parser.add_argument('--create', nargs='+', metavar='SCHOOL', help='create shards for these schools')
+    args = parser.parse_args(argv)
+
+    if args.create:
+        invalid = [school for school in args.create if not valid_tenant(school)]
+        if invalid:
+            parser.error(f"invalid school name(s): {', '.join(invalid)}")
+        from enhanced_app import open_school_shard
+        router = ShardRouter(args.shard_dir, open_school_shard)
+        for school in args.create:
+            router.get(school, create=True)
+        router.close()
+        print(f"Created {len(args.create)} school shard(s) in {args.shard_dir}")
+        return 0
+
+    print(json.dumps(school_analytics(args.shard_dir, args.workers), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Shared fixtures for the backend tests.
+
+The learner API (enhanced_app.py) imports its modules flat from backend/
+and picks its databases from the environment when they are first
+imported, which may be while test modules are collected, so the
+environment points at a scratch directory before anything else runs.
+The admin app (main.py) imports them as a package (src.models.word,
+src.routes.words, ...), as laid out when deployed, so admin_app builds
+that layout from symlinks in a temporary directory first.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+LEARNER_ROOT = tempfile.mkdtemp(prefix='word-adventure-tests-')
+os.environ.pop('WORD_ADVENTURE_DATABASE_URL', None)
+os.environ.pop('WORD_ADVENTURE_READ_DATABASE_URL', None)
+os.environ['WORD_ADVENTURE_DB'] = os.path.join(LEARNER_ROOT, 'word_adventure.db')
+os.environ['WORD_ADVENTURE_SHARD_DIR'] = os.path.join(LEARNER_ROOT, 'schools')
+os.makedirs(os.environ['WORD_ADVENTURE_SHARD_DIR'])
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(LEARNER_ROOT, ignore_errors=True)
+
+ADMIN_MODELS = ('admin', 'user', 'word')
+ADMIN_ROUTES = ('analytics', 'auth', 'words')
+
+
+def build_admin_package(root):
+    """Lay backend/ out as the admin app's src package under root"""
+    src = os.path.join(root, 'src')
+    for package in ('', 'models', 'routes'):
+        os.makedirs(os.path.join(src, package), exist_ok=True)
+        open(os.path.join(src, package, '__init__.py'), 'a').close()
+    for name in os.listdir(BACKEND):
+        if not name.endswith('.py'):
+            continue
+        module = name[:-3]
+        package = 'models' if module in ADMIN_MODELS else 'routes' if module in ADMIN_ROUTES else ''
+        os.symlink(os.path.join(BACKEND, name), os.path.join(src, package, name))
+    user_routes = os.path.join(src, 'routes', 'user.py')
+    if not os.path.exists(user_routes):
+        # The user routes aren't part of this tree; main.py only registers their blueprint
+        with open(user_routes, 'w') as f:
+            f.write("from flask import Blueprint\nuser_bp = Blueprint('user', __name__)\n")
+    return root
+
+
+@pytest.fixture(scope='session')
+def admin_app(tmp_path_factory):
+    """The admin app on a seeded SQLite database, with query budgets enforced"""
+    root = str(tmp_path_factory.mktemp('admin'))
+    build_admin_package(root)
+    os.environ['WORD_ADVENTURE_ADMIN_DB_URI'] = f"sqlite:///{os.path.join(root, 'app.db')}"
+    # Analytics read a snapshot of the database; retake it on every read
+    os.environ['WORD_ADVENTURE_REPLICA_MAX_STALENESS'] = '0'
+    os.environ['WORD_ADVENTURE_EXPORT_DIR'] = os.path.join(root, 'exports')
+    sys.path.insert(0, root)
+
+    from src.main import create_app
+    from src.loadtest import seed_admin_data
+
+    app = create_app()
+    app.testing = True
+    token, word_ids = seed_admin_data(app, words=50, progress=400)
+    app.config['ADMIN_TOKEN'] = token
+    app.config['SEEDED_WORD_IDS'] = word_ids
+    return app
+
+
+@pytest.fixture
+def admin_client(admin_app):
+    client = admin_app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + admin_app.config['ADMIN_TOKEN']
+    return client
+
+
+@pytest.fixture(scope='session')
+def learner_app():
+    """The learner API on a scratch SQLite database, with shards for schools north and south"""
+    from enhanced_app import create_app
+    from tenants import main as tenants
+
+    tenants(['--shard-dir', os.environ['WORD_ADVENTURE_SHARD_DIR'], '--create', 'north', 'south'])
+
+    app = create_app()
+    app.testing = True
+    return app
+
+
+@pytest.fixture
+def learner_client(learner_app):
+    return learner_app.test_client()
+
+
+@pytest.fixture
+def learner_api_on(learner_app, monkeypatch):
+    """A client of the learner API with its main database swapped for the given one"""
+    def learner_api_on(db):
+        import enhanced_app
+
+        enhanced_app.init_db(db)
+        enhanced_app.populate_sample_data(db)
+        monkeypatch.setattr(enhanced_app, 'main_shard', enhanced_app.Shard(db, db.read_only()))
+        monkeypatch.setattr(enhanced_app, 'school_shards', None)
+        monkeypatch.setattr(enhanced_app, 'backend', db)
+        return learner_app.test_client()
+    return learner_api_on
+
+
+@pytest.fixture
+def register(learner_client):
+    """Register a learner; returns the Authorization header for them"""
+    def register(username, **fields):
+        response = learner_client.post('/api/auth/register', json={'username': username, **fields})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+    return register
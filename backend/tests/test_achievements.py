@@ -0,0 +1,72 @@
+"""
+Achievement unlocks (achievements.py) on the learner API.
+"""
+import pytest
+
+from achievements import AchievementEngine, Rule
+from storage import SQLiteBackend
+
+
+def learn_first_word(client, headers):
+    word_id = client.get('/api/words', headers=headers).get_json()[0]['id']
+    response = client.put(f'/api/words/{word_id}/progress', json={'known': True}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['achievements_unlocked']
+
+
+def test_schools_unlock_independently(learner_client, register):
+    # Both schools start at user id 1: one's cached unlocks must not leak into the other's
+    north = register('achiever', school='north')
+    south = register('achiever', school='south')
+    assert 'first_word' in learn_first_word(learner_client, north)
+    assert 'first_word' in learn_first_word(learner_client, south)
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db
+
+    db = SQLiteBackend(str(tmp_path / 'achievements.db'))
+    init_db(db)
+    with db.connect() as conn:
+        conn.execute("INSERT INTO users (id, username, password_hash) VALUES (1, 'achiever', '')")
+    return db
+
+
+def process(engine, db, commit=True, **counters):
+    conn = db.connect()
+    evaluation = engine.process(conn.cursor(), 1, **counters)
+    if commit:
+        conn.commit()
+        engine.confirm(evaluation)
+    else:
+        conn.rollback()
+    conn.close()
+    return evaluation.unlocked
+
+
+def test_rolled_back_unlock_is_earned_again(learner_db):
+    engine = AchievementEngine()
+    assert process(engine, learner_db, commit=False, total_words_learned=1) == ['first_word']
+    assert process(engine, learner_db, total_words_learned=2) == ['first_word']
+
+
+def test_thresholds_unlock_once(learner_db):
+    engine = AchievementEngine()
+    assert process(engine, learner_db, total_words_learned=10) == ['first_word', 'word_explorer']
+    assert process(engine, learner_db, total_words_learned=11) == []
+    # A fresh engine reloads the unlocks from the database
+    assert process(AchievementEngine(), learner_db, total_words_learned=12) == []
+
+
+def test_only_rules_on_changed_counters_are_checked(learner_db):
+    checked = []
+    rules = [Rule(rule_id, (counter,), lambda counters, rule_id=rule_id: checked.append(rule_id))
+             for rule_id, counter in [('words', 'total_words_learned'), ('quizzes', 'total_quizzes_taken')]]
+    engine = AchievementEngine(rules)
+    process(engine, learner_db, total_words_learned=1, total_quizzes_taken=1)
+    assert sorted(checked) == ['quizzes', 'words']
+
+    checked.clear()
+    process(engine, learner_db, total_words_learned=1, total_quizzes_taken=2)
+    assert checked == ['quizzes']
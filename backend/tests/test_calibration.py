@@ -0,0 +1,76 @@
+"""
+Word difficulty calibration (calibration.py).
+"""
+import pytest
+
+from calibration import INITIAL_RATINGS, calibrate, get_watermark
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db, populate_sample_data
+
+    db = SQLiteBackend(str(tmp_path / 'calibration.db'))
+    init_db(db)
+    populate_sample_data(db)
+    return db
+
+
+def record(db, *results):
+    """Insert (user_id, word_id, remembered) quiz results"""
+    with db.connect() as conn:
+        conn.executemany('INSERT INTO quiz_results (user_id, word_id, remembered) VALUES (?, ?, ?)', results)
+
+
+def easy_words(db, count):
+    with db.connect() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT id FROM words WHERE difficulty = 'easy' ORDER BY id LIMIT ?", (count,))]
+
+
+def score(db, word_id):
+    with db.connect() as conn:
+        return conn.execute('SELECT difficulty_score FROM words WHERE id = ?', (word_id,)).fetchone()[0]
+
+
+def test_runs_resume_from_the_watermark(learner_db):
+    word_id, = easy_words(learner_db, 1)
+    record(learner_db, (1, word_id, True), (2, word_id, False), (3, word_id, True))
+    conn = learner_db.connect()
+    assert calibrate(conn, chunk_rows=2) == 3
+    assert calibrate(conn) == 0
+    first = get_watermark(conn.cursor())
+
+    record(learner_db, (1, word_id, False), (4, word_id, True))
+    assert calibrate(conn) == 2
+    assert get_watermark(conn.cursor()) == first + 2
+    with learner_db.connect() as check:
+        assert check.execute('SELECT attempts FROM word_calibration WHERE word_id = ?', (word_id,)).fetchone()[0] == 5
+    conn.close()
+
+
+def test_remembered_words_get_easier(learner_db):
+    remembered, forgotten = easy_words(learner_db, 2)
+    record(learner_db, *[(user, remembered, True) for user in range(1, 6)],
+           *[(user, forgotten, False) for user in range(1, 6)])
+    conn = learner_db.connect()
+    calibrate(conn)
+    conn.close()
+    assert score(learner_db, remembered) < INITIAL_RATINGS['easy'] < score(learner_db, forgotten)
+
+
+def test_words_sort_by_difficulty_score(learner_api_on, learner_db):
+    client = learner_api_on(learner_db)
+    token = client.post('/api/auth/register', json={'username': 'sorter'}).get_json()['access_token']
+    headers = {'Authorization': 'Bearer ' + token}
+    with learner_db.connect() as conn:
+        conn.execute('UPDATE words SET difficulty_score = NULL')
+        conn.executemany('UPDATE words SET difficulty_score = ? WHERE id = ?', [(1700.0, 1), (1200.0, 2), (1450.0, 3)])
+
+    words = client.get('/api/words?sort=difficulty', headers=headers).get_json()
+    assert [word['id'] for word in words[:3]] == [2, 3, 1]
+    assert all(word['difficultyScore'] is None for word in words[3:])
+    hardest = client.get('/api/words?sort=difficulty_desc', headers=headers).get_json()
+    assert [word['id'] for word in hardest[:3]] == [1, 3, 2]
+    assert hardest[-1]['difficultyScore'] is None
@@ -0,0 +1,41 @@
+"""
+Cohort retention (cohorts.py).
+"""
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import cohorts
+
+MONDAY = 20003
+
+
+def history(today, window_days, signups, events):
+    """The columns retention() reads, for users signed up on the given days"""
+    cohorts.load_numpy()
+    return SimpleNamespace(
+        today=today,
+        since=today - window_days,
+        user_id=np.arange(len(signups), dtype=np.int64),
+        user_signup=np.array(signups, dtype=np.int64),
+        event_user_pos=np.array([user for user, _ in events], dtype=np.int64),
+        event_day=np.array([day for _, day in events], dtype=np.int64),
+    )
+
+
+def test_weeks_before_the_window_are_unknown():
+    today = MONDAY + 70
+    data = history(today, 30, [MONDAY, MONDAY + 56], [(0, MONDAY + 42), (0, MONDAY + 57), (1, MONDAY + 56)])
+    early, late = cohorts.retention(data)
+
+    # Signed up 70 days ago; the window only holds weeks 6 onwards
+    assert early['retention'] == [None] * 6 + [1.0, 0.0, 1.0, 0.0, 0.0]
+    assert late['retention'] == [1.0, 0.0, 0.0]
+
+
+def test_cohorts_entirely_before_the_window_are_left_out():
+    today = MONDAY + 200
+    data = history(today, 30, [MONDAY, today - 3], [(1, today - 3)])
+    assert [curve['users'] for curve in cohorts.retention(data)] == [1]
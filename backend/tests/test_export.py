@@ -0,0 +1,51 @@
+"""
+Background history exports (export.py).
+"""
+import os
+import sys
+import time
+
+import pytest
+
+
+@pytest.fixture
+def export_module(admin_app):
+    # export.py is imported from the src package, which admin_app lays out
+    return sys.modules['src.export']
+
+
+def wait_for(export_module, job_id, out_dir):
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = export_module.load_job(job_id, out_dir)
+        if job['status'] in ('finished', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'export {job_id} did not finish')
+
+
+def test_job_status_is_readable_by_any_worker(admin_app, export_module, tmp_path):
+    from src.database import db
+
+    with admin_app.app_context():
+        job = export_module.start_export(db.engine, list(export_module.ADMIN_TABLES.values()), str(tmp_path), 'csv')
+    # No in-process registry: the status comes from the job's file
+    saved = wait_for(export_module, job.id, str(tmp_path))
+    assert saved['status'] == 'finished'
+    assert saved['rows']['user_progress'] == saved['result']['user_progress']['rows'] > 0
+    assert export_module.load_job('../' + job.id, str(tmp_path)) is None
+
+
+def test_finished_jobs_expire(admin_app, export_module, tmp_path):
+    from src.database import db
+
+    with admin_app.app_context():
+        job = export_module.start_export(db.engine, list(export_module.ADMIN_TABLES.values()), str(tmp_path), 'csv')
+    wait_for(export_module, job.id, str(tmp_path))
+
+    assert export_module.expire_jobs(str(tmp_path), ttl=3600) == []
+    day_old = time.time() - 86400
+    os.utime(os.path.join(str(tmp_path), job.id, export_module.STATUS_FILE), (day_old, day_old))
+    assert export_module.expire_jobs(str(tmp_path), ttl=3600) == [job.id]
+    assert export_module.load_job(job.id, str(tmp_path)) is None
+    assert not os.path.exists(os.path.join(str(tmp_path), job.id))
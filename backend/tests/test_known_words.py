@@ -0,0 +1,52 @@
+"""
+Known-word bitmaps: kept in step with progress writes, and shares taken
+of every learner rather than only those who know a word.
+"""
+import sqlite3
+
+from bitmaps import WordBitmap, known_by_share, share_summary
+
+
+def test_share_counts_learners_without_bitmaps():
+    bitmaps = [WordBitmap([1, 2]), WordBitmap([1])]
+    assert list(known_by_share(bitmaps, 0.5)) == [1, 2]
+    # Two more learners who know nothing: word 2 is now known by 1 in 4
+    assert list(known_by_share(bitmaps, 0.5, learners=4)) == [1]
+
+
+def test_share_summary_divides_by_every_learner():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY);
+        CREATE TABLE words (id INTEGER PRIMARY KEY, deleted_at TIMESTAMP);
+        CREATE TABLE user_word_progress (user_id INTEGER, word_id INTEGER, known BOOLEAN);
+        CREATE TABLE user_known_words (user_id INTEGER PRIMARY KEY, bitmap BLOB, known_count INTEGER,
+                                       updated_at TIMESTAMP);
+        INSERT INTO users (id) VALUES (1), (2), (3), (4);
+        INSERT INTO words (id) VALUES (1), (2);
+        INSERT INTO user_word_progress VALUES (1, 1, TRUE), (1, 2, TRUE), (2, 1, TRUE);
+    ''')
+    summary = share_summary(conn.cursor(), 0.5)
+    assert summary['learners'] == 4
+    assert summary['words'] == [1]
+
+
+def test_progress_writes_update_the_admin_bitmap(admin_app):
+    from src.database import db
+    from src.models.user import User
+    from src.models.word import UserKnownWords, UserProgress
+
+    word_id = admin_app.config['SEEDED_WORD_IDS'][0]
+    with admin_app.app_context():
+        user = User(username='bitmapuser', email='bitmapuser@example.com')
+        db.session.add(user)
+        db.session.commit()
+        progress = UserProgress(user_id=user.id, word_id=word_id, known=True)
+        db.session.add(progress)
+        db.session.commit()
+        assert word_id in WordBitmap.from_bytes(db.session.get(UserKnownWords, user.id).bitmap)
+
+        progress.known = False
+        db.session.commit()
+        db.session.expire_all()
+        assert word_id not in WordBitmap.from_bytes(db.session.get(UserKnownWords, user.id).bitmap)
@@ -0,0 +1,57 @@
+"""
+Leaderboards (leaderboard.py).
+"""
+import pytest
+
+from leaderboard import Leaderboards, RankIndex
+from storage import SQLiteBackend
+
+
+def test_tied_scores_share_a_rank():
+    index = RankIndex({1: 100, 2: 50, 3: 100, 4: 20})
+    assert index.rank(1) == index.rank(3) == (1, 100)
+    assert index.rank(2) == (3, 50)
+    assert index.rank(4) == (4, 20)
+    assert index.rank(5) is None
+
+    index.add(2, 50)
+    assert index.rank(2) == (1, 100)
+    assert index.rank(4) == (4, 20)
+    index.add(5, 30)
+    assert index.rank(5) == (4, 30) and index.rank(4) == (5, 20)
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db
+
+    db = SQLiteBackend(str(tmp_path / 'leaderboard.db'))
+    init_db(db)
+    with db.connect() as conn:
+        conn.executemany("INSERT INTO users (id, username, password_hash, xp) VALUES (?, ?, '', ?)",
+                         [(1, 'ada', 120), (2, 'ben', 80), (3, 'cy', 120)])
+    return db
+
+
+def test_top_entries_are_cached_for_the_ttl(learner_db):
+    boards = Leaderboards(learner_db.connect, top_ttl=3600)
+    top = boards.top('global', limit=3)
+    assert [(entry['rank'], entry['xp']) for entry in top] == [(1, 120), (1, 120), (3, 80)]
+
+    with learner_db.connect() as conn:
+        conn.execute('UPDATE users SET xp = 500 WHERE id = 2')
+    assert boards.top('global', limit=3) is top
+    boards.top_ttl = 0
+    assert boards.top('global', limit=3)[0]['username'] == 'ben'
+
+
+def test_unknown_age_groups_are_rejected(learner_client, register):
+    headers = register('teen_leader', age_group='teen')
+    unknown = learner_client.get('/api/leaderboard?board=age_group&age_group=pirates', headers=headers)
+    assert unknown.status_code == 400
+
+    board = learner_client.get('/api/leaderboard?board=age_group&age_group=teen', headers=headers).get_json()
+    assert board['group'] == 'teen'
+    assert 'teen_leader' in [entry['username'] for entry in board['entries']]
+    # The caller's own group when none is named
+    assert learner_client.get('/api/leaderboard?board=age_group', headers=headers).get_json()['group'] == 'teen'
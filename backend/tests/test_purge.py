@@ -0,0 +1,90 @@
+"""
+Soft deletes and the background purger (purge.py).
+"""
+import pytest
+
+from purge import LEARNER_TARGET, Purger, soft_delete
+from storage import SQLiteBackend
+
+WORD_ID = 1
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db, populate_sample_data
+
+    db = SQLiteBackend(str(tmp_path / 'purge.db'))
+    init_db(db)
+    populate_sample_data(db)
+    with db.connect() as conn:
+        conn.executemany('INSERT INTO quiz_results (user_id, word_id, remembered) VALUES (1, ?, TRUE)',
+                         [(WORD_ID,)] * 7 + [(WORD_ID + 1,)])
+        soft_delete(conn.cursor(), 'words', [WORD_ID])
+    return db
+
+
+def count(db, sql, *params):
+    with db.connect() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def traced(db, statements, on_statement=None):
+    """A connect() that records each statement run"""
+    def connect():
+        conn = db.connect()
+        def trace(sql):
+            statements.append(sql.strip())
+            if on_statement:
+                on_statement(sql.strip())
+        conn.set_trace_callback(trace)
+        return conn
+    return connect
+
+
+def test_deleted_word_leaves_listings_at_once(learner_api_on, learner_db):
+    from categories import uncount_words
+    from quiz import bump_content_version
+
+    client = learner_api_on(learner_db)
+    token = client.post('/api/auth/register', json={'username': 'purged'}).get_json()['access_token']
+    headers = {'Authorization': 'Bearer ' + token}
+    listed = {word['id'] for word in client.get('/api/words', headers=headers).get_json()}
+    assert WORD_ID not in listed and WORD_ID + 1 in listed
+
+    # Deleting another one, as purge.py --delete does, hides it from the cached listings too
+    with learner_db.connect() as conn:
+        cursor = conn.cursor()
+        uncount_words(cursor, [WORD_ID + 1])
+        soft_delete(cursor, 'words', [WORD_ID + 1])
+        bump_content_version(cursor)
+    listed = {word['id'] for word in client.get('/api/words', headers=headers).get_json()}
+    assert WORD_ID + 1 not in listed
+    # Nothing is purged until the purger runs
+    assert count(learner_db, 'SELECT COUNT(*) FROM words WHERE id = ?', WORD_ID + 1) == 1
+
+
+def test_dependents_are_deleted_in_batches(learner_db):
+    statements = []
+    purger = Purger(traced(learner_db, statements), LEARNER_TARGET, batch_size=3, pause=0)
+    assert purger.run_once() == [WORD_ID]
+
+    deletes = [sql for sql in statements if sql.startswith('DELETE FROM quiz_results')]
+    assert len(deletes) == 3
+    assert count(learner_db, 'SELECT COUNT(*) FROM quiz_results WHERE word_id = ?', WORD_ID) == 0
+    assert count(learner_db, 'SELECT COUNT(*) FROM quiz_results WHERE word_id = ?', WORD_ID + 1) == 1
+    assert count(learner_db, 'SELECT COUNT(*) FROM words WHERE id = ?', WORD_ID) == 0
+
+
+def test_stop_mid_purge_keeps_the_word(learner_db):
+    def stop_after_first_batch(sql):
+        if sql.startswith('DELETE FROM quiz_results'):
+            purger.stop()
+
+    purger = Purger(traced(learner_db, [], stop_after_first_batch), LEARNER_TARGET, batch_size=3, pause=0)
+    purger.run_once()
+    assert count(learner_db, 'SELECT COUNT(*) FROM quiz_results WHERE word_id = ?', WORD_ID) == 4
+    assert count(learner_db, 'SELECT COUNT(*) FROM words WHERE id = ? AND deleted_at IS NOT NULL', WORD_ID) == 1
+
+    # The next run picks up where it stopped
+    assert Purger(learner_db.connect, LEARNER_TARGET, pause=0).run_once() == [WORD_ID]
+    assert count(learner_db, 'SELECT COUNT(*) FROM words WHERE id = ?', WORD_ID) == 0
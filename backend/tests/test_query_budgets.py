@@ -0,0 +1,120 @@
+"""
+Every admin view declared with @query_budget stays within its budget.
+
+Under app.testing a view that runs more statements than its budget
+raises QueryBudgetExceeded out of the test client, so each test only has
+to drive the view; X-Query-Count is checked as well so a budget check
+that silently stops running fails here too.
+"""
+import sqlite3
+
+import pytest
+from flask import Flask, jsonify
+
+from instrumentation import InstrumentedConnection, QueryBudgetExceeded, init_app, query_budget
+
+
+def within_budget(admin_app, response):
+    request = response.request
+    endpoint, _ = admin_app.url_map.bind('localhost').match(request.path, method=request.method)
+    view = admin_app.view_functions[endpoint]
+    count = int(response.headers['X-Query-Count'])
+    assert count <= view.__query_budget__, f'{count} statements, budget {view.__query_budget__}'
+    return response
+
+
+def test_word_list(admin_app, admin_client):
+    response = within_budget(admin_app, admin_client.get('/api/words'))
+    assert response.status_code == 200
+    within_budget(admin_app, admin_client.get('/api/words?category=animals&difficulty=easy'))
+
+
+def test_word_list_does_not_query_per_row(admin_app, admin_client):
+    # An N+1 (say, a lazy relationship touched per word) grows with the rows
+    few = admin_client.get('/api/words?search=loadword1')
+    many = admin_client.get('/api/words')
+    assert len(many.get_json()['words']) > len(few.get_json()['words'])
+    assert few.headers['X-Query-Count'] == many.headers['X-Query-Count']
+
+
+def test_word_lifecycle(admin_app, admin_client):
+    created = within_budget(admin_app, admin_client.post('/api/words', json={
+        'word': 'budgetword', 'category': 'animals', 'difficulty': 'easy'}))
+    assert created.status_code == 201
+    word_id = created.get_json()['word']['id']
+
+    assert within_budget(admin_app, admin_client.get(f'/api/words/{word_id}')).status_code == 200
+    assert within_budget(admin_app, admin_client.put(f'/api/words/{word_id}', json={
+        'difficulty': 'hard'})).status_code == 200
+    assert within_budget(admin_app, admin_client.delete(f'/api/words/{word_id}')).status_code == 200
+
+
+def test_bulk_operations(admin_app, admin_client):
+    imported = within_budget(admin_app, admin_client.post('/api/words/bulk-import', json={'words': [
+        {'word': f'bulkword{i}', 'category': 'food', 'difficulty': 'medium'} for i in range(20)]}))
+    assert imported.status_code in (200, 201)
+
+    updated = within_budget(admin_app, admin_client.patch('/api/words', json={
+        'filter': {'search': 'bulkword'}, 'changes': {'difficulty': 'hard'}}))
+    assert updated.status_code == 200
+    assert updated.get_json()['updated'] == 20
+
+    listed = admin_client.get('/api/words?search=bulkword').get_json()['words']
+    deleted = within_budget(admin_app, admin_client.post('/api/words/bulk-delete', json={
+        'ids': [w['id'] for w in listed]}))
+    assert deleted.status_code == 200
+    assert deleted.get_json()['deleted'] == len(listed)
+
+
+def test_categories(admin_app, admin_client):
+    response = within_budget(admin_app, admin_client.get('/api/words/categories'))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path', [
+    '/api/analytics/overview',
+    '/api/analytics/words',
+    '/api/analytics/users',
+    '/api/analytics/activity',
+    '/api/analytics/cohorts',
+    '/api/analytics/known-words?share=0.1',
+    '/api/analytics/known-words?share=0.5&user_ids=1,2,3',
+    '/api/analytics/schools',
+])
+def test_analytics(admin_app, admin_client, path):
+    response = within_budget(admin_app, admin_client.get(path))
+    assert response.status_code in (200, 404, 503)
+
+
+def test_export(admin_app, admin_client):
+    started = within_budget(admin_app, admin_client.post('/api/analytics/export', json={'format': 'csv'}))
+    assert started.status_code == 202
+    job_id = started.get_json()['job']['id']
+    status = within_budget(admin_app, admin_client.get(f'/api/analytics/export/{job_id}'))
+    assert status.status_code == 200
+
+
+def test_budget_catches_n_plus_one(tmp_path):
+    app = Flask(__name__)
+    app.testing = True
+    init_app(app)
+    path = str(tmp_path / 'n_plus_one.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE words (id INTEGER PRIMARY KEY, word TEXT)')
+    conn.executemany('INSERT INTO words (word) VALUES (?)', [(f'w{i}',) for i in range(10)])
+    conn.commit()
+    conn.close()
+
+    @app.route('/words')
+    @query_budget(2)
+    def words():
+        conn = sqlite3.connect(path, factory=InstrumentedConnection)
+        try:
+            ids = [row[0] for row in conn.execute('SELECT id FROM words')]
+            # One query per row: the pattern budgets exist to catch
+            return jsonify([conn.execute('SELECT word FROM words WHERE id = ?', (i,)).fetchone()[0] for i in ids])
+        finally:
+            conn.close()
+
+    with pytest.raises(QueryBudgetExceeded, match='11 statements executed, budget is 2'):
+        app.test_client().get('/words')
@@ -0,0 +1,51 @@
+"""
+Cached learner state in the quiz service (quiz.py).
+"""
+import pytest
+
+from quiz import QuizService, bump_content_version
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db, populate_sample_data
+
+    db = SQLiteBackend(str(tmp_path / 'quiz.db'))
+    init_db(db)
+    populate_sample_data(db)
+    with db.connect() as conn:
+        conn.execute("INSERT INTO users (id, username, password_hash) VALUES (1, 'quizzer', '')")
+    return db
+
+
+def skill(service):
+    return service.get_state(1, service.get_pools().version).skill
+
+
+def learn_elsewhere(db, word_id):
+    """Progress written by another worker, which can't forget() this one's cache"""
+    with db.connect() as conn:
+        conn.execute('INSERT INTO user_word_progress (user_id, word_id, known) VALUES (1, ?, TRUE)', (word_id,))
+
+
+def test_cached_progress_expires(learner_db):
+    service = QuizService(learner_db.connect, state_ttl=3600)
+    version = service.get_pools().version
+    assert service.get_state(1, version).progress == {}
+
+    learn_elsewhere(learner_db, 1)
+    assert service.get_state(1, version).progress == {}
+    service.state_ttl = 0
+    assert list(service.get_state(1, version).progress) == [1]
+
+
+def test_calibration_refreshes_cached_skill(learner_db):
+    service = QuizService(learner_db.connect, check_interval=0, state_ttl=3600)
+    assert skill(service) == 1500.0
+
+    # What calibration.py writes for a learner, then its version bump
+    with learner_db.connect() as conn:
+        conn.execute('INSERT INTO user_skill (user_id, rating, attempts) VALUES (1, 1620.0, 8)')
+        bump_content_version(conn.cursor())
+    assert skill(service) == 1620.0
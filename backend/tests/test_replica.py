@@ -0,0 +1,64 @@
+"""
+Analytics snapshots (replica.py).
+"""
+import os
+import sys
+import time
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+
+
+@pytest.fixture
+def replica_module(admin_app):
+    # replica.py imports from the src package, which admin_app lays out
+    return sys.modules['src.replica']
+
+
+@pytest.fixture
+def primary(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE t (x INTEGER)'))
+    yield engine
+    engine.dispose()
+
+
+def count(replica):
+    with replica.session() as session:
+        return session.execute(text('SELECT COUNT(*) FROM t')).scalar()
+
+
+def test_stale_snapshot_is_served_while_it_is_retaken(replica_module, primary, monkeypatch):
+    replica = replica_module.ReadReplica(primary, url=None, max_staleness=60)
+    with primary.begin() as conn:
+        conn.execute(text('INSERT INTO t VALUES (1)'))
+    assert count(replica) == 0
+
+    # Age the snapshot past its bound, and hold the copy until the stale read is done
+    aged = replica.refreshed_at - 120
+    os.utime(replica.snapshot_path, (aged, aged))
+    replica.refreshed_at = aged
+    copying = threading.Event()
+    copy_primary = replica.copy_primary
+    monkeypatch.setattr(replica, 'copy_primary', lambda path: copying.wait(5) and copy_primary(path))
+    assert count(replica) == 0
+
+    copying.set()
+    deadline = time.time() + 5
+    while replica._lock.locked() and time.time() < deadline:
+        time.sleep(0.01)
+    assert count(replica) == 1
+
+
+def test_workers_share_the_snapshot_without_clobbering_copies(replica_module, primary, tmp_path):
+    first = replica_module.ReadReplica(primary, url=None, max_staleness=60)
+    # A second worker starting right after reuses the first one's copy
+    second = replica_module.ReadReplica(primary, url=None, max_staleness=60)
+    assert second.refreshed_at == first.refreshed_at
+
+    first.max_staleness = second.max_staleness = 0
+    first.refresh()
+    second.refresh()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.partial')]
@@ -0,0 +1,63 @@
+"""
+Token revocation (revocation.py) on both apps.
+"""
+import time
+
+import pytest
+
+from revocation import REFRESH_OVERLAP, Denylist
+from storage import SQLiteBackend
+
+
+def test_learner_logout_revokes_the_token(learner_client, register):
+    headers = register('leaving')
+    assert learner_client.get('/api/user/stats', headers=headers).status_code == 200
+    assert learner_client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert learner_client.get('/api/user/stats', headers=headers).status_code == 401
+
+
+def test_admin_logout_revokes_the_token(admin_app):
+    from flask_jwt_extended import create_access_token
+    from src.models.admin import Admin
+
+    with admin_app.app_context():
+        # Not the shared admin token, which the other tests still use
+        token = create_access_token(identity=Admin.query.first().id)
+    client = admin_app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    assert client.get('/api/auth/verify', headers=headers).status_code == 200
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.get('/api/auth/verify', headers=headers).status_code == 401
+
+
+@pytest.fixture
+def revocations(learner_app, tmp_path):
+    from enhanced_app import init_db
+
+    db = SQLiteBackend(str(tmp_path / 'revocations.db'))
+    init_db(db)
+    return db
+
+
+def test_other_workers_pick_up_revocations(revocations):
+    revoking = Denylist(revocations.connect)
+    checking = Denylist(revocations.connect, refresh_interval=3600)
+    checking.load()
+
+    # Revoked after the checker's last refresh started, but within the overlap before it
+    revoking.revoke('late-jti', time.time() + 600)
+    checking._seen = time.time() + REFRESH_OVERLAP / 2
+    assert not checking.is_revoked('late-jti')
+    checking.refresh()
+    assert checking.is_revoked('late-jti')
+
+
+def test_prune_drops_expired_revocations(revocations):
+    denylist = Denylist(revocations.connect)
+    denylist.revoke('expired-jti', time.time() - 1)
+    denylist.revoke('active-jti', time.time() + 600)
+
+    assert denylist.prune() == 1
+    assert not denylist.is_revoked('expired-jti') and denylist.is_revoked('active-jti')
+    with revocations.connect() as conn:
+        assert [row[0] for row in conn.execute('SELECT jti FROM revoked_tokens')] == ['active-jti']
@@ -0,0 +1,21 @@
+"""
+Streamed list responses (serialization.py).
+"""
+import json
+import sqlite3
+
+from serialization import encode_rows
+
+
+def test_rows_stream_from_a_cursor_in_chunks():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE words (id INTEGER PRIMARY KEY, word TEXT, known INTEGER)')
+    conn.executemany('INSERT INTO words (word, known) VALUES (?, ?)', [(f'w{i}', i % 2) for i in range(5)])
+    cursor = conn.execute('SELECT id, word, known FROM words ORDER BY id')
+
+    chunks = list(encode_rows(('id', 'word', 'known'), cursor, convert={'known': bool}, chunk_rows=2))
+    # '[', three chunks of at most two rows, ']'
+    assert len(chunks) == 5
+    assert json.loads(''.join(chunks)) == [
+        {'id': i + 1, 'word': f'w{i}', 'known': bool(i % 2)} for i in range(5)]
+    assert ''.join(encode_rows(('id',), iter(()))) == '[]'
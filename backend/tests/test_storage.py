@@ -0,0 +1,176 @@
+"""
+Database backends (storage.py).
+
+The learner API runs against each backend. PostgreSQL needs psycopg2
+and a scratch database named by WORD_ADVENTURE_TEST_PG_URL; without
+them it's skipped.
+"""
+import os
+import uuid
+import threading
+
+import pytest
+
+from storage import MemoryBackend, PortableCursor, PostgresBackend, create_backend, to_format_paramstyle
+
+
+@pytest.fixture(params=['sqlite', 'memory', 'postgresql'])
+def learner_db(request, tmp_path):
+    if request.param == 'sqlite':
+        db = create_backend(f"sqlite:///{tmp_path / 'learner.db'}")
+    elif request.param == 'memory':
+        db = create_backend(f'memory://{tmp_path.name}')
+    else:
+        pytest.importorskip('psycopg2')
+        url = os.environ.get('WORD_ADVENTURE_TEST_PG_URL')
+        if not url:
+            pytest.skip('WORD_ADVENTURE_TEST_PG_URL is not set')
+        db = create_backend(url)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def learner_api(learner_api_on, learner_db):
+    return learner_api_on(learner_db)
+
+
+def test_learner_api(learner_api):
+    # Unique per run, as a PostgreSQL test database outlives it
+    username = f'backend-{uuid.uuid4().hex[:8]}'
+    registered = learner_api.post('/api/auth/register', json={'username': username})
+    assert registered.status_code == 200
+    headers = {'Authorization': 'Bearer ' + registered.get_json()['access_token']}
+
+    words = learner_api.get('/api/words', headers=headers).get_json()
+    assert words and not words[0]['known']
+    learned = learner_api.put(f"/api/words/{words[0]['id']}/progress", json={'known': True}, headers=headers)
+    assert learned.get_json()['achievements_unlocked'] == ['first_word']
+    assert learner_api.get('/api/words', headers=headers).get_json()[0]['known']
+
+    quiz = learner_api.get('/api/quiz/next', headers=headers)
+    assert quiz.status_code == 200
+    submitted = learner_api.post('/api/quiz/submit', json={'word_id': words[1]['id'], 'remembered': True},
+                                 headers=headers)
+    assert submitted.get_json()['xp_gained'] == 15
+
+    stats = learner_api.get('/api/user/stats', headers=headers).get_json()
+    assert stats['user']['xp'] == 25
+    board = learner_api.get('/api/leaderboard', headers=headers)
+    assert board.status_code == 200
+    assert learner_api.get('/api/categories', headers=headers).status_code == 200
+    assert learner_api.post('/api/pet/feed', headers=headers).status_code == 200
+
+
+def test_placeholders_become_format_style():
+    assert to_format_paramstyle('SELECT * FROM words WHERE id = ? AND category = ?') == \
+        'SELECT * FROM words WHERE id = %s AND category = %s'
+    # Literal '?' and '%' inside strings stay as they are; '%' outside them is escaped for psycopg2
+    assert to_format_paramstyle("SELECT '?', 'it''s 100%' FROM words WHERE word LIKE ? AND score % 2 = ?") == \
+        "SELECT '?', 'it''s 100%' FROM words WHERE word LIKE %s AND score %% 2 = %s"
+
+
+class RecordingCursor:
+    """Stands in for a psycopg2 cursor"""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, parameters):
+        self.calls.append((sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        self.calls.append((sql, seq_of_parameters))
+
+
+def test_portable_cursor_translates_statements():
+    raw = RecordingCursor()
+    cursor = PortableCursor(raw)
+    cursor.execute('UPDATE users SET xp = xp + ? WHERE id = ?', [10, 1])
+    cursor.executemany('INSERT INTO tags (name) VALUES (?)', [['a'], ['b']])
+    assert raw.calls == [
+        ('UPDATE users SET xp = xp + %s WHERE id = %s', (10, 1)),
+        ('INSERT INTO tags (name) VALUES (%s)', [('a',), ('b',)]),
+    ]
+
+
+class RecordingPool:
+    """Stands in for psycopg2's ThreadedConnectionPool"""
+
+    def __init__(self):
+        self.idle = []
+        self.closed = []
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else RecordingConnection()
+
+    def putconn(self, raw, close=False):
+        (self.closed if close else self.idle).append(raw)
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def pool_backend(size):
+    db = PostgresBackend.__new__(PostgresBackend)
+    db.pool = RecordingPool()
+    db.pool_timeout = 0.1
+    db._slots = threading.BoundedSemaphore(size)
+    return db
+
+
+def test_pooled_connection_returns_to_the_pool():
+    db = pool_backend(1)
+    conn = db.connect()
+    raw = conn._raw
+    # The only slot is taken until close() hands the connection back
+    with pytest.raises(TimeoutError):
+        db.connect()
+    conn.close()
+    conn.close()
+    assert db.pool.idle == [raw]
+    # Rolled back first, so no open transaction reaches the next user
+    assert raw.rollbacks == 1
+    assert db.connect()._raw is raw
+
+
+def test_memory_reads_wait_for_uncommitted_writes():
+    db = MemoryBackend('isolation')
+    with db.connect() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+    writer = db.connect()
+    writer.execute('INSERT INTO t VALUES (1)')
+
+    seen = []
+    def read():
+        conn = db.connect()
+        seen.append(conn.execute('SELECT COUNT(*) FROM t').fetchone()[0])
+        conn.close()
+    reader = threading.Thread(target=read)
+    reader.start()
+    reader.join(0.2)
+    assert reader.is_alive() and not seen
+
+    writer.rollback()
+    reader.join(5)
+    assert seen == [0]
+
+
+def test_memory_end_request_releases_a_dropped_write():
+    db = MemoryBackend('teardown')
+    with db.connect() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+    # A route that raised before closing its connection
+    db.connect().execute('INSERT INTO t VALUES (1)')
+    db.end_request()
+
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(db.connect().execute('SELECT COUNT(*) FROM t').fetchone()[0]))
+    reader.start()
+    reader.join(5)
+    assert seen == [0]
@@ -0,0 +1,77 @@
+"""
+Daily learning streaks (streaks.py).
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from storage import SQLiteBackend
+from streaks import backfill, current_streak, record_activity
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db
+
+    db = SQLiteBackend(str(tmp_path / 'streaks.db'))
+    init_db(db)
+    with db.connect() as conn:
+        conn.executemany("INSERT INTO users (id, username, password_hash, timezone) VALUES (?, ?, '', ?)",
+                         [(1, 'tokyo', 'Asia/Tokyo'), (2, 'london', 'UTC'), (3, 'lapsed', 'UTC'),
+                          (4, 'new_york', 'America/New_York')])
+    return db
+
+
+def utc(text):
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc)
+
+
+def play(db, user_id, at):
+    with db.connect() as conn:
+        return record_activity(conn.cursor(), user_id, now=utc(at))
+
+
+def user(db, user_id):
+    with db.connect() as conn:
+        return tuple(conn.execute('SELECT streak, last_play_date FROM users WHERE id = ?', (user_id,)).fetchone())
+
+
+def test_days_end_at_local_midnight(learner_db):
+    # New York midnight is 04:00 UTC in June: these are two local days, but one UTC day
+    assert play(learner_db, 4, '2024-06-11 03:50') == 1
+    assert user(learner_db, 4) == (1, '2024-06-10')
+    assert play(learner_db, 4, '2024-06-11 04:10') == 2
+
+    assert play(learner_db, 2, '2024-06-11 03:50') == 1
+    assert play(learner_db, 2, '2024-06-11 04:10') == 1
+
+
+def test_missed_day_restarts_the_streak(learner_db):
+    assert play(learner_db, 2, '2024-06-10 09:00') == 1
+    assert play(learner_db, 2, '2024-06-11 09:00') == 2
+    streak, last_play_date = user(learner_db, 2)
+    assert current_streak(streak, last_play_date, 'UTC', now=utc('2024-06-12 23:00')) == 2
+    assert current_streak(streak, last_play_date, 'UTC', now=utc('2024-06-13 00:30')) == 0
+
+    assert play(learner_db, 2, '2024-06-13 09:00') == 1
+    assert user(learner_db, 2) == (1, '2024-06-13')
+
+
+def test_backfill_counts_local_days(learner_db):
+    with learner_db.connect() as conn:
+        conn.executemany('INSERT INTO quiz_results (user_id, word_id, remembered, timestamp) VALUES (?, 1, TRUE, ?)', [
+            # Tokyo (UTC+9): local June 10, 11 and 12, though only two UTC days
+            (1, '2024-06-10 14:30:00'), (1, '2024-06-10 15:10:00'), (1, '2024-06-11 15:30:00'),
+            # Two days, a gap, then three days in a row
+            (2, '2024-06-07 10:00:00'), (2, '2024-06-08 10:00:00'), (2, '2024-06-10 09:00:00'),
+            (2, '2024-06-11 09:00:00'), (2, '2024-06-11 18:00:00'), (2, '2024-06-12 01:00:00'),
+            # Nothing for over a day: no current streak
+            (3, '2024-06-01 12:00:00'),
+        ])
+    conn = learner_db.connect()
+    assert backfill(conn, now=utc('2024-06-12 03:00')) == 3
+    conn.close()
+
+    assert user(learner_db, 1) == (3, '2024-06-12')
+    assert user(learner_db, 2) == (3, '2024-06-12')
+    assert user(learner_db, 3) == (0, '2024-06-01')
@@ -0,0 +1,26 @@
+"""
+Per-school shards (tenants.py).
+"""
+import os
+
+
+def shard_files():
+    return sorted(os.listdir(os.environ['WORD_ADVENTURE_SHARD_DIR']))
+
+
+def test_unknown_school_is_rejected_without_a_shard(learner_client):
+    before = shard_files()
+    for path in ('/api/auth/register', '/api/auth/login'):
+        response = learner_client.post(path, json={'username': 'roaming', 'school': 'nowhere'})
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Unknown school'
+    assert shard_files() == before
+
+
+def test_created_school_accepts_learners(learner_client, register):
+    from tenants import main as tenants
+
+    assert learner_client.post('/api/auth/login', json={'username': 'founder', 'school': 'east'}).status_code == 400
+    tenants(['--shard-dir', os.environ['WORD_ADVENTURE_SHARD_DIR'], '--create', 'east'])
+    headers = register('founder', school='east')
+    assert learner_client.get('/api/user/stats', headers=headers).status_code == 200
@@ -0,0 +1,93 @@
+"""
+The shared vocabulary snapshot (vocab.py).
+"""
+import math
+
+import pytest
+
+import vocab
+from quiz import bump_content_version, content_version
+from storage import SQLiteBackend
+from vocab import Snapshot, VocabularyFile, encode
+
+# (id, difficulty score, *FIELDS)
+WORDS = [
+    (9, 1400.0, 'Zebra', '🦓', '/ˈziːbrə/', 'A striped horse', None, None, 'easy', 'animals', 'wild'),
+    (3, None, 'Apple', '🍎', None, 'A fruit', 'I eat an apple', 'Apples float', 'easy', 'food', None),
+    (5, 1400.0, 'Cat', '🐱', None, None, None, None, 'easy', 'animals', 'pets'),
+    (7, 1600.0, 'Ant', '🐜', None, None, None, None, 'hard', 'animals', None),
+    (4, None, 'Bee', '🐝', None, None, None, None, 'medium', 'animals', None),
+]
+LISTING = [{'name': 'animals', 'count': 4}, {'name': 'food', 'count': 1, 'subcategories': []}]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / 'vocab.snapshot'
+    path.write_bytes(encode(12, WORDS, LISTING))
+    snapshot = Snapshot(str(path))
+
+    assert snapshot.version == 12 and len(snapshot) == 5
+    assert list(snapshot.ids) == [3, 4, 5, 7, 9]
+    assert [snapshot.record(i) for i in range(5)] == sorted(WORDS)
+    assert snapshot.get(3)['fun_fact'] == 'Apples float' and snapshot.get(3)['difficulty_score'] is None
+    assert snapshot.get(6) is None
+    assert snapshot.listing == LISTING
+
+    # Scored words by score then word, unscored ones last
+    views = {name: ([snapshot.ids[p] for p in order], list(scores))
+             for name, order, scores in snapshot.category_views()}
+    assert views == {
+        'animals': ([5, 9, 7, 4], [1400.0, 1400.0, 1600.0, math.inf]),
+        'food': ([3], [math.inf]),
+    }
+    pools = snapshot.pools
+    assert [word.id for word in pools.categories['animals']] == [5, 9, 7, 4]
+    assert pools.words[9].word == 'Zebra' and 8 not in pools.words
+
+
+@pytest.fixture
+def learner_db(learner_app, tmp_path):
+    from enhanced_app import init_db, populate_sample_data
+
+    db = SQLiteBackend(str(tmp_path / 'vocab.db'))
+    init_db(db)
+    populate_sample_data(db)
+    return db
+
+
+def add_word(db, word):
+    with db.connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO words (word, category) VALUES (?, 'animals') RETURNING id", (word,))
+        word_id = cursor.fetchone()[0]
+        bump_content_version(cursor)
+    return word_id
+
+
+def test_snapshot_follows_the_content_version(learner_db, tmp_path, monkeypatch):
+    published = []
+    publish = vocab.publish
+    monkeypatch.setattr(vocab, 'publish', lambda cursor, path: published.append(path) or publish(cursor, path))
+    path = str(tmp_path / 'vocab.snapshot')
+    worker, other_worker = VocabularyFile(path), VocabularyFile(path)
+    conn = learner_db.connect()
+    cursor = conn.cursor()
+
+    first = worker.at(cursor, content_version(cursor))
+    assert worker.at(cursor, first.version) is first
+    assert len(published) == 1
+
+    word_id = add_word(learner_db, 'Okapi')
+    version = content_version(cursor)
+    assert version > first.version
+    newer = other_worker.at(cursor, version)
+    assert newer.version == version and newer.get(word_id)['word'] == 'Okapi'
+    assert len(published) == 2
+
+    # The first worker remaps the other's file instead of publishing again
+    remapped = worker.at(cursor, version)
+    assert remapped is not first and remapped.version == version and word_id in remapped.pools.words
+    assert len(published) == 2
+    # The old mapping is still readable
+    assert word_id not in first.pools.words
+    conn.close()
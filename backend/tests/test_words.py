@@ -0,0 +1,27 @@
+"""
+Admin word writes keep the per-category counts exact.
+"""
+
+
+def category_count(admin_app, category, difficulty):
+    from src.models.word import CategoryStat
+
+    with admin_app.app_context():
+        stat = CategoryStat.query.get((category, difficulty))
+        return stat.word_count if stat else 0
+
+
+def test_repeated_deletes_decrement_once(admin_app, admin_client):
+    ids = [admin_client.post('/api/words', json={
+        'word': f'deleteonce{i}', 'category': 'deletetest', 'difficulty': 'easy'}).get_json()['word']['id']
+        for i in range(3)]
+    assert category_count(admin_app, 'deletetest', 'easy') == 3
+
+    assert admin_client.delete(f'/api/words/{ids[0]}').status_code == 200
+    # A second delete of the same word (say, a retried request) finds nothing left to hide
+    assert admin_client.delete(f'/api/words/{ids[0]}').status_code == 404
+    assert category_count(admin_app, 'deletetest', 'easy') == 2
+
+    deleted = admin_client.post('/api/words/bulk-delete', json={'ids': ids}).get_json()['deleted']
+    assert deleted == 2
+    assert category_count(admin_app, 'deletetest', 'easy') == 0
@@ -0,0 +1,353 @@
+"""
+Vocabulary snapshot shared by the learner API's worker processes.
+
+With WORD_ADVENTURE_VOCAB_SNAPSHOT set to a file path, the quiz pools and
+the category listing come from a binary snapshot of the words and
+categories that every worker maps read-only (mmap), so N workers share
+one copy in the page cache instead of each holding its own. Words are
+decoded from the mapping when a quiz touches them.
+
+The snapshot is labelled with the 'words' content version it was built
+at. Workers still check the version (one row) as before; when the
+database has moved on, the first worker to notice rebuilds the file and
+publishes it by writing a temporary file and os.replace()-ing it over
+the old one, so readers see either the old file or the new one, never a
+torn one. Mappings of the old file stay valid until they are dropped.
+serve.py's master publishes it during setup, so workers start without
+reading the words table.
+
+File layout (little-endian, sections 8-byte aligned):
+
+    header      magic b'WVOC', format (uint16), content version (uint64),
+                word count (uint32), category count (uint32),
+                offsets of the id index, category table and listing (uint64 each)
+    id index    word ids, ascending (uint32 each), then each word's record offset (uint64 each)
+    records     id (uint32), difficulty score (float64, NaN for none), then
+                FIELDS as length-prefixed UTF-8 (uint32 length, 0xFFFFFFFF for null)
+    categories  per category: name offset, order offset, scores offset (uint64 each),
+                word count (uint32); the order is id-index positions (uint32 each) sorted
+                like the quiz pools, the scores their difficulty scores (float64, inf for none)
+    listing     the /api/categories listing as length-prefixed JSON
+
+Usage:
+    python vocab.py build --db word_adventure.db --out vocab.snapshot
+    python vocab.py show vocab.snapshot
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import argparse
+import tempfile
+import threading
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+
+from quiz import PoolWord, content_version
+from categories import load_categories
+
+SNAPSHOT_PATH = os.environ.get('WORD_ADVENTURE_VOCAB_SNAPSHOT')
+FORMAT_VERSION = 1
+FIELDS = ('word', 'image', 'pronunciation', 'definition', 'example', 'fun_fact',
+          'difficulty', 'category', 'subcategory')
+_NULL = 0xFFFFFFFF
+_HEADER = struct.Struct('<4sH2xQIIQQQ')
+_RECORD = struct.Struct('<Id')
+_LENGTH = struct.Struct('<I')
+_CATEGORY = struct.Struct('<QQQI4x')
+_WORD = FIELDS.index('word')
+_CATEGORY_FIELD = FIELDS.index('category')
+
+
+def _align(buffer):
+    buffer.extend(bytes(-len(buffer) % 8))
+    return len(buffer)
+
+
+def _put_string(buffer, value):
+    if value is None:
+        buffer.extend(_LENGTH.pack(_NULL))
+    else:
+        data = str(value).encode('utf-8')
+        buffer.extend(_LENGTH.pack(len(data)))
+        buffer.extend(data)
+
+
+def encode(version, words, listing):
+    """A snapshot of rows (id, difficulty score, *FIELDS) and a category listing"""
+    words = sorted(words, key=lambda w: w[0])
+    buffer = bytearray(_HEADER.size)
+
+    ids_offset = _align(buffer)
+    buffer.extend(struct.pack(f'<{len(words)}I', *(w[0] for w in words)))
+    offsets_at = _align(buffer)
+    buffer.extend(bytes(8 * len(words)))
+    record_offsets = []
+    for word_id, score, *fields in words:
+        record_offsets.append(_align(buffer))
+        buffer.extend(_RECORD.pack(word_id, math.nan if score is None else score))
+        for value in fields:
+            _put_string(buffer, value)
+    struct.pack_into(f'<{len(words)}Q', buffer, offsets_at, *record_offsets)
+
+    # Categories in order of appearance and words within them ordered as in quiz.Pools
+    members = {}
+    for position, (word_id, score, *fields) in enumerate(words):
+        members.setdefault(fields[_CATEGORY_FIELD], []).append((score is None, score or 0, fields[_WORD], position))
+    entries = []
+    for name, category_words in members.items():
+        order = sorted(category_words)
+        name_offset = _align(buffer)
+        _put_string(buffer, name)
+        order_offset = _align(buffer)
+        buffer.extend(struct.pack(f'<{len(order)}I', *(m[3] for m in order)))
+        scores_offset = _align(buffer)
+        buffer.extend(struct.pack(f'<{len(order)}d', *(math.inf if m[0] else m[1] for m in order)))
+        entries.append(_CATEGORY.pack(name_offset, order_offset, scores_offset, len(order)))
+    categories_offset = _align(buffer)
+    buffer.extend(b''.join(entries))
+
+    listing_offset = _align(buffer)
+    _put_string(buffer, json.dumps(listing, separators=(',', ':')))
+
+    _HEADER.pack_into(buffer, 0, b'WVOC', FORMAT_VERSION, version, len(words), len(entries),
+                      ids_offset, categories_offset, listing_offset)
+    return bytes(buffer)
+
+
+def read_vocabulary(cursor):
+    """The current content version, word rows and category listing"""
+    # Version first: the rows are at least as new as the label
+    version = content_version(cursor)
+    cursor.execute(f'''
+        SELECT id, difficulty_score, {', '.join(FIELDS)}
+        FROM words WHERE deleted_at IS NULL
+    ''')
+    words = [tuple(row) for row in cursor.fetchall()]
+    return version, words, load_categories(cursor)
+
+
+def publish(cursor, path):
+    """Build a snapshot from the database and swap it in atomically; returns its version"""
+    version, words, listing = read_vocabulary(cursor)
+    data = encode(version, words, listing)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.vocab-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+    return version
+
+
+class SnapshotWords(Mapping):
+    """Word id -> PoolWord, decoded from the mapping on access"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __getitem__(self, word_id):
+        ids = self._snapshot.ids
+        position = bisect_left(ids, word_id)
+        if position == len(ids) or ids[position] != word_id:
+            raise KeyError(word_id)
+        return self._snapshot.pool_word(position)
+
+    def __contains__(self, word_id):
+        ids = self._snapshot.ids
+        position = bisect_left(ids, word_id)
+        return position < len(ids) and ids[position] == word_id
+
+    def __iter__(self):
+        return iter(self._snapshot.ids)
+
+    def __len__(self):
+        return len(self._snapshot.ids)
+
+
+class SnapshotSequence(Sequence):
+    """Words at id-index positions, decoded on access"""
+
+    def __init__(self, snapshot, positions):
+        self._snapshot = snapshot
+        self._positions = positions
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._snapshot.pool_word(p) for p in self._positions[i]]
+        return self._snapshot.pool_word(self._positions[i])
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class SnapshotPools:
+    """quiz.Pools over a snapshot: the per-category orders and scores are views of the mapping"""
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.words = SnapshotWords(snapshot)
+        self.all_words = SnapshotSequence(snapshot, range(len(snapshot.ids)))
+        self.categories = {}
+        self.scores = {}
+        for name, order, scores in snapshot.category_views():
+            self.categories[name] = SnapshotSequence(snapshot, order)
+            self.scores[name] = scores
+
+
+class Snapshot:
+    """A read-only mapping of a snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.version, count, self.category_count,
+         ids_offset, self._categories_offset, self._listing_offset) = _HEADER.unpack_from(self._map)
+        if magic != b'WVOC' or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a vocabulary snapshot')
+        view = memoryview(self._map)
+        self.ids = view[ids_offset:ids_offset + 4 * count].cast('I')
+        offsets_at = ids_offset + 4 * count + (-4 * count % 8)
+        self._offsets = view[offsets_at:offsets_at + 8 * count].cast('Q')
+
+    def _string(self, offset):
+        (length,) = _LENGTH.unpack_from(self._map, offset)
+        offset += _LENGTH.size
+        if length == _NULL:
+            return None, offset
+        return str(self._map[offset:offset + length], 'utf-8'), offset + length
+
+    def record(self, position):
+        """(id, difficulty score, *FIELDS) of the word at an id-index position"""
+        offset = self._offsets[position]
+        word_id, score = _RECORD.unpack_from(self._map, offset)
+        offset += _RECORD.size
+        fields = []
+        for _ in FIELDS:
+            value, offset = self._string(offset)
+            fields.append(value)
+        return (word_id, None if math.isnan(score) else score, *fields)
+
+    def pool_word(self, position):
+        word_id, score, word, image, pronunciation, _, _, _, difficulty, category, _ = self.record(position)
+        return PoolWord((word_id, word, image, pronunciation, category, difficulty, score))
+
+    def get(self, word_id):
+        """A word's record as a dict, or None"""
+        position = bisect_left(self.ids, word_id)
+        if position == len(self.ids) or self.ids[position] != word_id:
+            return None
+        word_id, score, *fields = self.record(position)
+        return {'id': word_id, 'difficulty_score': score, **dict(zip(FIELDS, fields))}
+
+    def category_views(self):
+        """(name, id-index positions, difficulty scores) per category, as views of the mapping"""
+        view = memoryview(self._map)
+        for i in range(self.category_count):
+            name_offset, order_offset, scores_offset, count = _CATEGORY.unpack_from(
+                self._map, self._categories_offset + i * _CATEGORY.size)
+            name, _ = self._string(name_offset)
+            yield (name,
+                   view[order_offset:order_offset + 4 * count].cast('I'),
+                   view[scores_offset:scores_offset + 8 * count].cast('d'))
+
+    @cached_property
+    def pools(self):
+        return SnapshotPools(self)
+
+    @cached_property
+    def listing(self):
+        return json.loads(self._string(self._listing_offset)[0])
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class VocabularyFile:
+    """The current snapshot at a path, remapped when the file is replaced"""
+
+    def __init__(self, path):
+        self.path = path
+        self._snapshot = None
+        self._identity = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The mapped snapshot, or None if there is no file yet"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity != self._identity:
+            self._snapshot, self._identity = Snapshot(self.path), identity
+        return self._snapshot
+
+    def at(self, cursor, version):
+        """A snapshot at least as new as `version`, rebuilding the file if it is behind"""
+        with self._lock:
+            snapshot = self.current()
+            if snapshot is None or snapshot.version < version:
+                publish(cursor, self.path)
+                snapshot = self.current()
+            return snapshot
+
+    def refresh(self, connect):
+        """Bring the file up to date with the database, e.g. before forking workers"""
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            return self.at(cursor, content_version(cursor))
+        finally:
+            conn.close()
+
+    def pools(self, cursor, version):
+        return self.at(cursor, version).pools
+
+    def categories(self, cursor, version):
+        return self.at(cursor, version).listing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect the learner vocabulary snapshot')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='publish a snapshot of the learner database')
+    build.add_argument('--db', default='word_adventure.db', help='learner database file')
+    build.add_argument('--database-url', help='learner database URL (instead of --db)')
+    build.add_argument('--out', default=SNAPSHOT_PATH or 'vocab.snapshot')
+    show = commands.add_parser('show', help='summarize a snapshot')
+    show.add_argument('path', nargs='?', default=SNAPSHOT_PATH or 'vocab.snapshot')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        from storage import create_backend
+        backend = create_backend(args.database_url or f'sqlite:///{args.db}')
+        conn = backend.connect()
+        try:
+            version = publish(conn.cursor(), args.out)
+        finally:
+            conn.close()
+        print(f'Published version {version} to {args.out} ({os.path.getsize(args.out)} bytes)')
+    else:
+        snapshot = Snapshot(args.path)
+        print(json.dumps({
+            'version': snapshot.version,
+            'words': len(snapshot),
+            'categories': {name: len(order) for name, order, _ in snapshot.category_views()},
+            'bytes': os.path.getsize(args.path)
+        }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
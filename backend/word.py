@@ -1,16 +1,22 @@
 from src.database import db
+from src.bitmaps import WordBitmap
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from itertools import chain
 from datetime import datetime
 
 class Word(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    word = db.Column(db.String(100), nullable=False)
+    word = db.Column(db.String(100), nullable=False, index=True)
     image_url = db.Column(db.Text)
-    category = db.Column(db.String(50), default='general')
+    category = db.Column(db.String(50), default='general', index=True)
     difficulty = db.Column(db.String(20), default='beginner')
     language = db.Column(db.String(20), default='english')
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set on delete; the row and its progress are purged in the background (see purge.py)
+    deleted_at = db.Column(db.DateTime, index=True)
 
     def __repr__(self):
         return f'<Word {self.word}>'
@@ -28,10 +34,21 @@ class Word(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class ContentVersion(db.Model):
+    """Counter bumped whenever a kind of content changes, for cache invalidation"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CategoryStat(db.Model):
+    """Live words per category and difficulty, adjusted on every word write"""
+    category = db.Column(db.String(50), primary_key=True)
+    difficulty = db.Column(db.String(20), primary_key=True)
+    word_count = db.Column(db.Integer, nullable=False, default=0)
+
 class UserProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    word_id = db.Column(db.Integer, db.ForeignKey('word.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    word_id = db.Column(db.Integer, db.ForeignKey('word.id'), nullable=False, index=True)
     known = db.Column(db.Boolean, default=False)
     attempts = db.Column(db.Integer, default=0)
     last_attempt = db.Column(db.DateTime, default=datetime.utcnow)
@@ -49,3 +66,47 @@ class UserProgress(db.Model):
             'last_attempt': self.last_attempt.isoformat() if self.last_attempt else None
         }
 
+
+class UserKnownWords(db.Model):
+    """Each user's known words as a bitmap (see bitmaps.py), rewritten with their progress"""
+    __tablename__ = 'user_known_words'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    bitmap = db.Column(db.LargeBinary, nullable=False)
+    known_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def rebuild_known_words(connection, user_ids=None):
+    """Recompute the bitmaps of user_ids (every user when None) from their progress rows"""
+    known = select(UserProgress.user_id, UserProgress.word_id).where(UserProgress.known.is_(True))
+    table = UserKnownWords.__table__
+    if user_ids is None:
+        bitmaps = {}
+        stale = table.delete()
+    else:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        known = known.where(UserProgress.user_id.in_(user_ids))
+        bitmaps = {user_id: WordBitmap() for user_id in user_ids}
+        stale = table.delete().where(table.c.user_id.in_(user_ids))
+    for user_id, word_id in connection.execute(known):
+        bitmaps.setdefault(user_id, WordBitmap()).add(word_id)
+    connection.execute(stale)
+    if bitmaps:
+        now = datetime.utcnow()
+        connection.execute(table.insert(), [
+            {'user_id': user_id, 'bitmap': bitmap.to_bytes(), 'known_count': len(bitmap), 'updated_at': now}
+            for user_id, bitmap in bitmaps.items()
+        ])
+
+@event.listens_for(Session, 'after_flush')
+def sync_known_words(session, flush_context):
+    """Rewrite the bitmaps of users whose progress was flushed, in the same transaction"""
+    # Bulk writes (bulk_insert_mappings, query.update) skip this; call rebuild_known_words after them
+    user_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, UserProgress):
+            history = inspect(obj).attrs.user_id.history
+            user_ids.update(u for u in chain(history.added, history.unchanged, history.deleted) if u is not None)
+    if user_ids:
+        rebuild_known_words(session.connection(), user_ids)
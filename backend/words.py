@@ -1,14 +1,118 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.word import Word, UserProgress
+from src.models.word import Word, CategoryStat
 from src.models.admin import Admin
 from src.database import db
+from src.events import hub
+from src.instrumentation import query_budget
+from src.purge import wake as wake_purger
+from src.serialization import list_response
+from sqlalchemy import func, text, update
 from datetime import datetime
+from collections import Counter
 
 words_bp = Blueprint('words', __name__)
 
+MAX_BULK_DELETE = 1000
+# Filters accepted by the word list and bulk updates
+WORD_FILTERS = ('category', 'difficulty', 'language', 'search')
+# Columns of Word.to_dict(), selected directly for the word list
+WORD_FIELDS = ('id', 'word', 'image_url', 'category', 'difficulty', 'language', 'description',
+               'created_at', 'updated_at')
+# Fields a bulk update may change (the word itself has to stay unique)
+BULK_FIELDS = ('image_url', 'category', 'difficulty', 'language', 'description')
+
+def filter_words(query, filters):
+    """Apply the word list filters to a Word query"""
+    if filters.get('category'):
+        query = query.filter(Word.category == filters['category'])
+    if filters.get('difficulty'):
+        query = query.filter(Word.difficulty == filters['difficulty'])
+    if filters.get('language'):
+        query = query.filter(Word.language == filters['language'])
+    if filters.get('search'):
+        query = query.filter(Word.word.contains(filters['search']))
+    return query
+
+def bump_content_version(name='words'):
+    """Mark content as changed; call in the transaction that changes it"""
+    return db.session.execute(text('''
+        INSERT INTO content_version (name, version) VALUES (:name, 1)
+        ON CONFLICT (name) DO UPDATE SET version = content_version.version + 1
+        RETURNING version
+    '''), {'name': name}).scalar()
+
+def content_version(name='words'):
+    return db.session.execute(text('SELECT version FROM content_version WHERE name = :name'),
+                              {'name': name}).scalar() or 0
+
+def count_words(changes):
+    """Adjust CategoryStat by (category, difficulty, delta) triples; call in the transaction that changes the words"""
+    counts = Counter()
+    for category, difficulty, delta in changes:
+        counts[(category or '', difficulty or '')] += delta
+    params = [{'category': c, 'difficulty': d, 'delta': n} for (c, d), n in counts.items() if n]
+    if params:
+        db.session.execute(text('''
+            INSERT INTO category_stat (category, difficulty, word_count) VALUES (:category, :difficulty, :delta)
+            ON CONFLICT (category, difficulty) DO UPDATE SET word_count = category_stat.word_count + excluded.word_count
+        '''), params)
+
+def grouped_counts(query):
+    """(category, difficulty, count) of the words a Word query matches"""
+    return query.with_entities(Word.category, Word.difficulty, func.count(Word.id)).group_by(
+        Word.category, Word.difficulty).all()
+
+def soft_delete(condition):
+    """UPDATE stamping deleted_at on the live words matching condition, returning their counts' keys
+
+    Only the statement that hides a word reports it, so concurrent deletes
+    of the same word decrement its category's count once.
+    """
+    return update(Word).where(condition, Word.deleted_at.is_(None)).values(
+        deleted_at=datetime.utcnow()).returning(Word.category, Word.difficulty).execution_options(
+        synchronize_session=False)
+
+_category_cache = {}
+
+def category_stats():
+    """Word counts per category with difficulty breakdowns, rebuilt when the words' content version moves on"""
+    version = content_version()
+    cached = _category_cache.get('words')
+    if cached is None or cached[0] != version:
+        categories = {}
+        for category, difficulty, count in db.session.query(
+                CategoryStat.category, CategoryStat.difficulty, CategoryStat.word_count
+        ).filter(CategoryStat.word_count > 0):
+            entry = categories.setdefault(category, {'category': category, 'word_count': 0, 'difficulties': {}})
+            entry['word_count'] += count
+            entry['difficulties'][difficulty] = count
+        cached = _category_cache['words'] = (version, [categories[name] for name in sorted(categories)])
+    return cached[1]
+
+def publish_word_counts(action, **extra):
+    """Push updated word counts to connected admin dashboards"""
+    if not hub.subscriber_count('admin'):
+        return
+    
+    words_by_category = db.session.query(
+        CategoryStat.category,
+        func.sum(CategoryStat.word_count)
+    ).group_by(CategoryStat.category).having(func.sum(CategoryStat.word_count) > 0).all()
+    
+    hub.publish('admin', 'word_counts', {
+        'action': action,
+        'total_words': sum(count for _, count in words_by_category),
+        'words_by_category': [
+            {'category': cat, 'count': count}
+            for cat, count in words_by_category
+        ],
+        **extra
+    })
+
 @words_bp.route('/words', methods=['GET'])
 @jwt_required()
+@query_budget(2)
 def get_words():
     """Get all words with optional filtering"""
     try:
@@ -18,36 +122,21 @@ def get_words():
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        # Get query parameters
-        category = request.args.get('category')
-        difficulty = request.args.get('difficulty')
-        language = request.args.get('language')
-        search = request.args.get('search')
-        
-        # Build query
-        query = Word.query
-        
-        if category:
-            query = query.filter(Word.category == category)
-        if difficulty:
-            query = query.filter(Word.difficulty == difficulty)
-        if language:
-            query = query.filter(Word.language == language)
-        if search:
-            query = query.filter(Word.word.contains(search))
+        # Build query (deleted words stay hidden until they are purged); plain
+        # column tuples skip ORM hydration and to_dict() for every word
+        query = db.session.query(*(getattr(Word, field) for field in WORD_FIELDS))
+        query = filter_words(query.filter(Word.deleted_at.is_(None)), request.args)
         
         words = query.order_by(Word.created_at.desc()).all()
         
-        return jsonify({
-            'words': [word.to_dict() for word in words],
-            'total': len(words)
-        }), 200
+        return list_response(WORD_FIELDS, words, key='words', total=len(words))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @words_bp.route('/words', methods=['POST'])
 @jwt_required()
+@query_budget(6)
 def create_word():
     """Create a new word"""
     try:
@@ -63,7 +152,7 @@ def create_word():
             return jsonify({'error': 'Word is required'}), 400
         
         # Check if word already exists
-        existing_word = Word.query.filter_by(word=data['word'].lower()).first()
+        existing_word = Word.query.filter_by(word=data['word'].lower(), deleted_at=None).first()
         if existing_word:
             return jsonify({'error': 'Word already exists'}), 400
         
@@ -78,7 +167,10 @@ def create_word():
         )
         
         db.session.add(word)
+        count_words([(word.category, word.difficulty, 1)])
+        bump_content_version()
         db.session.commit()
+        publish_word_counts('created', word_id=word.id)
         
         return jsonify({
             'message': 'Word created successfully',
@@ -88,8 +180,74 @@ def create_word():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@words_bp.route('/words', methods=['PATCH'])
+@jwt_required()
+@query_budget(6)
+def bulk_update_words():
+    """Apply the same changes to words matched by id list or filter, in one transaction"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'No data provided'}), 400
+        
+        changes = data.get('changes')
+        if not isinstance(changes, dict) or not changes:
+            return jsonify({'error': 'changes must be a non-empty object'}), 400
+        unknown = set(changes) - set(BULK_FIELDS)
+        if unknown:
+            return jsonify({'error': f"Cannot bulk update: {', '.join(sorted(unknown))}"}), 400
+        
+        ids = data.get('ids')
+        filters = data.get('filter')
+        query = Word.query.filter(Word.deleted_at.is_(None))
+        if ids is not None:
+            if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+                return jsonify({'error': 'ids must be a non-empty array of word ids'}), 400
+            query = query.filter(Word.id.in_(set(ids)))
+        if filters is not None:
+            if not isinstance(filters, dict) or not any(filters.get(key) for key in WORD_FILTERS):
+                return jsonify({'error': f"filter needs one of {', '.join(WORD_FILTERS)}"}), 400
+            query = filter_words(query, filters)
+        if ids is None and filters is None:
+            return jsonify({'error': 'ids or filter is required'}), 400
+        
+        values = {getattr(Word, field): value for field, value in changes.items()}
+        values[Word.updated_at] = datetime.utcnow()
+        
+        # Move the matched words' counts to their new category/difficulty
+        if 'category' in changes or 'difficulty' in changes:
+            count_words([
+                triple
+                for category, difficulty, count in grouped_counts(query)
+                for triple in ((category, difficulty, -count),
+                               (changes.get('category', category), changes.get('difficulty', difficulty), count))
+            ])
+        
+        # One UPDATE for every matched word, one version bump, one commit
+        updated = query.update(values, synchronize_session=False)
+        version = bump_content_version() if updated else None
+        db.session.commit()
+        if updated:
+            publish_word_counts('bulk_updated', updated=updated)
+        
+        return jsonify({
+            'message': f'{updated} words updated.',
+            'updated': updated,
+            'content_version': version
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @words_bp.route('/words/<int:word_id>', methods=['GET'])
 @jwt_required()
+@query_budget(2)
 def get_word(word_id):
     """Get a specific word"""
     try:
@@ -99,7 +257,7 @@ def get_word(word_id):
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        word = Word.query.get_or_404(word_id)
+        word = Word.query.filter_by(id=word_id, deleted_at=None).first_or_404()
         return jsonify({'word': word.to_dict()}), 200
         
     except Exception as e:
@@ -107,6 +265,7 @@ def get_word(word_id):
 
 @words_bp.route('/words/<int:word_id>', methods=['PUT'])
 @jwt_required()
+@query_budget(6)
 def update_word(word_id):
     """Update a word"""
     try:
@@ -116,12 +275,14 @@ def update_word(word_id):
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        word = Word.query.get_or_404(word_id)
+        word = Word.query.filter_by(id=word_id, deleted_at=None).first_or_404()
         data = request.get_json()
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        counted = (word.category, word.difficulty)
+        
         # Update fields
         if 'word' in data:
             word.word = data['word'].lower()
@@ -137,7 +298,10 @@ def update_word(word_id):
             word.description = data['description']
         
         word.updated_at = datetime.utcnow()
+        count_words([(*counted, -1), (word.category, word.difficulty, 1)])
+        bump_content_version()
         db.session.commit()
+        publish_word_counts('updated', word_id=word.id)
         
         return jsonify({
             'message': 'Word updated successfully',
@@ -149,8 +313,9 @@ def update_word(word_id):
 
 @words_bp.route('/words/<int:word_id>', methods=['DELETE'])
 @jwt_required()
+@query_budget(6)
 def delete_word(word_id):
-    """Delete a word"""
+    """Delete a word; its progress records are purged in the background"""
     try:
         # Verify admin
         current_admin_id = get_jwt_identity()
@@ -158,21 +323,63 @@ def delete_word(word_id):
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        word = Word.query.get_or_404(word_id)
+        # Hide the word now; deleting a popular word's progress in this
+        # transaction would hold the write lock for every learner
+        word = db.session.execute(soft_delete(Word.id == word_id)).first()
+        if word is None:
+            return jsonify({'error': 'Word not found'}), 404
+        count_words([(word.category, word.difficulty, -1)])
+        bump_content_version()
+        db.session.commit()
+        publish_word_counts('deleted', word_id=word_id)
+        wake_purger()
         
-        # Delete associated progress records
-        UserProgress.query.filter_by(word_id=word_id).delete()
+        return jsonify({'message': 'Word deleted successfully'}), 200
         
-        db.session.delete(word)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@words_bp.route('/words/bulk-delete', methods=['POST'])
+@jwt_required()
+@query_budget(6)
+def bulk_delete_words():
+    """Delete several words by id; progress records are purged in the background"""
+    try:
+        # Verify admin
+        current_admin_id = get_jwt_identity()
+        admin = Admin.query.get(current_admin_id)
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        data = request.get_json()
+        ids = data.get('ids') if isinstance(data, dict) else None
+        
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return jsonify({'error': 'ids must be a non-empty array of word ids'}), 400
+        if len(ids) > MAX_BULK_DELETE:
+            return jsonify({'error': f'At most {MAX_BULK_DELETE} words can be deleted at once'}), 400
+        
+        words = db.session.execute(soft_delete(Word.id.in_(set(ids)))).all()
+        count_words([(category, difficulty, -1) for category, difficulty in words])
+        deleted = len(words)
+        if deleted:
+            bump_content_version()
         db.session.commit()
+        if deleted:
+            publish_word_counts('bulk_deleted', deleted=deleted)
+            wake_purger()
         
-        return jsonify({'message': 'Word deleted successfully'}), 200
+        return jsonify({
+            'message': f'{deleted} words deleted.',
+            'deleted': deleted
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @words_bp.route('/words/bulk-import', methods=['POST'])
 @jwt_required()
+@query_budget(9)
 def bulk_import_words():
     """Bulk import words from JSON"""
     try:
@@ -188,7 +395,19 @@ def bulk_import_words():
             return jsonify({'error': 'Words array is required'}), 400
         
         created_words = []
+        counted = []
         errors = []
+        rows = []
+        
+        # Look up every existing word in one query instead of one per entry
+        names = {
+            word_data['word'].lower()
+            for word_data in data['words']
+            if isinstance(word_data, dict) and isinstance(word_data.get('word'), str)
+        }
+        existing = {
+            word for (word,) in db.session.query(Word.word).filter(Word.word.in_(names), Word.deleted_at.is_(None))
+        } if names else set()
         
         for word_data in data['words']:
             try:
@@ -196,29 +415,36 @@ def bulk_import_words():
                     errors.append(f"Word is required for entry: {word_data}")
                     continue
                 
-                # Check if word already exists
-                existing_word = Word.query.filter_by(word=word_data['word'].lower()).first()
-                if existing_word:
+                # Check if word already exists (or appeared earlier in this import)
+                if word_data['word'].lower() in existing:
                     errors.append(f"Word '{word_data['word']}' already exists")
                     continue
+                existing.add(word_data['word'].lower())
                 
-                # Create new word
-                word = Word(
-                    word=word_data['word'].lower(),
-                    image_url=word_data.get('image_url', ''),
-                    category=word_data.get('category', 'general'),
-                    difficulty=word_data.get('difficulty', 'beginner'),
-                    language=word_data.get('language', 'english'),
-                    description=word_data.get('description', '')
-                )
-                
-                db.session.add(word)
+                # Collected and inserted with one executemany below
+                row = {
+                    'word': word_data['word'].lower(),
+                    'image_url': word_data.get('image_url', ''),
+                    'category': word_data.get('category', 'general'),
+                    'difficulty': word_data.get('difficulty', 'beginner'),
+                    'language': word_data.get('language', 'english'),
+                    'description': word_data.get('description', '')
+                }
+                rows.append(row)
                 created_words.append(word_data['word'])
+                counted.append((row['category'], row['difficulty'], 1))
                 
             except Exception as e:
                 errors.append(f"Error processing word '{word_data.get('word', 'unknown')}': {str(e)}")
         
+        if rows:
+            # No RETURNING per row: the ids aren't needed, so this is a single statement
+            db.session.bulk_insert_mappings(Word, rows)
+            count_words(counted)
+            bump_content_version()
         db.session.commit()
+        if created_words:
+            publish_word_counts('bulk_imported', created=len(created_words))
         
         return jsonify({
             'message': f'Bulk import completed. {len(created_words)} words created.',
@@ -231,8 +457,9 @@ def bulk_import_words():
 
 @words_bp.route('/words/categories', methods=['GET'])
 @jwt_required()
+@query_budget(3)
 def get_categories():
-    """Get all unique categories"""
+    """Get all categories in use, with word counts per difficulty"""
     try:
         # Verify admin
         current_admin_id = get_jwt_identity()
@@ -240,10 +467,13 @@ def get_categories():
         if not admin:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        categories = db.session.query(Word.category).distinct().all()
-        category_list = [cat[0] for cat in categories if cat[0]]
+        # Kept counts, cached per content version; the words table isn't read
+        stats = category_stats()
         
-        return jsonify({'categories': category_list}), 200
+        return jsonify({
+            'categories': [entry['category'] for entry in stats if entry['category']],
+            'category_stats': stats
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500